@@ -0,0 +1,56 @@
+"""Local stand-ins for the OpenAI API used by the load-test harness."""
+import asyncio
+import random
+from types import SimpleNamespace
+from typing import List, Optional
+
+class FakeStream:
+    """Async iterator of chat completion chunks, one token every `interval` seconds."""
+
+    def __init__(self, tokens: List[str], interval: float):
+        self.tokens = tokens
+        self.interval = interval
+        self.closed = False
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        for token in self.tokens:
+            if self.closed:
+                return
+            await asyncio.sleep(self.interval)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+    async def close(self):
+        self.closed = True
+
+class FakeAsyncOpenAI:
+    """Replaces `AsyncOpenAI` with simulated latency and token streaming.
+
+    A completion waits `latency` seconds (plus up to `jitter`) before its
+    first token, then `token_interval` seconds per token for `tokens`
+    tokens; non-streamed completions return once every token is
+    "generated". Only `chat.completions.create` is implemented, which is
+    all `OpenAIAgent` uses.
+    """
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.05, tokens: int = 40,
+                 token_interval: float = 0.005, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens = tokens
+        self.token_interval = token_interval
+        self.calls = 0
+        self._random = random.Random(seed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, model: str, messages: List[dict], stream: bool = False, **params):
+        self.calls += 1
+        await asyncio.sleep(self.latency + self._random.uniform(0, self.jitter))
+        tokens = [f"token{i} " for i in range(self.tokens)]
+        if stream:
+            return FakeStream(tokens, self.token_interval)
+        await asyncio.sleep(self.token_interval * self.tokens)
+        message = SimpleNamespace(role="assistant", content="".join(tokens))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
@@ -0,0 +1,326 @@
+"""Open-loop load test of the web server and an agent worker with a fake LLM.
+
+Starts the FastAPI app (under uvicorn) and an execution-environment worker
+in a child process, sharing an in-process Redis fake (or a real server with
+--redis-url), with `AsyncOpenAI` replaced by `fakes.FakeAsyncOpenAI`.
+Requests arrive on a Poisson schedule at --rate per second regardless of
+how fast earlier ones complete, and latency is measured from each
+request's scheduled start, so queueing delay is not hidden. Reports
+throughput, latency percentiles, event-loop lag of the serving process
+and per-stage timings of both services; --output writes the report as
+JSON and --compare prints the change against an earlier report.
+
+    python benchmarks/load_test.py --rate 50 --duration 20 --output before.json
+    python benchmarks/load_test.py --rate 50 --duration 20 --compare before.json
+
+Both services read their usual environment variables (AGENT_REPLY_MODE,
+QUEUE_TRANSPORT, WIRE_SERIALIZER, ...), so configurations can be compared
+by changing the environment between runs.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[1:1] = [os.path.join(ROOT, "web-server"), os.path.join(ROOT, "execution-environment")]
+
+import httpx
+
+# Seconds between event-loop lag samples in the serving process.
+LAG_INTERVAL = 0.01
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """Nearest-rank p50/p95/p99 plus mean and max, in the units of `values`."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def rank(q: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, int(q * len(ordered) + 0.5) - 1))]
+
+    return {
+        "p50": rank(0.50), "p95": rank(0.95), "p99": rank(0.99),
+        "mean": sum(ordered) / len(ordered), "max": ordered[-1]
+    }
+
+def stage_summary(metrics) -> Dict[str, Dict[str, float]]:
+    return {
+        stage: {
+            "count": histogram.count,
+            "mean_ms": histogram.sum_ns / histogram.count / 1e6 if histogram.count else 0.0,
+            "p99_le_ms": histogram.percentile(0.99) * 1000
+        }
+        for stage, histogram in sorted(metrics.histograms.items())
+    }
+
+def redis_clients(url: Optional[str]):
+    """Clients for the web server and the worker, connected to the same Redis."""
+    if url:
+        import redis.asyncio as redis
+        return redis.from_url(url), redis.from_url(url)
+    import fakeredis
+    server = fakeredis.FakeServer()
+    return fakeredis.FakeAsyncRedis(server=server), fakeredis.FakeAsyncRedis(server=server)
+
+async def _monitor_lag(samples: List[float]):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        samples.append((loop.time() - start - LAG_INTERVAL) * 1000)
+
+async def _serve(config: Dict, port: int, ready, stop, results):
+    # Quiet per-request logging; it would otherwise dominate the profile
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    logging.getLogger("app.middleware.logging").setLevel(logging.WARNING)
+
+    import uvicorn
+    from app.instrumentation import stage_metrics as api_stage_metrics
+    from app.main import app
+    from app.services.agent_service import AgentService
+    from config.settings import Settings
+    from core.openai_agent import OpenAIAgent
+    from core.queue import create_queue
+    from core.worker import AgentWorker
+    from fakes import FakeAsyncOpenAI
+    from utils.instrumentation import stage_metrics as worker_stage_metrics
+
+    web_redis, worker_redis = redis_clients(config["redis_url"])
+    AgentService._instance = AgentService(redis_client=web_redis)
+
+    settings = Settings(
+        OPENAI_API_KEY="benchmark",
+        MEMORY_TYPE="in_memory",
+        LLM_CACHE_SIZE=0 if not config["llm_cache"] else Settings().LLM_CACHE_SIZE
+    )
+    agent = OpenAIAgent(settings)
+    agent.client = FakeAsyncOpenAI(
+        latency=config["llm_latency"],
+        jitter=config["llm_jitter"],
+        tokens=config["tokens"],
+        token_interval=config["token_interval"],
+        seed=config["seed"]
+    )
+    worker = AgentWorker(
+        agent,
+        create_queue(worker_redis, settings, consumer="benchmark"),
+        worker_redis,
+        concurrency=config["worker_concurrency"],
+        batch_size=settings.WORKER_BATCH_SIZE,
+        poll_timeout=0.1,
+        coalesce=settings.WORKER_COALESCE_REQUESTS
+    )
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port,
+                                           log_level="warning", access_log=False))
+    lag: List[float] = []
+    tasks = [
+        asyncio.create_task(server.serve()),
+        asyncio.create_task(worker.run()),
+        asyncio.create_task(_monitor_lag(lag))
+    ]
+    while not server.started:
+        await asyncio.sleep(0.01)
+    ready.set()
+
+    await asyncio.get_running_loop().run_in_executor(None, stop.wait)
+    server.should_exit = True
+    worker.stop()
+    await asyncio.gather(tasks[0], tasks[1])
+    tasks[2].cancel()
+    results.put({
+        "event_loop_lag_ms": percentiles(lag),
+        "llm_calls": agent.client.calls,
+        "worker_expired": worker.expired,
+        "stages": {
+            "api": stage_summary(api_stage_metrics),
+            "worker": stage_summary(worker_stage_metrics)
+        }
+    })
+    await agent.memory.close()
+
+def serve(config: Dict, port: int, ready, stop, results):
+    asyncio.run(_serve(config, port, ready, stop, results))
+
+async def _send(client: httpx.AsyncClient, config: Dict, index: int, scheduled: float,
+                outcomes: List[Dict]):
+    query = f"benchmark query {index % config['distinct_queries'] if config['distinct_queries'] else index}"
+    outcome = {"status": None, "ttft": None}
+    try:
+        if config["stream"]:
+            async with client.stream("POST", "/api/v1/agent/query/stream", json={"query": query}) as response:
+                outcome["status"] = response.status_code
+                async for line in response.aiter_lines():
+                    if outcome["ttft"] is None and line.startswith("data:"):
+                        outcome["ttft"] = time.perf_counter() - scheduled
+                    if line.startswith("event: error"):
+                        outcome["status"] = "stream_error"
+        else:
+            response = await client.post("/api/v1/agent/query", json={"query": query})
+            outcome["status"] = response.status_code
+    except httpx.TimeoutException:
+        outcome["status"] = "timeout"
+    except httpx.HTTPError as e:
+        outcome["status"] = type(e).__name__
+    outcome["latency"] = time.perf_counter() - scheduled
+    outcome["finished"] = time.perf_counter()
+    outcomes.append(outcome)
+
+async def drive(config: Dict, base_url: str) -> Dict:
+    """Send open-loop Poisson traffic and summarise what came back."""
+    rng = random.Random(config["seed"])
+    limits = httpx.Limits(max_connections=config["max_connections"],
+                          max_keepalive_connections=config["max_connections"])
+    outcomes: List[Dict] = []
+    late: List[float] = []
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        for i in range(config["warmup"]):
+            await _send(client, config, -1 - i, time.perf_counter(), [])
+
+        tasks = []
+        start = time.perf_counter()
+        scheduled = start
+        index = 0
+        while True:
+            scheduled += rng.expovariate(config["rate"])
+            if scheduled - start >= config["duration"]:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                late.append(-delay * 1000)
+            tasks.append(asyncio.create_task(_send(client, config, index, scheduled, outcomes)))
+            index += 1
+        await asyncio.gather(*tasks)
+
+    elapsed = max((o["finished"] for o in outcomes), default=start) - start
+    ok = [o for o in outcomes if o["status"] == 200]
+    errors: Dict[str, int] = {}
+    for outcome in outcomes:
+        if outcome["status"] != 200:
+            errors[str(outcome["status"])] = errors.get(str(outcome["status"]), 0) + 1
+    report = {
+        "requests": {"sent": len(outcomes), "ok": len(ok), "errors": errors},
+        "elapsed_s": elapsed,
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+        "latency_ms": percentiles([o["latency"] * 1000 for o in ok]),
+        # The generator itself falling behind schedule would understate the load
+        "generator_late_ms": percentiles(late) if late else {"max": 0.0}
+    }
+    if config["stream"]:
+        report["ttft_ms"] = percentiles([o["ttft"] * 1000 for o in ok if o["ttft"] is not None])
+    return report
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def run(config: Dict) -> Dict:
+    port = free_port()
+    context = multiprocessing.get_context("spawn")
+    ready, stop, results = context.Event(), context.Event(), context.Queue()
+    process = context.Process(target=serve, args=(config, port, ready, stop, results))
+    process.start()
+    try:
+        if not ready.wait(timeout=60):
+            raise RuntimeError("The stack did not start within 60s")
+        report = asyncio.run(drive(config, f"http://127.0.0.1:{port}"))
+        stop.set()
+        report.update(results.get(timeout=60))
+    finally:
+        stop.set()
+        process.join(timeout=30)
+        if process.is_alive():
+            process.terminate()
+    return {"commit": git_commit(), "timestamp": time.time(), "config": config, **report}
+
+# Metrics shown by --compare: (label, path into the report, whether higher is better)
+COMPARED = [
+    ("throughput rps", ("throughput_rps",), True),
+    ("latency p50 ms", ("latency_ms", "p50"), False),
+    ("latency p95 ms", ("latency_ms", "p95"), False),
+    ("latency p99 ms", ("latency_ms", "p99"), False),
+    ("ttft p99 ms", ("ttft_ms", "p99"), False),
+    ("loop lag p99 ms", ("event_loop_lag_ms", "p99"), False),
+    ("loop lag max ms", ("event_loop_lag_ms", "max"), False),
+]
+
+def _lookup(report: Dict, path) -> Optional[float]:
+    for key in path:
+        if not isinstance(report, dict) or key not in report:
+            return None
+        report = report[key]
+    return report
+
+def print_report(report: Dict, baseline: Optional[Dict] = None):
+    requests = report["requests"]
+    print(f"commit {report['commit'] or '?'}: {requests['ok']}/{requests['sent']} ok"
+          f"{', errors ' + json.dumps(requests['errors']) if requests['errors'] else ''}")
+    header = f"{'':<18}{'value':>12}"
+    if baseline:
+        header += f"{'baseline':>12}{'change':>10}"
+    print(header)
+    for label, path, higher_is_better in COMPARED:
+        value = _lookup(report, path)
+        if value is None:
+            continue
+        line = f"{label:<18}{value:>12.2f}"
+        before = _lookup(baseline, path) if baseline else None
+        if before:
+            change = (value - before) / before * 100
+            worse = change < 0 if higher_is_better else change > 0
+            line += f"{before:>12.2f}{change:>+9.1f}%{' (worse)' if worse and abs(change) >= 5 else ''}"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=50.0, help="Requests per second (Poisson arrivals)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load")
+    parser.add_argument("--warmup", type=int, default=5, help="Sequential requests sent before measuring")
+    parser.add_argument("--stream", action="store_true", help="Use the SSE endpoint and report time to first token")
+    parser.add_argument("--distinct-queries", type=int, default=0,
+                        help="Cycle through this many queries (0: every query is unique)")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds to the first token")
+    parser.add_argument("--llm-jitter", type=float, default=0.05, help="Extra random seconds to the first token")
+    parser.add_argument("--tokens", type=int, default=40, help="Tokens per completion")
+    parser.add_argument("--token-interval", type=float, default=0.005, help="Seconds per generated token")
+    parser.add_argument("--llm-cache", action="store_true", help="Keep the LLM response cache enabled")
+    parser.add_argument("--worker-concurrency", type=int, default=64)
+    parser.add_argument("--max-connections", type=int, default=500, help="Client connection limit")
+    parser.add_argument("--redis-url", help="Use this Redis instead of the in-process fake")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    parser.add_argument("--compare", help="Print the change against a previous JSON report")
+    args = parser.parse_args()
+
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    report = run(config)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
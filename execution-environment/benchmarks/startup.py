@@ -0,0 +1,100 @@
+"""Cold-start time of an agent worker process, phase by phase.
+
+Each run is a fresh interpreter that imports `main`, builds the settings,
+agent and queue consumer, and optionally starts the CPU-bound tool pool;
+the first use of the agent's lazily loaded modules (the OpenAI SDK) is
+timed separately, since the worker does that in the background. The
+slowest imports, as reported by ``python -X importtime``, are listed
+after the phase medians.
+
+    python -m benchmarks.startup [--runs 5] [--pool 2] [--top 15] [--output startup.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter; prints one JSON object of phase timings in ms.
+CHILD = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+import main
+from core.queue import create_queue
+imported = time.perf_counter()
+settings = main.get_settings()
+agent = main.create_agent(settings)
+create_queue(main.redis.from_url("redis://localhost"), settings)  # Connects lazily
+built = time.perf_counter()
+main.preload_modules(agent.lazy_modules)
+getattr(agent, "client", None)
+loaded = time.perf_counter()
+phases = {
+    "import_ms": (imported - start) * 1000,
+    "build_agent_ms": (built - imported) * 1000,
+    "lazy_modules_ms": (loaded - built) * 1000,
+}
+pool_size = int(sys.argv[1])
+if pool_size:
+    from core.tools import configure_process_pool, shutdown_process_pool, warm_up_process_pool
+    configure_process_pool(pool_size, preload=["core.tools.code_analysis"])
+    asyncio.run(warm_up_process_pool())
+    phases["process_pool_ms"] = (time.perf_counter() - loaded) * 1000
+    shutdown_process_pool()
+print(json.dumps(phases))
+"""
+
+def child_env() -> Dict[str, str]:
+    # A key is required to build the client; nothing is sent anywhere.
+    return {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "startup-benchmark"),
+            "LOG_LEVEL": "WARNING"}
+
+def measure(pool: int) -> Dict[str, float]:
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", CHILD, str(pool)], cwd=ROOT, env=child_env(),
+                            capture_output=True, text=True, check=True)
+    phases = json.loads(result.stdout.strip().splitlines()[-1])
+    phases["process_total_ms"] = (time.perf_counter() - start) * 1000
+    return phases
+
+def slowest_imports(top: int) -> List[Dict]:
+    """Modules with the largest cumulative import time for `import main`."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT,
+                            env=child_env(), capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace("import time:", "|").split("|")]
+        modules.append({"module": name, "self_ms": int(self_us) / 1000,
+                        "cumulative_ms": int(cumulative_us) / 1000})
+    return sorted(modules, key=lambda m: m["cumulative_ms"], reverse=True)[:top]
+
+def main(runs: int, pool: int, top: int, output: str = None):
+    samples = [measure(pool) for _ in range(runs)]
+    medians = {phase: statistics.median(s[phase] for s in samples) for phase in samples[0]}
+    imports = slowest_imports(top)
+
+    for phase, value in medians.items():
+        print(f"{phase:<20}{value:9.1f}")
+    print("\nslowest imports (cumulative ms, `import main`):")
+    for module in imports:
+        print(f"{module['cumulative_ms']:9.1f}  {module['module']}")
+    if output:
+        with open(output, "w") as f:
+            json.dump({"runs": runs, "pool": pool, "median_ms": medians,
+                       "samples": samples, "imports": imports}, f, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--pool", type=int, default=0, help="Also start this many tool pool processes")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+    main(args.runs, args.pool, args.top, args.output)
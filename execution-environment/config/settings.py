@@ -1,11 +1,29 @@
-from pydantic import BaseSettings
-from typing import Optional, Dict, List
+from functools import lru_cache
+from pydantic_settings import BaseSettings
+from typing import Any, Optional, Dict, List
 
 class Settings(BaseSettings):
     # Agent Configuration
     AGENT_NAME: str = "DefaultAgent"
     AGENT_DESCRIPTION: str = "A flexible AI agent template"
+    AGENT_TYPE: str = "openai"
     MODEL_NAME: str = "gpt-4"  # Default model
+    AGENT_PROFILES: Dict[str, Dict[str, Any]] = {}  # Named settings overrides, picked per request by context.profile
+    
+    # OpenAI Configuration
+    OPENAI_API_KEY: Optional[str] = None
+    OPENAI_MODEL_NAME: str = "gpt-3.5-turbo"
+    LLM_TEMPERATURE: float = 0.7  # Sampling temperature for conversation and thinking
+    HTTP_MAX_CONNECTIONS: int = 100  # Connections to the LLM API shared by all pooled agents
+    HTTP_MAX_KEEPALIVE: int = 20  # Idle connections kept open for reuse
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0  # Seconds an idle connection is kept
+    
+    # LLM Response Cache Configuration
+    LLM_CACHE_SIZE: int = 1024  # Cached completions per process; 0 disables the cache
+    LLM_CACHE_TTL: int = 3600  # Seconds a cached completion is reused
+    LLM_CACHE_SHARED: bool = False  # Also share cached completions through agent memory
+    LLM_CACHE_MAX_TEMPERATURE: float = 0.0  # Calls sampled above this are never cached
+    LLM_PROMPT_CACHE: bool = True  # Send a prompt_cache_key so the provider reuses shared prompt prefixes
     
     # API Configuration
     API_KEYS: Dict[str, str] = {}
@@ -14,8 +32,59 @@ class Settings(BaseSettings):
     
     # Memory Configuration
     MEMORY_TYPE: str = "in_memory"  # Options: in_memory, redis, postgres
-    MEMORY_CONNECTION: Optional[str] = None
+    MEMORY_CONNECTION: Optional[str] = None  # redis:// or postgresql:// URL
+    MEMORY_POOL_SIZE: int = 10  # Max pooled connections for redis/postgres memory
     MEMORY_TTL: int = 3600  # Time to live in seconds
+    MEMORY_PURGE_INTERVAL: int = 300  # postgres: seconds between deletes of expired rows; 0 disables
+    MEMORY_MAX_ENTRIES: Optional[int] = None  # in_memory: LRU-evict beyond this many keys
+    MEMORY_MAX_BYTES: Optional[int] = None  # in_memory: LRU-evict beyond this estimated size
+    
+    # Conversation History Configuration
+    HISTORY_TOKEN_BUDGET: int = 3000  # Approximate tokens of history sent per turn
+    HISTORY_MAX_MESSAGES: int = 50  # Upper bound on messages read per turn
+    HISTORY_SUMMARIZE: bool = False  # Summarize turns that fall out of the window
+    
+    # Tool Configuration
+    TOOL_CACHE_SIZE: int = 1024  # Cached results per process for deterministic tools
+    TOOL_CACHE_SHARED: bool = False  # Also persist cached results to agent memory
+    TOOL_TIMEOUT: Optional[float] = 60.0  # Seconds per tool call in a plan; None waits forever
+    TOOL_CONCURRENCY_LIMITS: Dict[str, int] = {}  # Max concurrent calls per tool name across plans
+    TOOL_PROCESS_POOL_SIZE: Optional[int] = None  # CPU-bound tool processes per worker process; None = CPUs / WORKER_PROCESSES (at least 1), 0 = inline
+    
+    # Batch Analysis Configuration
+    BATCH_CONCURRENCY: int = 16  # Files analyzed concurrently per batch
+    BATCH_MAX_FILES: int = 5000
+    BATCH_MAX_FILE_BYTES: int = 1000000  # Larger files (inline or archive members) are skipped
+    BATCH_MAX_TOTAL_BYTES: int = 50000000  # Larger batches (after decompression) are rejected
+    
+    # Redis / Queue Configuration
+    REDIS_HOST: str = "redis"
+    REDIS_PORT: int = 6379
+    REDIS_DB: int = 0
+    QUEUE_TRANSPORT: str = "list"  # Options: list, stream (must match the web server)
+    QUEUE_NAME: str = "agent_requests"
+    QUEUE_CLAIM_IDLE_MS: int = 60000  # Stream transport: reclaim entries pending this long
+    WIRE_SERIALIZER: str = "json"  # Queue payloads and redis/postgres memory values: json, msgpack
+    WIRE_COMPRESSION: str = "zlib"  # Options: zlib, zstd, none
+    WIRE_COMPRESS_MIN_BYTES: int = 4096  # Compress larger payloads; 0 disables compression
+    QUEUE_LANE_WEIGHTS: Dict[str, int] = {"interactive": 4, "batch": 1}  # Priority lanes and their share of each fetch
+    
+    # Worker Configuration
+    WORKER_PROCESSES: int = 1  # 0 starts one process per CPU; each has its own TOOL_PROCESS_POOL_SIZE pool
+    WORKER_CONCURRENCY: int = 8  # In-flight requests per process
+    WORKER_BATCH_SIZE: int = 8  # Max requests pulled from the queue per fetch
+    WORKER_DRAIN_TIMEOUT: int = 30  # Seconds to finish in-flight work on SIGTERM
+    WORKER_COALESCE_REQUESTS: bool = True  # Identical in-flight requests share one agent call
+    STREAM_MAXLEN: int = 10000  # Cap on buffered events per streamed reply
+    STREAM_TTL: int = 300  # Seconds an unread streamed reply is kept
+    STREAM_HIGH_WATER: int = 1000  # Unread events before a streaming request waits for its reader
+    WORKER_HEARTBEAT_INTERVAL: float = 5.0  # Seconds between heartbeats to the web server's health prober
+    REPLY_TTL: int = 300  # Seconds an uncollected reply list is kept
+    RESULT_TTL: int = 3600  # Seconds completed replies are kept for requests with an idempotency key; 0 disables
+    RESULT_CLAIM_TTL: int = 300  # Seconds a crashed worker's claim on an idempotency key blocks duplicates
+    
+    # Metrics Configuration
+    METRICS_PORT: Optional[int] = None  # Prometheus endpoint; worker N listens on METRICS_PORT + N
     
     # Logging Configuration
     LOG_LEVEL: str = "INFO"
@@ -23,3 +92,12 @@ class Settings(BaseSettings):
     
     class Config:
         env_file = ".env"
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Process-wide settings, read from the environment and `.env` once.
+
+    Use this instead of `Settings()` outside tests; call
+    `get_settings.cache_clear()` to pick up a changed environment.
+    """
+    return Settings()
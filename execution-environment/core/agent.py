@@ -1,18 +1,31 @@
-from typing import Any, List, Optional
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Tuple
 from abc import ABC, abstractmethod
 import asyncio
-from ..config.settings import Settings
-from ..utils.logger import setup_logger
+from config.settings import Settings
+from .planner import PlanExecutor, ToolPlan
+from utils.logger import setup_logger
+
+if TYPE_CHECKING:
+    from .agent_pool import AgentPool
 
 logger = setup_logger(__name__)
 
 class BaseAgent(ABC):
     """Base class for all agents in the system."""
     
-    def __init__(self, settings: Settings):
+    # Heavy modules the agent imports on first use; the worker preloads them
+    # in the background once it is taking requests.
+    lazy_modules: Tuple[str, ...] = ()
+    
+    def __init__(self, settings: Settings, pool: Optional["AgentPool"] = None):
         self.settings = settings
+        self.pool = pool    # Set when the agent shares resources through an AgentPool
         self.memory = None  # Initialize in subclass
         self.tools = []     # Available tools/skills
+        self.planner = PlanExecutor(
+            limits=settings.TOOL_CONCURRENCY_LIMITS,
+            timeout=settings.TOOL_TIMEOUT
+        )
         self._initialize()
     
     def _initialize(self):
@@ -31,19 +44,48 @@ class BaseAgent(ABC):
         """Load available tools/skills."""
         pass
     
+    def configure_shared(self, settings: Settings, memory: Any):
+        """Configure state shared by every agent in the process, such as module-level caches.
+        
+        An AgentPool calls this once with its base settings, so a profile's
+        overrides never reconfigure what the other profiles use.
+        """
+        pass
+    
     @abstractmethod
     async def process(self, input_data: Any) -> Any:
         """Process input and return response."""
         pass
     
+    async def process_stream(self, input_data: Any) -> AsyncIterator[Any]:
+        """Process input, yielding the response in pieces as they become available.
+        
+        By default this yields each item of an async-iterable result, or the
+        whole result at once; override it to stream partial output.
+        """
+        result = await self.process(input_data)
+        if hasattr(result, "__aiter__"):
+            async for item in result:
+                yield item
+        else:
+            yield result
+    
     async def think(self, context: Any) -> List[str]:
         """Strategic thinking before action."""
         pass
     
     async def act(self, thoughts: List[str], context: Any) -> Any:
-        """Execute actions based on thoughts."""
+        """Execute actions based on thoughts.
+        
+        Turns that need several tools should describe them as a `ToolPlan`
+        and hand it to `run_plan`, so independent calls run concurrently.
+        """
         pass
     
+    async def run_plan(self, plan: ToolPlan) -> Dict[str, Any]:
+        """Run a tool plan with this agent's per-tool concurrency limits and timeouts."""
+        return await self.planner.run(plan)
+    
     async def reflect(self, action_result: Any, context: Any) -> None:
         """Learn from actions and results."""
         pass
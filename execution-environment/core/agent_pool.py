@@ -0,0 +1,96 @@
+from typing import Any, Callable, Dict, Optional
+import asyncio
+import weakref
+from .agent import BaseAgent
+from .memory import BaseMemory, create_memory
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+class AgentPool:
+    """Warm, reusable agents keyed by configuration profile.
+
+    `profiles` maps a profile name to Settings overrides (AGENT_PROFILES);
+    requests pick one with ``context["profile"]`` and everything else uses
+    the default agent. Each agent is built once by `factory(settings,
+    pool=self)` and then reused for every request, and all of them share
+    one memory backend and one keep-alive HTTP connection pool (limited by
+    HTTP_MAX_CONNECTIONS / HTTP_MAX_KEEPALIVE), so scaling out requests
+    adds neither setup work nor sockets.
+
+    Agents keep per-session state in memory, not on the instance.
+    `session(session_id)` serialises the turns of one session, so two
+    concurrent requests in the same conversation cannot interleave their
+    history reads and writes on a shared instance.
+
+    State shared across the whole process (such as the module-level tool
+    and LLM caches) is configured once from the base settings, through the
+    first agent's `configure_shared`; profile overrides do not apply to it.
+    """
+
+    def __init__(self, factory: Callable[..., BaseAgent], settings,
+                 profiles: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.factory = factory
+        self.settings = settings
+        self.profiles = profiles if profiles is not None else settings.AGENT_PROFILES
+        self._agents: Dict[Optional[str], BaseAgent] = {}
+        self._memory: Optional[BaseMemory] = None
+        self._http_client = None
+        self._shared_configured = False
+        self._session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    @property
+    def memory(self) -> BaseMemory:
+        if self._memory is None:
+            self._memory = create_memory(self.settings)
+        return self._memory
+
+    def http_client(self):
+        """The shared `httpx.AsyncClient`, created on first use."""
+        if self._http_client is None:
+            import httpx
+            self._http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.settings.HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=self.settings.HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=self.settings.HTTP_KEEPALIVE_EXPIRY
+                ),
+                timeout=self.settings.TIMEOUT
+            )
+        return self._http_client
+
+    def get(self, profile: Optional[str] = None) -> BaseAgent:
+        """The agent for `profile` (None: the default configuration), built on first use."""
+        agent = self._agents.get(profile)
+        if agent is None:
+            if profile is not None and profile not in self.profiles:
+                raise ValueError(f"Unknown agent profile: {profile}")
+            overrides = self.profiles.get(profile, {}) if profile is not None else {}
+            unknown = set(overrides) - set(type(self.settings).model_fields)
+            if unknown:
+                raise ValueError(f"Profile {profile} overrides unknown settings: {sorted(unknown)}")
+            settings = self.settings.model_copy(update=overrides)
+            agent = self._agents[profile] = self.factory(settings, pool=self)
+            if not self._shared_configured:
+                agent.configure_shared(self.settings, self.memory)
+                self._shared_configured = True
+            logger.info(f"Created pooled agent for profile {profile or 'default'}")
+        return agent
+
+    def warm(self):
+        """Build the default agent and every profile's agent ahead of traffic."""
+        for profile in (None, *self.profiles):
+            self.get(profile)
+
+    def session(self, session_id: str) -> asyncio.Lock:
+        """Lock held while a turn of `session_id` runs: ``async with pool.session(sid): ...``."""
+        lock = self._session_locks.get(session_id)
+        if lock is None:
+            lock = self._session_locks[session_id] = asyncio.Lock()
+        return lock
+
+    async def close(self):
+        if self._memory is not None:
+            await self._memory.close()
+        if self._http_client is not None:
+            await self._http_client.aclose()
@@ -0,0 +1,57 @@
+from typing import Dict, Iterator, List, Optional
+import base64
+import io
+import tarfile
+import zipfile
+
+def _iter_archive(data: bytes) -> Iterator[Dict]:
+    if zipfile.is_zipfile(io.BytesIO(data)):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    yield {"path": info.filename, "size": info.file_size,
+                           "read": lambda info=info: archive.read(info)}
+        return
+    with tarfile.open(fileobj=io.BytesIO(data), mode="r:*") as archive:
+        for member in archive.getmembers():
+            if member.isfile():
+                yield {"path": member.name, "size": member.size,
+                       "read": lambda member=member: archive.extractfile(member).read()}
+
+def load_source_files(files: Optional[List[Dict]] = None, archive: Optional[str] = None,
+                      suffixes: tuple = (".py",), max_files: int = 5000,
+                      max_file_bytes: int = 1_000_000,
+                      max_total_bytes: int = 50_000_000) -> List[Dict]:
+    """Collect `{"path", "code"}` entries from inline files and a base64 zip/tar archive.
+
+    Archive members are filtered by `suffixes`; files over `max_file_bytes`
+    are skipped. More than `max_files` files, or more than `max_total_bytes`
+    of (decompressed) source, raises ValueError. This decodes and
+    decompresses synchronously, so async callers run it on a thread.
+    """
+    sources = []
+    total = 0
+
+    def add(path: str, code: str, size: int):
+        nonlocal total
+        total += size
+        if total > max_total_bytes:
+            raise ValueError(f"Batch exceeds the limit of {max_total_bytes} bytes")
+        sources.append({"path": path, "code": code})
+        if len(sources) > max_files:
+            raise ValueError(f"Batch exceeds the limit of {max_files} files")
+
+    for f in files or []:
+        size = len(f["code"].encode("utf-8"))
+        if size <= max_file_bytes:
+            add(f["path"], f["code"], size)
+    if archive:
+        for member in _iter_archive(base64.b64decode(archive)):
+            if not member["path"].endswith(suffixes) or member["size"] > max_file_bytes:
+                continue
+            # Checked before reading, so an archive bomb is never expanded
+            if total + member["size"] > max_total_bytes:
+                raise ValueError(f"Batch exceeds the limit of {max_total_bytes} bytes")
+            data = member["read"]()
+            add(member["path"], data.decode("utf-8", errors="replace"), len(data))
+    return sources
@@ -0,0 +1,69 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from .memory import BaseMemory
+
+Message = Dict[str, Any]
+Summarizer = Callable[[Optional[str], List[Message]], Awaitable[str]]
+
+def estimate_tokens(message: Message) -> int:
+    """Rough token count for a chat message (~4 characters per token plus framing)."""
+    return len(str(message.get("content", ""))) // 4 + 4
+
+class ConversationHistory:
+    """Append-only, per-session chat history with a token-budgeted window.
+
+    Each turn appends only its new messages. `window()` reads at most
+    `max_messages` recent messages and keeps the newest ones that fit in
+    `token_budget`. With a `summarizer`, turns that fall out of the window are
+    folded into a running summary that is sent as a leading system message.
+    """
+
+    def __init__(self, memory: BaseMemory, session_id: str, token_budget: int = 3000,
+                 max_messages: int = 50, ttl: Optional[int] = None,
+                 summarizer: Optional[Summarizer] = None):
+        self.memory = memory
+        self.key = f"conversation:{session_id}"
+        self.summary_key = f"{self.key}:summary"
+        self.token_budget = token_budget
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self.summarizer = summarizer
+
+    async def append(self, *messages: Message) -> int:
+        return await self.memory.append(self.key, list(messages), self.ttl)
+
+    async def window(self) -> List[Message]:
+        tail = await self.memory.retrieve_range(self.key, -self.max_messages, -1)
+
+        kept: List[Message] = []
+        used = 0
+        for message in reversed(tail):
+            cost = estimate_tokens(message)
+            if kept and used + cost > self.token_budget:
+                break
+            kept.append(message)
+            used += cost
+        kept.reverse()
+
+        if self.summarizer is None:
+            return kept
+
+        summary = await self.memory.retrieve(self.summary_key) or {"text": None, "upto": 0}
+        first_kept = await self.memory.length(self.key) - len(kept)
+        if first_kept > summary["upto"]:
+            evicted = await self.memory.retrieve_range(self.key, summary["upto"], first_kept - 1)
+            summary = {
+                "text": await self.summarizer(summary["text"], evicted),
+                "upto": first_kept
+            }
+            await self.memory.store(self.summary_key, summary, self.ttl)
+
+        if summary["text"]:
+            kept.insert(0, {
+                "role": "system",
+                "content": f"Summary of the earlier conversation: {summary['text']}"
+            })
+        return kept
+
+    async def clear(self):
+        await self.memory.forget(self.key)
+        await self.memory.forget(self.summary_key)
@@ -1,22 +1,76 @@
-from typing import Any, List, Dict
-from openai import AsyncOpenAI
+from typing import Any, AsyncIterator, List, Dict, Optional
+import asyncio
+import hashlib
 from .agent import BaseAgent
-from .memory import InMemoryStorage
-from .tools.code_analysis import analyze_code_structure, suggest_improvements, track_code_changes
-from ..config.settings import Settings
-from ..utils.logger import setup_logger
+from .batch import load_source_files
+from .memory import BaseMemory, InMemoryStorage, create_memory
+from .planner import ToolPlan
+from .history import ConversationHistory
+from .tools.cache import ToolResultCache
+from .tools.code_analysis import (
+    analysis_cache,
+    analyze_code_structure,
+    reuse_suggestions,
+    suggest_improvements,
+    track_code_changes
+)
+from config.settings import Settings
+from utils.decorators import RetryBudget, retry
+from utils.instrumentation import span
+from utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+def is_transient(error: BaseException) -> bool:
+    """Provider failures worth retrying (timeouts are APIConnectionErrors); anything
+    else, such as a bad request or an auth error, fails immediately."""
+    # Only reached after a call failed, so the SDK is already imported
+    from openai import APIConnectionError, InternalServerError, RateLimitError
+    return isinstance(error, (APIConnectionError, RateLimitError, InternalServerError))
+
+# One budget for every agent in the process, so retries stay a bounded share of traffic.
+openai_retry_budget = RetryBudget()
+
+# Completion texts keyed by model, normalised messages and sampling params;
+# sized, given a TTL and optionally bound to agent memory by the agent.
+llm_cache = ToolResultCache(prefix="llm_cache:")
+
 class OpenAIAgent(BaseAgent):
-    def __init__(self, settings: Settings):
-        super().__init__(settings)
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+    # The SDK takes most of a cold start to import; the client is built on first use
+    lazy_modules = ("openai",)
+    
+    def __init__(self, settings: Settings, pool=None):
+        super().__init__(settings, pool)
+        self._client = None
         self.model = settings.OPENAI_MODEL_NAME
+        self._complete = retry(
+            max_attempts=settings.MAX_RETRIES + 1,
+            retry_on=is_transient,
+            budget=openai_retry_budget,
+            name="openai.chat.completions"
+        )(self._create_completion)
+    
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import AsyncOpenAI
+            # Retries are ours (non-blocking, jittered, budgeted), not the client's
+            self._client = AsyncOpenAI(
+                api_key=self.settings.OPENAI_API_KEY,
+                max_retries=0,
+                timeout=self.settings.TIMEOUT,
+                # Pooled agents share one keep-alive connection pool
+                http_client=self.pool.http_client() if self.pool is not None else None
+            )
+        return self._client
+    
+    @client.setter
+    def client(self, client):
+        self._client = client
     
     def _setup_memory(self):
-        """Initialize in-memory storage"""
-        self.memory = InMemoryStorage()
+        """Initialize the memory backend selected by MEMORY_TYPE, shared within a pool"""
+        self.memory = self.pool.memory if self.pool is not None else create_memory(self.settings)
     
     def _load_tools(self):
         """Load code analysis tools"""
@@ -25,52 +79,279 @@ class OpenAIAgent(BaseAgent):
             suggest_improvements,
             track_code_changes
         ]
+        # A pool configures the shared caches once, from its base settings
+        if self.pool is None:
+            self.configure_shared(self.settings, self.memory)
     
-    async def analyze_code(self, code: str) -> Dict:
-        """Analyze code and provide insights with memory of previous analyses"""
-        # Get current analysis
-        current_analysis = await analyze_code_structure(code)
+    def configure_shared(self, settings: Settings, memory: BaseMemory):
+        """Size the module-level analysis and LLM caches and bind them to `memory`"""
+        analysis_cache.configure(
+            max_entries=settings.TOOL_CACHE_SIZE,
+            memory=memory if settings.TOOL_CACHE_SHARED else None,
+            ttl=settings.MEMORY_TTL
+        )
+        llm_cache.configure(
+            max_entries=settings.LLM_CACHE_SIZE,
+            memory=memory if settings.LLM_CACHE_SHARED else None,
+            ttl=settings.LLM_CACHE_TTL
+        )
+    
+    async def analyze_code(self, code: str, path: Optional[str] = None,
+                           project: Optional[str] = None) -> Dict:
+        """Analyze code and report what changed since the last snapshot of the same file
+        
+        Snapshots are kept per project and path, so different users and files
+        never overwrite each other. Without a `project` (no caller identity) the
+        analysis is stateless: nothing is read or stored, and no changes are
+        reported. The snapshot lookup and the parse do not
+        depend on each other and run concurrently as one tool plan. On
+        re-analysis only added or modified symbols go through the suggestion
+        passes again; suggestions for unchanged symbols are carried over from
+        the snapshot.
+        """
+        key = f"code_analysis:{project}:{path or '<input>'}" if project else None
+        source_hash = hashlib.sha256(code.encode()).hexdigest()
+        plan = ToolPlan()
+        if key is not None:
+            plan.add("previous", self.memory.retrieve, key)
+        plan.add("current", analyze_code_structure, code)
+        results = await self.run_plan(plan)
+        previous_analysis, current_analysis = results.get("previous"), results["current"]
         
-        # Get previous analysis from memory
-        previous_analysis = await self.memory.retrieve("previous_code_analysis")
+        # Unchanged file: nothing to suggest (the parse is normally an analysis cache hit)
+        if previous_analysis and previous_analysis.get("source_hash") == source_hash:
+            return {**previous_analysis, "changes": await track_code_changes(
+                previous_analysis, previous_analysis
+            )}
         
-        # Track changes if we have previous analysis
-        if previous_analysis:
+        if "error" in current_analysis:
+            return current_analysis
+        
+        if previous_analysis and "suggestions" in previous_analysis:
             changes = await track_code_changes(current_analysis, previous_analysis)
-            current_analysis["changes"] = changes
+            changed = (
+                changes["added_classes"] + changes["modified_classes"]
+                + changes["added_functions"] + changes["modified_functions"]
+            )
+            suggestions = reuse_suggestions(
+                previous_analysis["suggestions"], current_analysis, changed
+            ) + await suggest_improvements(current_analysis, only=changed)
+        else:
+            changes = None
+            suggestions = await suggest_improvements(current_analysis)
         
-        # Get improvement suggestions
-        suggestions = await suggest_improvements(current_analysis)
         current_analysis["suggestions"] = suggestions
+        current_analysis["source_hash"] = source_hash
         
         # Store current analysis for future comparison
-        await self.memory.store("previous_code_analysis", current_analysis)
+        if key is not None:
+            await self.memory.store(key, current_analysis)
         
+        if changes is not None:
+            current_analysis = {**current_analysis, "changes": changes}
         return current_analysis
     
+    async def analyze_batch(self, files: List[Dict],
+                            project: Optional[str] = None) -> AsyncIterator[Dict]:
+        """Analyze many files concurrently, yielding each result as soon as it is ready
+        
+        With a `project`, every file is compared against its snapshot so
+        repeated runs (e.g. incremental CI) only redo work for what changed.
+        """
+        semaphore = asyncio.Semaphore(self.settings.BATCH_CONCURRENCY)
+        
+        async def analyze(source: Dict) -> Dict:
+            async with semaphore:
+                try:
+                    analysis = await self.analyze_code(source["code"], source["path"], project)
+                    return {"path": source["path"], "analysis": analysis}
+                except Exception as e:
+                    return {"path": source["path"], "error": str(e)}
+        
+        tasks = [asyncio.create_task(analyze(source)) for source in files]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield await next_result
+        finally:
+            for task in tasks:
+                task.cancel()
+    
     async def process(self, input_data: Any) -> Any:
         """Process input using OpenAI"""
         # Check if input is code analysis request
         if isinstance(input_data, dict) and input_data.get("type") == "code_analysis":
-            return await self.analyze_code(input_data["code"])
+            return await self.analyze_code(
+                input_data["code"],
+                path=input_data.get("path"),
+                project=input_data.get("project") or input_data.get("session_id")
+            )
+        
+        # Batch analysis results are streamed back file by file
+        if isinstance(input_data, dict) and input_data.get("type") == "code_analysis_batch":
+            # Decoding and decompressing would block every other request on the loop
+            files = await asyncio.to_thread(
+                load_source_files,
+                input_data.get("files"),
+                input_data.get("archive"),
+                max_files=self.settings.BATCH_MAX_FILES,
+                max_file_bytes=self.settings.BATCH_MAX_FILE_BYTES,
+                max_total_bytes=self.settings.BATCH_MAX_TOTAL_BYTES
+            )
+            return self.analyze_batch(
+                files,
+                project=input_data.get("project") or input_data.get("session_id")
+            )
         
         # Regular conversation processing
-        context = await self.memory.retrieve("conversation_history") or []
-        context.append({"role": "user", "content": str(input_data)})
+        history, messages, user_message = await self._conversation_turn(input_data)
         
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=context,
-            temperature=0.7
+        content = await self._chat(
+            messages + [user_message],
+            prefix=history.key,
+            temperature=self.settings.LLM_TEMPERATURE
         )
+        await history.append(user_message, {"role": "assistant", "content": content})
+        
+        return content
+    
+    async def process_stream(self, input_data: Any) -> AsyncIterator[Any]:
+        """Stream conversation replies as `{"delta": text}` items while the model generates"""
+        if isinstance(input_data, dict) and input_data.get("type"):
+            async for item in super().process_stream(input_data):
+                yield item
+            return
         
-        context.append({
-            "role": "assistant",
-            "content": response.choices[0].message.content
-        })
-        await self.memory.store("conversation_history", context)
+        history, messages, user_message = await self._conversation_turn(input_data)
+        params = {"temperature": self.settings.LLM_TEMPERATURE}
+        key = self._cache_key(messages + [user_message], params)
+        if key is not None:
+            found, content = await llm_cache.get(key)
+            if found:
+                yield {"delta": content}
+                await history.append(user_message, {"role": "assistant", "content": content})
+                return
+        
+        stream = await self._complete(
+            messages=messages + [user_message],
+            stream=True,
+            **params,
+            **self._prompt_cache_params(history.key)
+        )
         
-        return response.choices[0].message.content
+        parts = []
+        try:
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield {"delta": delta}
+        finally:
+            # Stops generation when the consumer goes away early
+            await stream.close()
+        
+        content = "".join(parts)
+        if key is not None:
+            await llm_cache.put(key, content)
+        await history.append(user_message, {"role": "assistant", "content": content})
+    
+    async def _conversation_turn(self, input_data: Any):
+        """History, windowed messages and the new user message for a conversation request
+        
+        Requests without a session_id get a history of their own that is
+        discarded afterwards, so anonymous callers never see each other's turns.
+        """
+        if isinstance(input_data, dict):
+            query = input_data.get("query")
+            session_id = input_data.get("session_id")
+        else:
+            query, session_id = input_data, None
+        
+        if session_id:
+            history = self._history(str(session_id))
+        else:
+            history = self._history("anonymous", memory=InMemoryStorage())
+        messages = await history.window()
+        return history, messages, {"role": "user", "content": str(query)}
+    
+    async def _chat(self, messages: List[Dict], prefix: Optional[str] = None, **params: Any) -> str:
+        """Completion text for `messages`, served from the response cache when allowed
+        
+        `prefix` names the family of prompts these messages share a prefix
+        with (a conversation, an instruction template); see `_prompt_cache_params`.
+        """
+        key = self._cache_key(messages, params)
+        if key is not None:
+            found, content = await llm_cache.get(key)
+            if found:
+                return content
+        
+        response = await self._complete(messages=messages, **params, **self._prompt_cache_params(prefix))
+        content = response.choices[0].message.content
+        if key is not None:
+            await llm_cache.put(key, content)
+        return content
+    
+    def _cache_key(self, messages: List[Dict], params: Dict[str, Any]) -> Optional[str]:
+        """Response cache key, or None when this call must not be cached
+        
+        Sampling above LLM_CACHE_MAX_TEMPERATURE is meant to vary between
+        calls, so those responses are never reused.
+        """
+        if not self.settings.LLM_CACHE_SIZE:
+            return None
+        if params.get("temperature", 1.0) > self.settings.LLM_CACHE_MAX_TEMPERATURE:
+            return None
+        normalized = [
+            {"role": m["role"], "content": str(m["content"]).strip()}
+            for m in messages
+        ]
+        return llm_cache.key("chat.completions", self.model, (normalized,), params)
+    
+    def _prompt_cache_params(self, prefix: Optional[str]) -> Dict[str, Any]:
+        """Request options that let the provider reuse the cached prompt prefix
+        
+        Exact-match caching cannot help sampled calls or prompts that grow
+        turn by turn, but consecutive turns of a conversation resend the same
+        leading messages. The provider caches processed prompt prefixes;
+        sending one stable `prompt_cache_key` per prompt family routes those
+        calls to the same cache, so the shared prefix is not processed again.
+        The key is hashed so session ids never leave the process.
+        """
+        if prefix is None or not self.settings.LLM_PROMPT_CACHE:
+            return {}
+        key = hashlib.sha256(f"{self.model}:{prefix}".encode()).hexdigest()[:32]
+        return {"extra_body": {"prompt_cache_key": key}}
+    
+    async def _create_completion(self, **kwargs: Any) -> Any:
+        # For streamed completions this measures the time to the first token
+        with span("llm"):
+            return await self.client.chat.completions.create(model=self.model, **kwargs)
+    
+    def _history(self, session_id: str, memory=None) -> ConversationHistory:
+        return ConversationHistory(
+            memory or self.memory,
+            session_id,
+            token_budget=self.settings.HISTORY_TOKEN_BUDGET,
+            max_messages=self.settings.HISTORY_MAX_MESSAGES,
+            summarizer=self._summarize if self.settings.HISTORY_SUMMARIZE else None
+        )
+    
+    async def _summarize(self, previous_summary: Optional[str], messages: List[Dict]) -> str:
+        """Fold turns that left the history window into a running summary"""
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        return await self._chat(
+            [{
+                "role": "user",
+                "content": (
+                    "Update the summary of this conversation so it captures every fact, "
+                    "decision and open question needed to continue it.\n"
+                    f"Current summary: {previous_summary or '(none)'}\n"
+                    f"New turns:\n{transcript}"
+                )
+            }],
+            prefix="summary",
+            temperature=0
+        )
     
     async def think(self, context: Any) -> List[str]:
         """Strategic thinking using OpenAI"""
@@ -84,12 +365,12 @@ class OpenAIAgent(BaseAgent):
             return thoughts
         
         # Regular thinking process
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=[{
+        content = await self._chat(
+            [{
                 "role": "user",
                 "content": f"Given this context, what should be considered? Context: {context}"
             }],
-            temperature=0.7
+            prefix="think",
+            temperature=self.settings.LLM_TEMPERATURE
         )
-        return [response.choices[0].message.content] 
\ No newline at end of file
+        return [content] 
\ No newline at end of file
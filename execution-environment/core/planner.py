@@ -0,0 +1,168 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import asyncio
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+class Ref:
+    """Stands for the result of another plan node in a node's arguments.
+
+    `transform` is applied to that result first, e.g.
+    ``Ref("changes", lambda c: c["modified_functions"])``.
+    """
+
+    __slots__ = ("node", "transform")
+
+    def __init__(self, node: str, transform: Optional[Callable[[Any], Any]] = None):
+        self.node = node
+        self.transform = transform
+
+    def resolve(self, results: Dict[str, Any]) -> Any:
+        value = results[self.node]
+        return self.transform(value) if self.transform is not None else value
+
+class PlanNode:
+    """One tool call in a ToolPlan."""
+
+    __slots__ = ("name", "tool", "args", "kwargs", "depends_on", "timeout")
+
+    def __init__(self, name: str, tool: Callable, args: tuple, kwargs: Dict[str, Any],
+                 after: Iterable[str] = (), timeout: Optional[float] = None):
+        self.name = name
+        self.tool = tool
+        self.args = args
+        self.kwargs = kwargs
+        self.timeout = timeout
+        refs = [value.node for value in (*args, *kwargs.values()) if isinstance(value, Ref)]
+        self.depends_on = list(dict.fromkeys([*refs, *after]))
+
+class ToolPlan:
+    """A dependency graph of tool calls.
+
+    Each node is an awaitable callable (usually a `Tool`) with its
+    arguments; arguments that are `Ref`s receive the results of other
+    nodes, which makes those nodes dependencies. `after` adds ordering-only
+    dependencies. Build the plan, then run it with a `PlanExecutor`::
+
+        plan = ToolPlan()
+        current = plan.add("current", analyze_code_structure, code)
+        previous = plan.add("previous", memory.retrieve, key)
+        plan.add("changes", track_code_changes, current, previous)
+        results = await executor.run(plan)
+    """
+
+    def __init__(self):
+        self.nodes: Dict[str, PlanNode] = {}
+
+    def add(self, name: str, tool: Callable, *args: Any, after: Iterable[str] = (),
+            timeout: Optional[float] = None, **kwargs: Any) -> Ref:
+        """Add a node and return a `Ref` to its result.
+
+        `after` and `timeout` configure the node and are never passed to the tool.
+        """
+        if name in self.nodes:
+            raise ValueError(f"Duplicate plan node: {name}")
+        self.nodes[name] = PlanNode(name, tool, args, kwargs, after, timeout)
+        return Ref(name)
+
+    def order(self) -> List[PlanNode]:
+        """Nodes in dependency order; raises ValueError for unknown nodes or cycles."""
+        ordered: List[PlanNode] = []
+        state: Dict[str, str] = {}
+
+        def visit(name: str, path: List[str]):
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Plan has a cycle: {' -> '.join(path + [name])}")
+            node = self.nodes.get(name)
+            if node is None:
+                raise ValueError(f"Plan node '{path[-1]}' depends on unknown node '{name}'")
+            state[name] = "visiting"
+            for dependency in node.depends_on:
+                visit(dependency, path + [name])
+            state[name] = "done"
+            ordered.append(node)
+
+        for name in self.nodes:
+            visit(name, [])
+        return ordered
+
+def tool_name(tool: Callable) -> str:
+    return getattr(tool, "name", None) or getattr(tool, "__qualname__", type(tool).__name__)
+
+class PlanExecutor:
+    """Runs ToolPlans, starting every node as soon as its dependencies finish.
+
+    Independent nodes run concurrently, so a plan takes about as long as its
+    critical path rather than the sum of its nodes. `limits` caps how many
+    calls of a tool (by `Tool.name`) run at once across every plan this
+    executor runs; `timeout` is the default per-node timeout in seconds.
+    When a node fails or times out, the nodes still running are cancelled
+    and its exception is raised.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None, timeout: Optional[float] = None):
+        self.limits = limits or {}
+        self.timeout = timeout
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, tool: Callable) -> Optional[asyncio.Semaphore]:
+        name = tool_name(tool)
+        limit = self.limits.get(name)
+        if not limit:
+            return None
+        semaphore = self._semaphores.get(name)
+        if semaphore is None:
+            semaphore = self._semaphores[name] = asyncio.Semaphore(limit)
+        return semaphore
+
+    async def run(self, plan: ToolPlan) -> Dict[str, Any]:
+        """Execute `plan` and return every node's result by node name."""
+        results: Dict[str, Any] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+        for node in plan.order():
+            dependencies = [tasks[name] for name in node.depends_on]
+            tasks[node.name] = asyncio.create_task(self._run_node(node, dependencies, results))
+        if not tasks:
+            return results
+
+        try:
+            done, pending = await asyncio.wait(tasks.values(), return_when=asyncio.FIRST_EXCEPTION)
+        except asyncio.CancelledError:
+            for task in tasks.values():
+                task.cancel()
+            raise
+        failures = [task.exception() for task in done if not task.cancelled() and task.exception()]
+        if failures:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            raise failures[0]
+        return results
+
+    async def _run_node(self, node: PlanNode, dependencies: List[asyncio.Task],
+                        results: Dict[str, Any]):
+        if dependencies:
+            await asyncio.gather(*dependencies)
+        args = [value.resolve(results) if isinstance(value, Ref) else value for value in node.args]
+        kwargs = {
+            key: value.resolve(results) if isinstance(value, Ref) else value
+            for key, value in node.kwargs.items()
+        }
+        timeout = node.timeout if node.timeout is not None else self.timeout
+        semaphore = self._semaphore(node.tool)
+        try:
+            if semaphore is None:
+                result = await asyncio.wait_for(node.tool(*args, **kwargs), timeout)
+            else:
+                async with semaphore:
+                    result = await asyncio.wait_for(node.tool(*args, **kwargs), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Plan node {node.name} timed out after {timeout}s")
+            raise TimeoutError(f"Tool plan node '{node.name}' timed out after {timeout}s")
+        except Exception as e:
+            logger.error(f"Plan node {node.name} failed: {str(e)}")
+            raise
+        results[node.name] = result
+        return result
@@ -0,0 +1,234 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+import time
+
+def _payload(fields: dict) -> Any:
+    return fields.get(b"payload", fields.get("payload"))
+
+class QueueMessage:
+    """A request pulled from the agent queue."""
+
+    __slots__ = ("payload", "message_id", "source")
+
+    def __init__(self, payload: Any, message_id: Optional[str] = None):
+        self.payload = payload
+        self.message_id = message_id
+        self.source: Optional["BaseQueue"] = None
+
+class BaseQueue(ABC):
+    """Base class for the consumer side of the agent request queue."""
+
+    @abstractmethod
+    async def fetch(self, count: int = 1, timeout: float = 1.0) -> List[QueueMessage]:
+        """Return up to `count` messages, waiting at most `timeout` seconds for the first."""
+        pass
+
+    @abstractmethod
+    async def poll(self, count: int = 1) -> List[QueueMessage]:
+        """Return up to `count` messages that are already waiting, without blocking."""
+        pass
+
+    @abstractmethod
+    async def ack(self, message: QueueMessage) -> None:
+        """Mark a message as fully processed."""
+        pass
+
+class ListQueue(BaseQueue):
+    """Consumer for the plain Redis list the web server RPUSHes onto.
+
+    A popped message is gone from Redis, so acknowledgement is a no-op and a
+    worker crash loses whatever it had in flight.
+    """
+
+    def __init__(self, redis_client, name: str = "agent_requests"):
+        self.redis = redis_client
+        self.name = name
+
+    async def fetch(self, count: int = 1, timeout: float = 1.0) -> List[QueueMessage]:
+        item = await self.redis.blpop(self.name, timeout=timeout)
+        if not item:
+            return []
+        messages = [QueueMessage(item[1])]
+        if count > 1:
+            rest = await self.redis.lpop(self.name, count - 1)
+            messages.extend(QueueMessage(raw) for raw in rest or [])
+        return messages
+
+    async def poll(self, count: int = 1) -> List[QueueMessage]:
+        items = await self.redis.lpop(self.name, count)
+        return [QueueMessage(raw) for raw in items or []]
+
+    async def ack(self, message: QueueMessage) -> None:
+        pass
+
+class StreamQueue(BaseQueue):
+    """Consumer-group reader for the Redis stream transport.
+
+    Messages are read with XREADGROUP and stay in the group's pending list
+    until acknowledged, at which point they are XACKed and deleted so the
+    stream length reflects outstanding work. Entries that have been pending
+    for longer than `claim_idle_ms` (their worker died) are reclaimed with
+    XAUTOCLAIM. `claim_idle_ms` must comfortably exceed the longest expected
+    processing time, otherwise slow requests get processed twice.
+    """
+
+    def __init__(self, redis_client, name: str = "agent_requests", group: str = "agent_workers",
+                 consumer: str = "worker", claim_idle_ms: int = 60000,
+                 reclaim_interval: float = 5.0):
+        self.redis = redis_client
+        self.stream = f"{name}:stream"
+        self.group = group
+        self.consumer = consumer
+        self.claim_idle_ms = claim_idle_ms
+        self.reclaim_interval = reclaim_interval
+        self._group_ready = False
+        self._claim_cursor = "0-0"
+        self._last_reclaim = 0.0
+
+    async def _ensure_group(self):
+        if self._group_ready:
+            return
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    async def reclaim(self, count: int = 1) -> List[QueueMessage]:
+        """Take over entries left pending by consumers that stopped acknowledging."""
+        await self._ensure_group()
+        self._last_reclaim = time.monotonic()
+        result = await self.redis.xautoclaim(
+            self.stream,
+            self.group,
+            self.consumer,
+            min_idle_time=self.claim_idle_ms,
+            start_id=self._claim_cursor,
+            count=count
+        )
+        self._claim_cursor = result[0]
+        return [
+            QueueMessage(_payload(fields), message_id)
+            for message_id, fields in result[1]
+            if fields
+        ]
+
+    async def fetch(self, count: int = 1, timeout: float = 1.0) -> List[QueueMessage]:
+        return await self._read(count, block=max(1, int(timeout * 1000)))
+
+    async def poll(self, count: int = 1) -> List[QueueMessage]:
+        return await self._read(count, block=None)
+
+    async def _read(self, count: int, block: Optional[int]) -> List[QueueMessage]:
+        await self._ensure_group()
+        if time.monotonic() - self._last_reclaim >= self.reclaim_interval:
+            messages = await self.reclaim(count)
+            if messages:
+                return messages
+
+        result = await self.redis.xreadgroup(
+            self.group,
+            self.consumer,
+            {self.stream: ">"},
+            count=count,
+            block=block
+        )
+        messages = []
+        for _, entries in result or []:
+            messages.extend(QueueMessage(_payload(fields), message_id) for message_id, fields in entries)
+        return messages
+
+    async def ack(self, message: QueueMessage) -> None:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.xack(self.stream, self.group, message.message_id)
+            pipe.xdel(self.stream, message.message_id)
+            await pipe.execute()
+
+class WeightedQueue(BaseQueue):
+    """Drains several priority lanes with weighted fairness.
+
+    `lanes` are `(queue, weight)` pairs in priority order. Each fetch splits
+    its `count` between the lanes by smooth weighted round-robin, so with
+    weights 4:1 a saturated batch lane still gets one slot in five and can
+    never starve, while interactive work is never stuck behind a batch
+    backlog. Slots a lane cannot fill go to the other lanes in priority
+    order. When every lane is empty the fetch blocks on the first lane, so
+    work arriving only on a lower lane waits at most `timeout` seconds.
+    """
+
+    def __init__(self, lanes: List[Tuple[BaseQueue, int]]):
+        if not lanes or any(weight <= 0 for _, weight in lanes):
+            raise ValueError("WeightedQueue needs at least one lane, all with positive weights")
+        self.lanes = lanes
+        self._total_weight = sum(weight for _, weight in lanes)
+        self._current = [0] * len(lanes)
+
+    def _quotas(self, count: int) -> List[int]:
+        quotas = [0] * len(self.lanes)
+        for _ in range(count):
+            for i, (_, weight) in enumerate(self.lanes):
+                self._current[i] += weight
+            chosen = max(range(len(self.lanes)), key=self._current.__getitem__)
+            self._current[chosen] -= self._total_weight
+            quotas[chosen] += 1
+        return quotas
+
+    async def poll(self, count: int = 1) -> List[QueueMessage]:
+        messages: List[QueueMessage] = []
+        for (lane, _), quota in zip(self.lanes, self._quotas(count)):
+            if quota:
+                messages.extend(self._tag(lane, await lane.poll(quota)))
+        # Hand slots left over by empty lanes to the others, highest priority first
+        for lane, _ in self.lanes:
+            if len(messages) >= count:
+                break
+            messages.extend(self._tag(lane, await lane.poll(count - len(messages))))
+        return messages
+
+    async def fetch(self, count: int = 1, timeout: float = 1.0) -> List[QueueMessage]:
+        messages = await self.poll(count)
+        if messages:
+            return messages
+        lane = self.lanes[0][0]
+        return self._tag(lane, await lane.fetch(count, timeout))
+
+    async def ack(self, message: QueueMessage) -> None:
+        await message.source.ack(message)
+
+    @staticmethod
+    def _tag(lane: BaseQueue, messages: List[QueueMessage]) -> List[QueueMessage]:
+        for message in messages:
+            message.source = lane
+        return messages
+
+def _create_lane(redis_client, settings, name: str, consumer: str) -> BaseQueue:
+    if settings.QUEUE_TRANSPORT == "stream":
+        return StreamQueue(
+            redis_client,
+            name,
+            consumer=consumer,
+            claim_idle_ms=settings.QUEUE_CLAIM_IDLE_MS
+        )
+    if settings.QUEUE_TRANSPORT == "list":
+        return ListQueue(redis_client, name)
+    raise ValueError(f"Unknown queue transport: {settings.QUEUE_TRANSPORT}")
+
+def lane_queue_name(settings, lane: str) -> str:
+    """Queue name of a priority lane; matches the web server's `lane_queue`."""
+    return settings.QUEUE_NAME if lane == "interactive" else f"{settings.QUEUE_NAME}:{lane}"
+
+def create_queue(redis_client, settings, consumer: str = "worker") -> BaseQueue:
+    """Build the queue consumer matching the web server's AGENT_QUEUE_TRANSPORT.
+
+    Every lane in QUEUE_LANE_WEIGHTS is consumed; the lane listed first is
+    the one idle workers block on.
+    """
+    weights: Dict[str, int] = settings.QUEUE_LANE_WEIGHTS
+    lanes = [
+        (_create_lane(redis_client, settings, lane_queue_name(settings, lane), consumer), weight)
+        for lane, weight in weights.items()
+    ]
+    if len(lanes) == 1:
+        return lanes[0][0]
+    return WeightedQueue(lanes)
@@ -0,0 +1,69 @@
+import asyncio
+import time
+import uuid
+from typing import Any, Dict, Optional
+from .codec import Codec
+
+# Seconds between checks while another worker runs the same idempotency key.
+CLAIM_POLL_INTERVAL = 0.1
+
+class ResultStore:
+    """Completed replies by idempotency key, so retried requests run once.
+
+    ``agent_result:{key}`` holds either a claim (a worker is running the
+    request; kept at most `claim_ttl` seconds, so a crashed worker's claim
+    lapses) or the stored reply (kept `ttl` seconds). A worker calls
+    `claim` before executing: it returns the stored reply to replay, or
+    None once the caller owns the key and must `complete` or `release` it.
+    Duplicates that arrive while the first attempt runs wait for its reply
+    instead of starting their own. Failed attempts are released, not
+    stored, so a retry runs again.
+    """
+
+    def __init__(self, redis_client, ttl: int = 3600, claim_ttl: int = 300,
+                 codec: Optional[Codec] = None, prefix: str = "agent_result"):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.claim_ttl = claim_ttl
+        self.codec = codec or Codec()
+        self.prefix = prefix
+        self.replayed = 0
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """The stored reply for `key`, or None while it is missing or claimed."""
+        raw = await self.redis.get(self._key(key))
+        if raw is None:
+            return None
+        entry = self.codec.decode(raw)
+        return entry.get("reply") if entry.get("status") == "done" else None
+
+    async def claim(self, key: str, deadline: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Claim `key` (returns None) or return its stored reply.
+
+        While another worker holds the claim this waits, up to `deadline`
+        (epoch seconds; default `claim_ttl` from now), and raises
+        TimeoutError when it passes.
+        """
+        if deadline is None:
+            deadline = time.time() + self.claim_ttl
+        marker = self.codec.encode({"status": "running", "owner": uuid.uuid4().hex})
+        while True:
+            if await self.redis.set(self._key(key), marker, nx=True, ex=self.claim_ttl):
+                return None
+            reply = await self.get(key)
+            if reply is not None:
+                self.replayed += 1
+                return reply
+            if time.time() > deadline:
+                raise TimeoutError(f"Request {key} is still running elsewhere")
+            await asyncio.sleep(CLAIM_POLL_INTERVAL)
+
+    async def complete(self, key: str, reply: Dict[str, Any]):
+        await self.redis.set(self._key(key), self.codec.encode({"status": "done", "reply": reply}),
+                             ex=self.ttl)
+
+    async def release(self, key: str):
+        await self.redis.delete(self._key(key))
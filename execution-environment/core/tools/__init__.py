@@ -0,0 +1,136 @@
+from typing import Any, Callable, Dict, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from functools import wraps
+import multiprocessing
+import importlib
+import asyncio
+import signal
+from .cache import ToolResultCache
+from utils.instrumentation import span
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Shared pool for CPU-bound tools; None means they run inline on the event loop.
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+def _init_pool_process(modules: List[str]):
+    # Ctrl-C is handled by the worker that owns the pool, which shuts it down.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for module in modules:
+        importlib.import_module(module)
+
+def _noop():
+    pass
+
+def _run_cpu_bound(module: str, attr: str, args: tuple, kwargs: dict) -> Any:
+    # Runs in a pool process. Only the module path, attribute name and the
+    # call arguments cross the process boundary, never the function itself.
+    target = getattr(importlib.import_module(module), attr)
+    func = target.func if isinstance(target, Tool) else target
+    return func(*args, **kwargs)
+
+def configure_process_pool(max_workers: Optional[int] = None,
+                           preload: Optional[List[str]] = None) -> Optional[ProcessPoolExecutor]:
+    """Create the shared process pool used by CPU-bound tools.
+
+    `max_workers=0` disables the pool so CPU-bound tools run inline. `preload`
+    lists modules each pool process imports at startup.
+    """
+    global _process_pool
+    shutdown_process_pool()
+    if max_workers == 0:
+        return None
+    _process_pool = ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_pool_process,
+        initargs=(preload or [],)
+    )
+    return _process_pool
+
+def get_process_pool() -> Optional[ProcessPoolExecutor]:
+    return _process_pool
+
+async def warm_up_process_pool():
+    """Start every pool process now instead of on the first CPU-bound call."""
+    if _process_pool is None:
+        return
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(
+        loop.run_in_executor(_process_pool, _noop)
+        for _ in range(_process_pool._max_workers)
+    ))
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True, cancel_futures=True)
+        _process_pool = None
+
+class Tool:
+    """Base class for agent tools/skills."""
+    
+    def __init__(self, func: Callable, name: str, description: str,
+                 version: str = "1", cache: Optional[ToolResultCache] = None,
+                 cpu_bound: bool = False):
+        self.func = func
+        self.name = name
+        self.description = description
+        self.version = version
+        self.cache = cache
+        self.cpu_bound = cpu_bound
+        self.stage = f"tool.{name}"
+    
+    async def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        logger.debug(f"Executing tool: {self.name}")
+        with span(self.stage):
+            return await self._call(args, kwargs)
+    
+    async def _call(self, args: tuple, kwargs: dict) -> Any:
+        if self.cache is not None:
+            key = self.cache.key(self.name, self.version, args, kwargs)
+            found, result = await self.cache.get(key)
+            if found:
+                return result
+        try:
+            if self.cpu_bound:
+                result = await self._run_cpu_bound(args, kwargs)
+            else:
+                result = await self.func(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Error executing tool {self.name}: {str(e)}")
+            raise
+        if self.cache is not None:
+            await self.cache.put(key, result)
+        return result
+    
+    async def _run_cpu_bound(self, args: tuple, kwargs: dict) -> Any:
+        pool = get_process_pool()
+        if pool is None:
+            return self.func(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            pool, _run_cpu_bound, self.func.__module__, self.func.__name__, args, kwargs
+        )
+
+def register_tool(name: str, description: str = "", version: str = "1",
+                  cache: Optional[ToolResultCache] = None, cpu_bound: bool = False):
+    """Decorator to register a function as an agent tool.
+    
+    Pass a `cache` for deterministic tools to reuse results for identical
+    inputs; bump `version` whenever the tool's output changes.
+    
+    CPU-bound tools are plain (non-async) module-level functions. When a
+    process pool is configured they run there, so they must take and return
+    small picklable values.
+    """
+    def decorator(func: Callable) -> Tool:
+        if cpu_bound:
+            return Tool(func, name, description, version=version, cache=cache, cpu_bound=True)
+
+        @wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            return await func(*args, **kwargs)
+        return Tool(wrapper, name, description, version=version, cache=cache)
+    return decorator
@@ -0,0 +1,293 @@
+import ast
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+FUNCTION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef)
+SCOPE_NODES = FUNCTION_NODES + (ast.ClassDef,)
+
+class TraversalContext:
+    """State shared with plugins while the engine walks a tree."""
+
+    def __init__(self, source: str):
+        self.source = source
+        # One record per enclosing function, innermost last; plugins annotate these.
+        self.function_stack: List[Dict[str, Any]] = []
+        self.class_stack: List[Dict[str, Any]] = []
+        # Names of every enclosing class and function, outermost first.
+        self.scope: List[str] = []
+
+    @property
+    def current_function(self) -> Optional[Dict[str, Any]]:
+        return self.function_stack[-1] if self.function_stack else None
+
+class MetricPlugin:
+    """Base class for metrics computed during the engine's single traversal.
+
+    `node_types` lists the AST node classes the plugin wants to see
+    (subclasses included, so ``(ast.AST,)`` sees every node); `enter` is
+    called before a node's children are visited and `leave` after.
+    """
+
+    node_types: Tuple[Type[ast.AST], ...] = ()
+
+    def start(self, analysis: Dict[str, Any], ctx: TraversalContext):
+        pass
+
+    def enter(self, node: ast.AST, ctx: TraversalContext):
+        pass
+
+    def leave(self, node: ast.AST, ctx: TraversalContext):
+        pass
+
+    def finish(self, analysis: Dict[str, Any], ctx: TraversalContext):
+        pass
+
+class AnalysisEngine:
+    """Runs every registered metric plugin in one pass over the AST."""
+
+    def __init__(self, plugins: Optional[List[MetricPlugin]] = None):
+        self.plugins: List[MetricPlugin] = []
+        # Plugins per concrete node class, resolved on first sight of the class
+        self._dispatch: Dict[Type[ast.AST], List[MetricPlugin]] = {}
+        for plugin in plugins or []:
+            self.register(plugin)
+
+    def register(self, plugin: MetricPlugin) -> MetricPlugin:
+        self.plugins.append(plugin)
+        self._dispatch.clear()
+        return plugin
+
+    def _handlers(self, node_type: Type[ast.AST]) -> List[MetricPlugin]:
+        handlers = self._dispatch.get(node_type)
+        if handlers is None:
+            handlers = self._dispatch[node_type] = [
+                plugin for plugin in self.plugins if issubclass(node_type, plugin.node_types)
+            ]
+        return handlers
+
+    def analyze(self, code: str) -> Dict[str, Any]:
+        tree = ast.parse(code)
+        analysis = {
+            "classes": [],
+            "functions": [],
+            "imports": [],
+            "complexity_indicators": {
+                "num_functions": 0,
+                "num_classes": 0,
+                "lines_of_code": len(code.splitlines()),
+            }
+        }
+        self._ctx = TraversalContext(code)
+        for plugin in self.plugins:
+            plugin.start(analysis, self._ctx)
+        self.visit(tree)
+        for plugin in self.plugins:
+            plugin.finish(analysis, self._ctx)
+        return analysis
+
+    def visit(self, tree: ast.AST):
+        """Walk `tree` depth first, entering each node before its children and leaving it after.
+
+        The walk keeps its own stack instead of recursing, so deeply nested
+        expressions that `ast.parse` accepts cannot hit the recursion limit.
+        """
+        stack: List[Tuple[ast.AST, bool]] = [(tree, False)]
+        while stack:
+            node, leaving = stack.pop()
+            if leaving:
+                self._leave(node)
+                continue
+            self._enter(node)
+            stack.append((node, True))
+            children = list(ast.iter_child_nodes(node))
+            stack.extend((child, False) for child in reversed(children))
+
+    def _enter(self, node: ast.AST):
+        ctx = self._ctx
+        if isinstance(node, FUNCTION_NODES):
+            ctx.function_stack.append({
+                "name": node.name,
+                "qualname": ".".join(ctx.scope + [node.name]),
+                "args": [arg.arg for arg in node.args.args],
+                "line_number": node.lineno,
+                "is_async": isinstance(node, ast.AsyncFunctionDef),
+            })
+        elif isinstance(node, ast.ClassDef):
+            ctx.class_stack.append({
+                "name": node.name,
+                "qualname": ".".join(ctx.scope + [node.name]),
+                "methods": [m.name for m in node.body if isinstance(m, FUNCTION_NODES)],
+                "line_number": node.lineno,
+            })
+        if isinstance(node, SCOPE_NODES):
+            ctx.scope.append(node.name)
+
+        for plugin in self._handlers(type(node)):
+            plugin.enter(node, ctx)
+
+    def _leave(self, node: ast.AST):
+        ctx = self._ctx
+        for plugin in self._handlers(type(node)):
+            plugin.leave(node, ctx)
+
+        if isinstance(node, SCOPE_NODES):
+            ctx.scope.pop()
+        if isinstance(node, FUNCTION_NODES):
+            ctx.function_stack.pop()
+        elif isinstance(node, ast.ClassDef):
+            ctx.class_stack.pop()
+
+class StructurePlugin(MetricPlugin):
+    """Classes, functions (sync and async, including methods) and imports."""
+
+    node_types = (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef, ast.Import, ast.ImportFrom)
+
+    def start(self, analysis, ctx):
+        self.analysis = analysis
+
+    def enter(self, node, ctx):
+        indicators = self.analysis["complexity_indicators"]
+        if isinstance(node, ast.ClassDef):
+            self.analysis["classes"].append(ctx.class_stack[-1])
+            indicators["num_classes"] += 1
+        elif isinstance(node, FUNCTION_NODES):
+            self.analysis["functions"].append(ctx.current_function)
+            indicators["num_functions"] += 1
+        elif isinstance(node, ast.Import):
+            self.analysis["imports"].extend(alias.name for alias in node.names)
+        else:
+            prefix = "." * node.level + (node.module or "")
+            self.analysis["imports"].extend(
+                f"{prefix}.{alias.name}" if node.module else f"{prefix}{alias.name}"
+                for alias in node.names
+            )
+
+class CyclomaticComplexityPlugin(MetricPlugin):
+    """McCabe complexity per function: 1 + one per decision point."""
+
+    node_types = tuple(filter(None, (
+        ast.FunctionDef, ast.AsyncFunctionDef, ast.If, ast.IfExp, ast.For, ast.AsyncFor,
+        ast.While, ast.ExceptHandler, ast.BoolOp, ast.comprehension,
+        getattr(ast, "match_case", None),
+    )))
+
+    def start(self, analysis, ctx):
+        self.max_complexity = 0
+
+    def enter(self, node, ctx):
+        function = ctx.current_function
+        if isinstance(node, FUNCTION_NODES):
+            function["complexity"] = 1
+        elif function is None:
+            return
+        elif isinstance(node, ast.BoolOp):
+            function["complexity"] += len(node.values) - 1
+        elif isinstance(node, ast.comprehension):
+            function["complexity"] += 1 + len(node.ifs)
+        else:
+            function["complexity"] += 1
+
+    def leave(self, node, ctx):
+        if isinstance(node, FUNCTION_NODES):
+            self.max_complexity = max(self.max_complexity, ctx.current_function["complexity"])
+
+    def finish(self, analysis, ctx):
+        analysis["complexity_indicators"]["max_complexity"] = self.max_complexity
+
+class NestingDepthPlugin(MetricPlugin):
+    """Deepest block nesting per function (and for the module as a whole)."""
+
+    BLOCK_NODES = tuple(filter(None, (
+        ast.If, ast.For, ast.AsyncFor, ast.While, ast.With, ast.AsyncWith, ast.Try,
+        getattr(ast, "TryStar", None), getattr(ast, "Match", None),
+    )))
+    node_types = FUNCTION_NODES + BLOCK_NODES
+
+    def start(self, analysis, ctx):
+        self.depths = [0]
+        self.max_depth = 0
+
+    def enter(self, node, ctx):
+        if isinstance(node, FUNCTION_NODES):
+            ctx.current_function["max_nesting"] = 0
+            self.depths.append(0)
+            return
+        self.depths[-1] += 1
+        self.max_depth = max(self.max_depth, self.depths[-1])
+        function = ctx.current_function
+        if function is not None:
+            function["max_nesting"] = max(function["max_nesting"], self.depths[-1])
+
+    def leave(self, node, ctx):
+        if isinstance(node, FUNCTION_NODES):
+            self.depths.pop()
+        else:
+            self.depths[-1] -= 1
+
+    def finish(self, analysis, ctx):
+        analysis["complexity_indicators"]["max_nesting_depth"] = self.max_depth
+
+class FunctionLengthPlugin(MetricPlugin):
+    """Lines of code per function, from the `def` line to its last line."""
+
+    node_types = FUNCTION_NODES
+
+    def enter(self, node, ctx):
+        end = getattr(node, "end_lineno", None) or node.lineno
+        ctx.current_function["loc"] = end - node.lineno + 1
+
+def node_token(node: ast.AST) -> bytes:
+    """A node's type and field values, with each child node reduced to a placeholder.
+
+    Position attributes are not fields, so they are left out, as in `ast.dump`.
+    """
+    parts = [type(node).__name__]
+    for name, value in ast.iter_fields(node):
+        if isinstance(value, list):
+            items = ",".join("." if isinstance(item, ast.AST) else repr(item) for item in value)
+            parts.append(f"{name}=[{items}]")
+        elif isinstance(value, ast.AST):
+            parts.append(f"{name}=.")
+        else:
+            parts.append(f"{name}={value!r}")
+    return "|".join(parts).encode()
+
+class FingerprintPlugin(MetricPlugin):
+    """Content hash per class and function, used to tell which symbols changed.
+
+    The hash covers the symbol's AST without line numbers, so moving a
+    function or reformatting it does not count as a modification. Each
+    node's digest combines its own token with its children's digests, so
+    the whole tree is hashed once, during the engine's traversal.
+    """
+
+    node_types = (ast.AST,)
+
+    def start(self, analysis, ctx):
+        # Digests of the finished children of each open node inside a symbol, innermost last
+        self.children: List[List[bytes]] = []
+
+    def enter(self, node, ctx):
+        if self.children or isinstance(node, SCOPE_NODES):
+            self.children.append([])
+
+    def leave(self, node, ctx):
+        if not self.children:
+            return
+        digest = hashlib.sha1(node_token(node))
+        for child in self.children.pop():
+            digest.update(child)
+        if self.children:
+            self.children[-1].append(digest.digest())
+        if isinstance(node, SCOPE_NODES):
+            record = ctx.class_stack[-1] if isinstance(node, ast.ClassDef) else ctx.current_function
+            record["fingerprint"] = digest.hexdigest()
+
+def default_plugins() -> List[MetricPlugin]:
+    return [
+        StructurePlugin(),
+        CyclomaticComplexityPlugin(),
+        NestingDepthPlugin(),
+        FunctionLengthPlugin(),
+        FingerprintPlugin(),
+    ]
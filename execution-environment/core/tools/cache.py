@@ -0,0 +1,88 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import hashlib
+import json
+import time
+
+class ToolResultCache:
+    """Content-addressed LRU cache for deterministic tool results.
+
+    Keys are a SHA-256 of the tool name, tool version and JSON-encoded
+    arguments, so resubmitting the same source text hits the cache no matter
+    who sent it, and bumping a tool's version invalidates its old entries.
+    Results are kept JSON-encoded, which makes every hit an independent copy
+    that callers may mutate. When bound to a memory backend, entries are also
+    written there so other workers can reuse them. With a `ttl`, entries
+    expire after that many seconds in both tiers.
+    """
+
+    def __init__(self, max_entries: int = 1024, memory=None, ttl: Optional[int] = None,
+                 prefix: str = "tool_cache:"):
+        self.max_entries = max_entries
+        self.memory = memory
+        self.ttl = ttl
+        self.prefix = prefix
+        self._entries: "OrderedDict[str, Tuple[str, Optional[float]]]" = OrderedDict()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def configure(self, max_entries: Optional[int] = None, memory=None, ttl: Optional[int] = None):
+        if max_entries is not None:
+            self.max_entries = max_entries
+            self._evict()
+        self.memory = memory
+        self.ttl = ttl
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+        }
+
+    @staticmethod
+    def key(tool_name: str, version: str, args: tuple, kwargs: dict) -> str:
+        payload = json.dumps([tool_name, version, args, kwargs], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def get(self, key: str) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            encoded, expires_at = entry
+            if expires_at is None or expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, json.loads(encoded)
+            del self._entries[key]
+        if self.memory is not None:
+            encoded = await self.memory.retrieve(self.prefix + key)
+            if encoded is not None:
+                self._remember(key, encoded)
+                self.shared_hits += 1
+                return True, json.loads(encoded)
+        self.misses += 1
+        return False, None
+
+    async def put(self, key: str, value: Any):
+        encoded = json.dumps(value, default=str)
+        self._remember(key, encoded)
+        if self.memory is not None:
+            await self.memory.store(self.prefix + key, encoded, self.ttl)
+
+    def clear(self):
+        self._entries.clear()
+
+    def _remember(self, key: str, encoded: str):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._entries[key] = (encoded, expires_at)
+        self._entries.move_to_end(key)
+        self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -1,75 +1,86 @@
-import ast
 import json
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional
 from ..tools import register_tool
-from ...utils.logger import setup_logger
+from .analysis_engine import AnalysisEngine, default_plugins
+from .cache import ToolResultCache
+from utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Shared by the deterministic analysis tools; sized and bound to agent memory by the agent.
+analysis_cache = ToolResultCache()
+
+# Register extra MetricPlugins here; they all run in the same single traversal.
+analysis_engine = AnalysisEngine(default_plugins())
+
+def _symbol(record: Dict) -> str:
+    return record.get("qualname", record["name"])
+
 @register_tool(
     name="analyze_code_structure",
-    description="Analyzes Python code structure and returns insights"
+    description="Analyzes Python code structure and returns insights",
+    version="3",
+    cache=analysis_cache,
+    cpu_bound=True
 )
-async def analyze_code_structure(code: str) -> Dict:
+def analyze_code_structure(code: str) -> Dict:
     """Analyze Python code structure and return detailed insights."""
     try:
-        tree = ast.parse(code)
-        analysis = {
-            "classes": [],
-            "functions": [],
-            "imports": [],
-            "complexity_indicators": {
-                "num_functions": 0,
-                "num_classes": 0,
-                "lines_of_code": len(code.splitlines()),
-            }
-        }
-        
-        for node in ast.walk(tree):
-            if isinstance(node, ast.ClassDef):
-                analysis["classes"].append({
-                    "name": node.name,
-                    "methods": [m.name for m in node.body if isinstance(m, ast.FunctionDef)],
-                    "line_number": node.lineno
-                })
-                analysis["complexity_indicators"]["num_classes"] += 1
-                
-            elif isinstance(node, ast.FunctionDef):
-                analysis["functions"].append({
-                    "name": node.name,
-                    "args": [arg.arg for arg in node.args.args],
-                    "line_number": node.lineno
-                })
-                analysis["complexity_indicators"]["num_functions"] += 1
-                
-            elif isinstance(node, ast.Import):
-                analysis["imports"].extend(n.name for n in node.names)
-            elif isinstance(node, ast.ImportFrom):
-                analysis["imports"].append(f"{node.module}.{node.names[0].name}")
-        
-        return analysis
+        return analysis_engine.analyze(code)
     except Exception as e:
         logger.error(f"Error analyzing code: {str(e)}")
         return {"error": str(e)}
 
 @register_tool(
     name="suggest_improvements",
-    description="Suggests code improvements based on analysis"
+    description="Suggests code improvements based on analysis",
+    version="3",
+    cache=analysis_cache
 )
-async def suggest_improvements(analysis: Dict) -> List[Dict]:
-    """Generate improvement suggestions based on code analysis."""
+async def suggest_improvements(analysis: Dict, only: Optional[List[str]] = None) -> List[Dict]:
+    """Generate improvement suggestions based on code analysis.
+    
+    Per-symbol suggestions carry the symbol's qualified name in `symbol`.
+    Pass `only` to limit the per-symbol passes to those names; module-wide
+    checks always run.
+    """
     suggestions = []
+    selected = None if only is None else set(only)
     
     # Check class complexity
     for class_info in analysis["classes"]:
+        if selected is not None and _symbol(class_info) not in selected:
+            continue
         if len(class_info["methods"]) > 10:
             suggestions.append({
                 "type": "class_complexity",
+                "symbol": _symbol(class_info),
                 "class_name": class_info["name"],
                 "suggestion": "Consider splitting this class into smaller, more focused classes",
                 "reason": f"Class has {len(class_info['methods'])} methods, which might indicate too many responsibilities"
             })
     
+    # Check function complexity and nesting
+    for function_info in analysis["functions"]:
+        if selected is not None and _symbol(function_info) not in selected:
+            continue
+        if function_info.get("complexity", 0) > 10:
+            suggestions.append({
+                "type": "function_complexity",
+                "symbol": _symbol(function_info),
+                "function_name": function_info["name"],
+                "suggestion": "Consider breaking this function into smaller helpers",
+                "reason": f"Cyclomatic complexity of {function_info['complexity']} makes it hard to test"
+            })
+        if function_info.get("max_nesting", 0) > 4:
+            suggestions.append({
+                "type": "deep_nesting",
+                "symbol": _symbol(function_info),
+                "function_name": function_info["name"],
+                "suggestion": "Consider early returns or extracting nested blocks",
+                "reason": f"Blocks are nested {function_info['max_nesting']} levels deep"
+            })
+    
     # Check import organization
     if len(analysis["imports"]) > 15:
         suggestions.append({
@@ -88,34 +99,54 @@ async def suggest_improvements(analysis: Dict) -> List[Dict]:
     
     return suggestions
 
+def reuse_suggestions(previous: List[Dict], analysis: Dict, changed: Iterable[str]) -> List[Dict]:
+    """Previous per-symbol suggestions for symbols that still exist and did not change."""
+    changed = set(changed)
+    live = {_symbol(r) for r in analysis["classes"] + analysis["functions"]}
+    return [
+        s for s in previous
+        if s.get("symbol") in live and s["symbol"] not in changed
+    ]
+
+def _diff_symbols(current: List[Dict], previous: List[Dict]) -> Dict[str, List[str]]:
+    current_prints = {_symbol(r): r.get("fingerprint") for r in current}
+    previous_prints = {_symbol(r): r.get("fingerprint") for r in previous}
+    return {
+        "added": [name for name in current_prints if name not in previous_prints],
+        "removed": [name for name in previous_prints if name not in current_prints],
+        # A missing fingerprint (snapshot from an older version) counts as modified
+        "modified": [
+            name for name, fingerprint in current_prints.items()
+            if name in previous_prints
+            and (fingerprint is None or fingerprint != previous_prints[name])
+        ]
+    }
+
 @register_tool(
     name="track_code_changes",
-    description="Tracks changes in code structure over time"
+    description="Tracks changes in code structure over time",
+    version="2"
 )
 async def track_code_changes(current_analysis: Dict, previous_analysis: Optional[Dict]) -> Dict:
-    """Track and analyze changes between code versions."""
+    """Track and analyze changes between code versions.
+    
+    Classes and functions are matched by qualified name and compared by
+    fingerprint, so edits inside a function show up as `modified_functions`.
+    """
     if not previous_analysis:
         return {"message": "No previous analysis available for comparison"}
     
-    changes = {
-        "added_classes": [],
-        "removed_classes": [],
-        "modified_classes": [],
-        "added_functions": [],
-        "removed_functions": [],
-        "complexity_change": {}
-    }
-    
-    # Track class changes
-    current_classes = {c["name"] for c in current_analysis["classes"]}
-    previous_classes = {c["name"] for c in previous_analysis["classes"]}
+    changes = {"complexity_change": {}}
     
-    changes["added_classes"] = list(current_classes - previous_classes)
-    changes["removed_classes"] = list(previous_classes - current_classes)
+    # Track class and function changes
+    for kind in ("classes", "functions"):
+        diff = _diff_symbols(current_analysis[kind], previous_analysis.get(kind, []))
+        for change, names in diff.items():
+            changes[f"{change}_{kind}"] = names
     
     # Track complexity changes
     for metric, value in current_analysis["complexity_indicators"].items():
         prev_value = previous_analysis["complexity_indicators"].get(metric, 0)
         changes["complexity_change"][metric] = value - prev_value
     
-    return changes 
\ No newline at end of file
+    return changes
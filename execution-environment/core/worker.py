@@ -0,0 +1,320 @@
+from contextlib import nullcontext
+from typing import Any, Dict, Optional, Set
+import asyncio
+import json
+import os
+import socket
+import time
+from .agent import BaseAgent
+from .agent_pool import AgentPool
+from .codec import Codec
+from .queue import BaseQueue, QueueMessage
+from .result_store import ResultStore
+from .single_flight import SingleFlight, request_key
+from utils.instrumentation import Trace, current_trace, span, stage_metrics
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Seconds between checks while waiting for a slow stream reader to catch up.
+BACKPRESSURE_POLL_INTERVAL = 0.05
+
+# Hash of worker name -> JSON heartbeat, read by the web server's health prober.
+WORKERS_KEY = "agent_workers"
+
+class AgentWorker:
+    """Consumes the agent request queue and runs each request through an agent.
+
+    Requests are pulled in batches and processed concurrently, with at most
+    `concurrency` requests in flight. Replies go to the request's `reply_to`
+    channel when the web server supplied one, otherwise to
+    ``agent_responses:{id}``. Requests flagged `stream` instead get each item
+    of `agent.process_stream` appended to the Redis stream
+    ``agent_stream:{id}``, followed by an `end` or `error` event; setting
+    ``agent_cancel:{id}`` stops such a request early. Each request continues
+    the trace the web server started (its `trace` field); per-stage timings
+    go to the latency histograms and back to the caller in the reply.
+    Identical requests (same query and context) that are processed at the
+    same time share one agent call unless `coalesce` is off. Requests whose
+    `deadline` (epoch seconds) has passed are dropped without a reply: the
+    web server has already given up on them. Payloads, replies and stream
+    items go through `codec`, which also reads the plain JSON older web
+    servers send. With a `pool`, each request runs on the pooled agent for
+    its ``context["profile"]`` (default: `agent`), and turns of the same
+    ``context["session_id"]`` run one at a time. With a `results` store,
+    requests carrying an `idempotency_key` run once: repeats get the stored
+    reply. Reply lists expire `reply_ttl` seconds after the last reply, so
+    replies nobody collects do not pile up. While running, the worker writes
+    a heartbeat (in-flight count, concurrency, draining) under its `name` in
+    ``agent_workers`` every `heartbeat_interval` seconds. `stop()` stops
+    fetching; `run()` then waits up to `drain_timeout` seconds for in-flight
+    requests before returning.
+    """
+
+    def __init__(self, agent: BaseAgent, queue: BaseQueue, redis_client,
+                 concurrency: int = 8, batch_size: int = 8,
+                 drain_timeout: float = 30.0, poll_timeout: float = 1.0,
+                 stream_maxlen: int = 10000, stream_ttl: int = 300,
+                 stream_high_water: int = 1000, coalesce: bool = True,
+                 codec: Optional[Codec] = None, pool: Optional[AgentPool] = None,
+                 results: Optional[ResultStore] = None, reply_ttl: int = 300,
+                 name: Optional[str] = None, heartbeat_interval: float = 5.0):
+        self.agent = agent
+        self.pool = pool
+        self.queue = queue
+        self.redis = redis_client
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.drain_timeout = drain_timeout
+        self.poll_timeout = poll_timeout
+        self.stream_maxlen = stream_maxlen
+        self.stream_ttl = stream_ttl
+        self.stream_high_water = stream_high_water
+        self.single_flight = SingleFlight() if coalesce else None
+        self.codec = codec or Codec()
+        self.results = results
+        self.reply_ttl = reply_ttl
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.heartbeat_interval = heartbeat_interval
+        self.expired = 0
+        self._tasks: Set[asyncio.Task] = set()
+        self._stopping = asyncio.Event()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def stop(self):
+        """Stop pulling new work; in-flight requests are allowed to finish."""
+        if not self._stopping.is_set():
+            logger.info("Worker stopping, draining in-flight requests")
+            self._stopping.set()
+
+    async def run(self):
+        logger.info(f"Worker started (concurrency={self.concurrency}, batch_size={self.batch_size})")
+        heartbeat = asyncio.create_task(self._heartbeat()) if self.heartbeat_interval else None
+        try:
+            await self._fetch_loop()
+            await self.drain()
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+                await asyncio.gather(heartbeat, return_exceptions=True)
+                try:
+                    await self.redis.hdel(WORKERS_KEY, self.name)
+                except Exception as e:
+                    logger.error(f"Error removing heartbeat: {str(e)}")
+
+    async def _fetch_loop(self):
+        while not self._stopping.is_set():
+            free = self.concurrency - len(self._tasks)
+            if free <= 0:
+                await asyncio.wait(self._tasks, return_when=asyncio.FIRST_COMPLETED)
+                continue
+            try:
+                messages = await self.queue.fetch(
+                    count=min(self.batch_size, free),
+                    timeout=self.poll_timeout
+                )
+            except Exception as e:
+                logger.error(f"Error fetching requests: {str(e)}")
+                await asyncio.sleep(self.poll_timeout)
+                continue
+            for message in messages:
+                task = asyncio.create_task(self._handle(message))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _heartbeat(self):
+        while True:
+            beat = {
+                "at": time.time(),
+                "in_flight": self.in_flight,
+                "concurrency": self.concurrency,
+                "stopping": self._stopping.is_set()
+            }
+            try:
+                await self.redis.hset(WORKERS_KEY, self.name, json.dumps(beat))
+            except Exception as e:
+                logger.error(f"Error sending heartbeat: {str(e)}")
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def drain(self):
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(set(self._tasks), timeout=self.drain_timeout)
+        if pending:
+            # Unacknowledged stream entries are redelivered to another worker.
+            logger.warning(f"Cancelling {len(pending)} requests still running after drain timeout")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def _start_trace(self, request: Dict) -> Trace:
+        """Continue the web server's trace for this task and record the queue wait."""
+        trace_info = request.get("trace") or {}
+        trace = Trace(trace_info.get("id"))
+        current_trace.set(trace)
+        enqueued_at = trace_info.get("enqueued_at")
+        if enqueued_at is not None:
+            # Wall clock, since the timestamp comes from another host
+            stage_metrics.observe_ns("queue_wait", max(0, int((time.time() - enqueued_at) * 1e9)))
+        return trace
+
+    def _build_input(self, request: Dict) -> Any:
+        context = request.get("context") or {}
+        if not context:
+            return request.get("query")
+        return {**context, "query": request.get("query")}
+
+    async def _handle(self, message: QueueMessage):
+        try:
+            request = self.codec.decode(message.payload)
+        except (TypeError, ValueError):
+            logger.error("Dropping malformed request payload")
+            await self.queue.ack(message)
+            return
+        if not isinstance(request, dict):
+            logger.error(f"Dropping request payload that is a {type(request).__name__}, not an object")
+            await self.queue.ack(message)
+            return
+
+        trace = self._start_trace(request)
+        deadline = request.get("deadline")
+        if deadline is not None and time.time() > deadline:
+            self.expired += 1
+            logger.warning(f"Dropping request {request.get('id')}: deadline passed while queued")
+            await self.queue.ack(message)
+            return
+
+        if request.get("stream"):
+            with span("process"):
+                await self._handle_stream(request)
+            await self.queue.ack(message)
+            return
+
+        reply = {"id": request.get("id")}
+        idempotency_key = request.get("idempotency_key") if self.results is not None else None
+        if idempotency_key:
+            try:
+                stored = await self.results.claim(idempotency_key, deadline)
+            except TimeoutError:
+                self.expired += 1
+                logger.warning(f"Dropping request {request.get('id')}: deadline passed while a duplicate ran")
+                await self.queue.ack(message)
+                return
+            except Exception as e:
+                logger.error(f"Result store unavailable, running request {request.get('id')}: {str(e)}")
+                idempotency_key = None
+                stored = None
+            if stored is not None:
+                logger.info(f"Replaying stored reply for request {request.get('id')}")
+                await self._send_reply(message, request, {**reply, **stored})
+                return
+
+        try:
+            with span("process"):
+                if self.single_flight is not None:
+                    key = request_key(request.get("query"), request.get("context"))
+                    result = await self.single_flight.do(key, lambda: self._process(request))
+                else:
+                    result = await self._process(request)
+            reply["response"] = result
+        except Exception as e:
+            logger.error(f"Error processing request {request.get('id')}: {str(e)}")
+            reply["error"] = str(e)
+        reply["trace"] = {"id": trace.id, "spans": trace.spans}
+
+        if idempotency_key:
+            try:
+                if "error" in reply:
+                    await self.results.release(idempotency_key)
+                else:
+                    await self.results.complete(idempotency_key, {"response": reply["response"]})
+            except Exception as e:
+                logger.error(f"Error storing result for request {request.get('id')}: {str(e)}")
+        await self._send_reply(message, request, reply)
+
+    async def _send_reply(self, message: QueueMessage, request: Dict, reply: Dict):
+        try:
+            await self._reply(request, reply)
+        except Exception as e:
+            logger.error(f"Error sending reply for request {request.get('id')}: {str(e)}")
+            return
+        await self.queue.ack(message)
+
+    def _agent_for(self, request: Dict) -> BaseAgent:
+        if self.pool is None:
+            return self.agent
+        return self.pool.get((request.get("context") or {}).get("profile"))
+
+    def _session(self, request: Dict):
+        session_id = (request.get("context") or {}).get("session_id")
+        if self.pool is None or not session_id:
+            return nullcontext()
+        return self.pool.session(str(session_id))
+
+    async def _process(self, request: Dict) -> Any:
+        agent = self._agent_for(request)
+        async with self._session(request):
+            result = await agent.process(self._build_input(request))
+            if hasattr(result, "__aiter__"):
+                result = [item async for item in result]
+        return result
+
+    async def _handle_stream(self, request: Dict):
+        key = f"agent_stream:{request.get('id')}"
+        cancel_key = f"agent_cancel:{request.get('id')}"
+        items = None
+        try:
+            async with self._session(request):
+                items = self._agent_for(request).process_stream(self._build_input(request))
+                async for item in items:
+                    if not await self._emit(key, {"data": self.codec.encode(item)}, cancel_key):
+                        logger.info(f"Request {request.get('id')} cancelled by the client")
+                        return
+            await self._emit(key, {"event": "end"})
+        except Exception as e:
+            logger.error(f"Error streaming request {request.get('id')}: {str(e)}")
+            try:
+                await self._emit(key, {"event": "error", "error": str(e)})
+            except Exception:
+                pass
+        finally:
+            if items is not None:
+                await items.aclose()
+
+    async def _emit(self, key: str, fields: Dict, cancel_key: Optional[str] = None) -> bool:
+        """Append an event to a reply stream; False once the client has cancelled.
+
+        The reader trims entries it has consumed, so a stream longer than
+        `stream_high_water` means the client is falling behind: wait for it
+        (up to `stream_ttl` seconds) instead of buffering without bound.
+        """
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.xadd(key, fields, maxlen=self.stream_maxlen, approximate=True)
+            pipe.expire(key, self.stream_ttl)
+            if cancel_key is None:
+                await pipe.execute()
+                return True
+            pipe.xlen(key)
+            pipe.exists(cancel_key)
+            _, _, length, cancelled = await pipe.execute()
+
+        deadline = asyncio.get_running_loop().time() + self.stream_ttl
+        while not cancelled and length > self.stream_high_water:
+            if asyncio.get_running_loop().time() > deadline:
+                raise TimeoutError("Stream reader stopped consuming")
+            await asyncio.sleep(BACKPRESSURE_POLL_INTERVAL)
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.xlen(key)
+                pipe.exists(cancel_key)
+                length, cancelled = await pipe.execute()
+        return not cancelled
+
+    async def _reply(self, request: Dict, reply: Dict):
+        channel = request.get("reply_to") or f"agent_responses:{request.get('id')}"
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.rpush(channel, self.codec.encode(reply))
+            pipe.expire(channel, self.reply_ttl)
+            await pipe.execute()
@@ -1,27 +1,186 @@
-from config.settings import Settings
+from config.settings import Settings, get_settings
 from core.agent import BaseAgent
+from core.agent_pool import AgentPool
+from core.codec import create_codec
+from core.queue import create_queue
+from core.result_store import ResultStore
+from core.tools import configure_process_pool, shutdown_process_pool, warm_up_process_pool
+from core.worker import AgentWorker
+from utils.instrumentation import start_metrics_server
 from utils.logger import setup_logger
+import multiprocessing
+import importlib
 import asyncio
+import signal
+import socket
+import time
+import os
+import redis.asyncio as redis
+from typing import Optional
 
 logger = setup_logger(__name__)
 
-async def main():
+def create_agent(settings: Settings, pool: Optional[AgentPool] = None) -> BaseAgent:
+    """Initialize the agent implementation selected by AGENT_TYPE."""
+    if settings.AGENT_TYPE == "openai":
+        from core.openai_agent import OpenAIAgent
+        return OpenAIAgent(settings, pool=pool)
+    raise ValueError(f"Unknown agent type: {settings.AGENT_TYPE}")
+
+def preload_modules(names):
+    """Import modules an agent would otherwise load on its first request."""
+    for name in names:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning(f"Could not preload {name}: {str(e)}")
+
+def process_pool_size(settings: Settings) -> int:
+    """CPU-bound tool processes for each worker process.
+
+    Unless TOOL_PROCESS_POOL_SIZE is set, the CPUs are split between the
+    worker processes so their pools together start about one process per CPU.
+    """
+    if settings.TOOL_PROCESS_POOL_SIZE is not None:
+        return settings.TOOL_PROCESS_POOL_SIZE
+    cpus = os.cpu_count() or 1
+    return max(1, cpus // (settings.WORKER_PROCESSES or cpus))
+
+async def purge_expired_memory(memory, interval: float):
+    """Delete expired rows from a postgres memory backend every `interval` seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = await memory.purge_expired()
+            if removed:
+                logger.info(f"Purged {removed} expired memory rows")
+        except Exception as e:
+            logger.error(f"Error purging expired memory: {str(e)}")
+
+async def main(worker_index: int = 0):
     # Load settings
-    settings = Settings()
-    
-    # Initialize your specific agent implementation
-    # agent = YourAgent(settings)
+    settings = get_settings()
+
+    # Each worker process serves its own metrics port
+    if settings.METRICS_PORT is not None:
+        if start_metrics_server(settings.METRICS_PORT + worker_index):
+            logger.info(f"Serving metrics on port {settings.METRICS_PORT + worker_index}")
+
+    # Start CPU-bound tool processes before taking traffic
+    configure_process_pool(process_pool_size(settings), preload=["core.tools.code_analysis"])
+    await warm_up_process_pool()
     
+    redis_client = redis.from_url(
+        f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_DB}"
+    )
+    # One warm agent per profile, sharing memory and HTTP connections
+    pool = AgentPool(create_agent, settings)
+    pool.warm()
+    agent = pool.get()
+    codec = create_codec(settings)
+    consumer = f"{socket.gethostname()}-{os.getpid()}"
+    queue = create_queue(redis_client, settings, consumer=consumer)
+    worker = AgentWorker(
+        agent,
+        queue,
+        redis_client,
+        concurrency=settings.WORKER_CONCURRENCY,
+        batch_size=settings.WORKER_BATCH_SIZE,
+        drain_timeout=settings.WORKER_DRAIN_TIMEOUT,
+        stream_maxlen=settings.STREAM_MAXLEN,
+        stream_ttl=settings.STREAM_TTL,
+        stream_high_water=settings.STREAM_HIGH_WATER,
+        coalesce=settings.WORKER_COALESCE_REQUESTS,
+        codec=codec,
+        pool=pool,
+        results=ResultStore(redis_client, ttl=settings.RESULT_TTL, claim_ttl=settings.RESULT_CLAIM_TTL,
+                            codec=codec) if settings.RESULT_TTL else None,
+        reply_ttl=settings.REPLY_TTL,
+        name=consumer,
+        heartbeat_interval=settings.WORKER_HEARTBEAT_INTERVAL
+    )
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+
+    # Requests are served while heavy SDKs import on a thread
+    loop.run_in_executor(None, preload_modules, agent.lazy_modules)
+
+    # Postgres keeps expired rows until they are purged; one process per host does it
+    purger = None
+    if settings.MEMORY_TYPE == "postgres" and settings.MEMORY_PURGE_INTERVAL and worker_index == 0:
+        purger = asyncio.create_task(purge_expired_memory(pool.memory, settings.MEMORY_PURGE_INTERVAL))
+
     # Start agent loop
     try:
-        while True:
-            # Your agent's main loop implementation
-            await asyncio.sleep(1)
-    except KeyboardInterrupt:
+        await worker.run()
         logger.info("Shutting down agent...")
     except Exception as e:
         logger.error(f"Error in main loop: {str(e)}")
         raise
+    finally:
+        if purger is not None:
+            purger.cancel()
+            await asyncio.gather(purger, return_exceptions=True)
+        await pool.close()
+        await redis_client.aclose()
+        shutdown_process_pool()
+
+def run_worker_process(worker_index: int = 0):
+    asyncio.run(main(worker_index))
+
+def supervise(processes: int, drain_timeout: int):
+    """Run `processes` worker processes, restarting any that exit unexpectedly.
+
+    SIGTERM/SIGINT are forwarded to the workers, which drain their in-flight
+    requests before exiting.
+    """
+    stopping = False
+    workers = {}
+
+    def start(index: int):
+        process = multiprocessing.Process(
+            target=run_worker_process,
+            args=(index,),
+            name=f"agent-worker-{index}"
+        )
+        process.start()
+        workers[index] = process
+        logger.info(f"Started {process.name} (pid {process.pid})")
+
+    def handle_signal(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    for index in range(processes):
+        start(index)
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    while not stopping:
+        for index, process in list(workers.items()):
+            if not process.is_alive():
+                logger.warning(f"{process.name} exited with code {process.exitcode}, restarting")
+                start(index)
+        time.sleep(1)
+
+    logger.info("Shutting down worker processes...")
+    for process in workers.values():
+        if process.is_alive():
+            process.terminate()
+    deadline = time.monotonic() + drain_timeout + 5
+    for process in workers.values():
+        process.join(max(0, deadline - time.monotonic()))
+        if process.is_alive():
+            logger.warning(f"{process.name} did not drain in time, killing")
+            process.kill()
+            process.join()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    settings = get_settings()
+    processes = settings.WORKER_PROCESSES or os.cpu_count() or 1
+    if processes == 1:
+        run_worker_process()
+    else:
+        supervise(processes, settings.WORKER_DRAIN_TIMEOUT)
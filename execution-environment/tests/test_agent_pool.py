@@ -0,0 +1,103 @@
+import asyncio
+import json
+import pytest
+from fakeredis import FakeAsyncRedis
+from core.agent import BaseAgent
+from core.agent_pool import AgentPool
+from core.queue import ListQueue
+from core.worker import AgentWorker
+from config.settings import Settings
+
+class PooledAgent(BaseAgent):
+    built = 0
+
+    def __init__(self, settings, pool=None):
+        PooledAgent.built += 1
+        self.active = {}
+        self.peak = {}
+        self.overlapped = False
+        super().__init__(settings, pool)
+
+    def _setup_memory(self):
+        self.memory = self.pool.memory
+
+    def _load_tools(self):
+        pass
+
+    async def process(self, input_data):
+        session = input_data["session_id"]
+        self.overlapped |= bool(self.active)
+        self.active[session] = self.active.get(session, 0) + 1
+        self.peak[session] = max(self.peak.get(session, 0), self.active[session])
+        await asyncio.sleep(0.05)
+        self.active[session] -= 1
+        if not self.active[session]:
+            del self.active[session]
+        return f"{self.settings.MODEL_NAME}:{input_data['query']}"
+
+def make_pool(**profiles):
+    return AgentPool(PooledAgent, Settings(MEMORY_TYPE="in_memory"), profiles=profiles)
+
+def test_pool_reuses_agents_and_shares_resources():
+    pool = make_pool(fast={"MODEL_NAME": "gpt-4o-mini", "LLM_TEMPERATURE": 0.0})
+    PooledAgent.built = 0
+    pool.warm()
+    assert PooledAgent.built == 2
+
+    default, fast = pool.get(), pool.get("fast")
+    assert pool.get() is default and pool.get("fast") is fast
+    assert PooledAgent.built == 2
+    assert fast.settings.MODEL_NAME == "gpt-4o-mini" and fast.settings.LLM_TEMPERATURE == 0.0
+    assert default.settings.MODEL_NAME == Settings().MODEL_NAME
+    assert default.memory is fast.memory
+    assert pool.http_client() is pool.http_client()
+    asyncio.run(pool.close())
+
+def test_pool_rejects_unknown_profiles():
+    pool = make_pool(typo={"MODEL_NAEM": "x"})
+    with pytest.raises(ValueError, match="Unknown agent profile"):
+        pool.get("missing")
+    with pytest.raises(ValueError, match="MODEL_NAEM"):
+        pool.get("typo")
+
+@pytest.mark.asyncio
+async def test_worker_serialises_turns_of_one_session():
+    redis_client = FakeAsyncRedis()
+    pool = make_pool(fast={"MODEL_NAME": "fast-model"})
+    worker = AgentWorker(pool.get(), ListQueue(redis_client), redis_client,
+                         concurrency=4, poll_timeout=0.05, pool=pool)
+    requests = [("a", None), ("a", None), ("b", None), ("c", "fast"), ("d", "missing")]
+    for i, (session, profile) in enumerate(requests):
+        context = {"session_id": session, **({"profile": profile} if profile else {})}
+        await redis_client.rpush("agent_requests", json.dumps(
+            {"id": i, "query": f"q{i}", "context": context, "reply_to": "replies"}))
+    runner = asyncio.create_task(worker.run())
+
+    replies = {}
+    while len(replies) < len(requests):
+        _, raw = await redis_client.blpop("replies", timeout=5)
+        reply = json.loads(raw)
+        replies[reply["id"]] = reply
+    worker.stop()
+    await runner
+    await pool.close()
+
+    # Both turns of session "a" ran one at a time, alongside session "b"
+    assert pool.get().peak == {"a": 1, "b": 1}
+    assert pool.get().overlapped
+    assert replies[3]["response"] == "fast-model:q3"
+    assert "Unknown agent profile" in replies[4]["error"]
+
+def test_pool_configures_shared_caches_from_base_settings():
+    from core.openai_agent import OpenAIAgent, llm_cache
+    from core.tools.code_analysis import analysis_cache
+    settings = Settings(MEMORY_TYPE="in_memory", LLM_CACHE_SIZE=64, TOOL_CACHE_SIZE=32)
+    pool = AgentPool(OpenAIAgent, settings, profiles={
+        "tiny": {"LLM_CACHE_SIZE": 0, "TOOL_CACHE_SIZE": 1, "LLM_CACHE_SHARED": True}
+    })
+    pool.warm()
+    assert pool.get("tiny").settings.LLM_CACHE_SIZE == 0
+    # The last profile to load does not resize or rebind the caches every profile shares
+    assert llm_cache.max_entries == 64 and analysis_cache.max_entries == 32
+    assert llm_cache.memory is None
+    asyncio.run(pool.close())
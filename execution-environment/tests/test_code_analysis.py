@@ -0,0 +1,147 @@
+import pytest
+from core.tools.code_analysis import analysis_cache, analyze_code_structure, suggest_improvements
+
+SOURCE = '''
+import os, sys
+from collections import OrderedDict, defaultdict
+from . import sibling
+
+class Service:
+    def sync(self):
+        pass
+
+    async def fetch(self, url):
+        if url and not url.startswith("http"):
+            for part in url.split("/"):
+                while part:
+                    part = part[1:]
+        return [c for c in url if c.isalpha()]
+
+async def main(argv):
+    try:
+        return await Service().fetch(argv[0])
+    except IndexError:
+        return None
+'''
+
+@pytest.mark.asyncio
+async def test_single_pass_analysis_reports_structure_and_metrics():
+    analysis_cache.clear()
+    analysis = await analyze_code_structure(SOURCE)
+
+    assert analysis["imports"] == [
+        "os", "sys", "collections.OrderedDict", "collections.defaultdict", ".sibling"
+    ]
+    assert analysis["classes"][0]["methods"] == ["sync", "fetch"]
+    functions = {f["name"]: f for f in analysis["functions"]}
+    assert set(functions) == {"sync", "fetch", "main"}
+    assert functions["main"]["is_async"]
+
+    # if + `and` + for + while + comprehension with one filter
+    assert functions["fetch"]["complexity"] == 7
+    assert functions["fetch"]["max_nesting"] == 3
+    assert functions["fetch"]["loc"] == 6
+    assert functions["main"]["complexity"] == 2
+    assert analysis["complexity_indicators"]["num_functions"] == 3
+    assert analysis["complexity_indicators"]["max_nesting_depth"] == 3
+
+@pytest.mark.asyncio
+async def test_suggestions_flag_complex_functions():
+    branches = "\n".join(f"    if x == {i}:\n        return {i}" for i in range(12))
+    analysis = await analyze_code_structure(f"def pick(x):\n{branches}\n")
+    suggestions = await suggest_improvements(analysis)
+    assert [s["type"] for s in suggestions] == ["function_complexity"]
+
+def test_load_source_files_reads_archives_and_filters():
+    import base64, io, zipfile
+    from core.batch import load_source_files
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("pkg/a.py", "x = 1\n")
+        archive.writestr("pkg/README.md", "docs")
+        archive.writestr("pkg/big.py", "y = 2\n" * 100)
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+
+    sources = load_source_files([{"path": "inline.py", "code": "z = 3"},
+                                 {"path": "huge.py", "code": "w = 4\n" * 100}], encoded,
+                                max_file_bytes=100)
+    assert [s["path"] for s in sources] == ["inline.py", "pkg/a.py"]
+    assert sources[1]["code"] == "x = 1\n"
+    with pytest.raises(ValueError):
+        load_source_files([{"path": "inline.py", "code": ""}], encoded, max_files=1)
+    with pytest.raises(ValueError, match="bytes"):
+        load_source_files(None, encoded, max_total_bytes=500)
+
+def complex_function(name: str, branches: int = 12) -> str:
+    body = "\n".join(f"    if x == {i}:\n        return {i}" for i in range(branches))
+    return f"def {name}(x):\n{body}\n"
+
+@pytest.mark.asyncio
+async def test_reanalysis_reports_symbol_changes_per_file():
+    from config.settings import Settings
+    from core.openai_agent import OpenAIAgent
+
+    agent = OpenAIAgent(Settings(OPENAI_API_KEY="test"))
+    before = complex_function("a") + complex_function("b") + "class K:\n    def m(self):\n        pass\n"
+    first = await agent.analyze_code(before, path="mod.py", project="p1")
+    assert "changes" not in first
+    assert sorted(s["symbol"] for s in first["suggestions"]) == ["a", "b"]
+
+    # Another project's snapshot of the same path is independent
+    other = await agent.analyze_code("x = 1\n", path="mod.py", project="p2")
+    assert "changes" not in other
+
+    # Move `a` below `b` (not a modification), simplify `b`, add `c`, drop K
+    after = complex_function("b", 2) + complex_function("a") + "def c():\n    pass\n"
+    second = await agent.analyze_code(after, path="mod.py", project="p1")
+    changes = second["changes"]
+    assert changes["added_functions"] == ["c"]
+    assert changes["modified_functions"] == ["b"]
+    assert sorted(changes["removed_functions"]) == ["K.m"]
+    assert changes["removed_classes"] == ["K"]
+    assert [s["symbol"] for s in second["suggestions"]] == ["a"]
+
+    unchanged = await agent.analyze_code(after, path="mod.py", project="p1")
+    assert not unchanged["changes"]["modified_functions"]
+    assert unchanged["suggestions"] == second["suggestions"]
+    await agent.memory.close()
+
+@pytest.mark.asyncio
+async def test_analysis_without_a_project_is_stateless():
+    from config.settings import Settings
+    from core.openai_agent import OpenAIAgent
+
+    agent = OpenAIAgent(Settings(OPENAI_API_KEY="test"))
+    # Two anonymous callers analysing different code never see each other's snapshot
+    first = await agent.analyze_code(complex_function("a"))
+    second = await agent.analyze_code(complex_function("b"))
+    assert "changes" not in first and "changes" not in second
+    assert [s["symbol"] for s in second["suggestions"]] == ["b"]
+    assert await agent.memory.retrieve("code_analysis:default:<input>") is None
+    await agent.memory.close()
+
+@pytest.mark.asyncio
+async def test_batches_fall_back_to_the_session_as_project():
+    from config.settings import Settings
+    from core.openai_agent import OpenAIAgent
+
+    agent = OpenAIAgent(Settings(OPENAI_API_KEY="test"))
+    batch = {"type": "code_analysis_batch", "session_id": "alice",
+             "files": [{"path": "a.py", "code": complex_function("a")}]}
+    results = [r async for r in await agent.process(batch)]
+    assert "changes" not in results[0]["analysis"]
+    assert await agent.memory.retrieve("code_analysis:alice:a.py") is not None
+
+    results = [r async for r in await agent.process(batch)]
+    assert "changes" in results[0]["analysis"]
+    await agent.memory.close()
+
+@pytest.mark.asyncio
+async def test_deeply_nested_expressions_do_not_exhaust_the_recursion_limit():
+    analysis_cache.clear()
+    terms = "+".join(["1"] * 1500)  # parses fine, but nests 1500 BinOps deep
+    analysis = await analyze_code_structure(f"def total():\n    return {terms}\n")
+    assert "error" not in analysis
+    function = analysis["functions"][0]
+    assert function["complexity"] == 1 and function["fingerprint"]
@@ -0,0 +1,43 @@
+import json
+import pytest
+from fakeredis import FakeAsyncRedis
+from core.codec import MAGIC, VERSION, Codec, CodecError
+from core.memory import RedisMemory
+
+ANALYSIS = {"functions": [{"name": f"f{i}", "complexity": i, "args": ["self"]} for i in range(200)]}
+
+def test_small_json_stays_plain_and_legacy_json_decodes():
+    codec = Codec()
+    assert json.loads(codec.encode({"id": 1, "query": "hi"})) == {"id": 1, "query": "hi"}
+    assert codec.decode(json.dumps({"id": 1}).encode()) == {"id": 1}
+    assert codec.decode('{"id": 1}') == {"id": 1}
+
+def test_large_payloads_are_framed_and_compressed():
+    raw = Codec(compress_min_bytes=1024).encode(ANALYSIS)
+    assert raw[:2] == bytes((MAGIC, VERSION))
+    assert len(raw) < len(json.dumps(ANALYSIS)) / 5
+    # Readers decode whatever was written, regardless of their own settings
+    assert Codec(compression="none").decode(raw) == ANALYSIS
+
+def test_msgpack_round_trip():
+    pytest.importorskip("msgpack")
+    codec = Codec(serializer="msgpack")
+    assert codec.encode({"id": 1})[0] == MAGIC
+    assert Codec().decode(codec.encode(ANALYSIS)) == ANALYSIS
+
+def test_unreadable_payloads_raise_codec_error():
+    codec = Codec()
+    with pytest.raises(CodecError, match="newer"):
+        codec.decode(bytes((MAGIC, VERSION + 1, 1, 0)) + b"{}")
+    with pytest.raises(CodecError):
+        codec.decode(bytes((MAGIC, VERSION, 1, 0x01)) + b"not zlib")
+
+@pytest.mark.asyncio
+async def test_redis_memory_stores_encoded_values():
+    redis_client = FakeAsyncRedis()
+    memory = RedisMemory(client=redis_client, codec=Codec(compress_min_bytes=1024))
+    await memory.store("analysis", ANALYSIS)
+    await memory.append("history", [{"role": "user", "content": "hi"}, ANALYSIS])
+    assert (await redis_client.get("agent_memory:analysis"))[0] == MAGIC
+    assert await memory.retrieve("analysis") == ANALYSIS
+    assert await memory.retrieve_range("history") == [{"role": "user", "content": "hi"}, ANALYSIS]
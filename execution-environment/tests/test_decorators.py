@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+from utils.decorators import RetryBudget, retry, retry_counters
+
+class Flaky:
+    def __init__(self, failures, error=ConnectionError):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error("upstream down")
+        return "ok"
+
+@pytest.mark.asyncio
+async def test_retry_backs_off_without_blocking_the_loop(monkeypatch):
+    # Always wait the full backoff so the ticker gets a chance to run
+    monkeypatch.setattr("utils.decorators.random.uniform", lambda low, high: high)
+    flaky = Flaky(failures=2)
+    call = retry(max_attempts=3, delay=0.05, budget=RetryBudget(), name="flaky")(flaky)
+
+    ticks = 0
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.005)
+            ticks += 1
+
+    ticking = asyncio.create_task(ticker())
+    assert await call() == "ok"
+    ticking.cancel()
+    assert flaky.calls == 3
+    assert retry_counters[("flaky", "retries")] == 2
+    assert retry_counters[("flaky", "recovered")] == 1
+    # The backoff waited 0.05 + 0.1s and the loop kept running meanwhile
+    assert ticks >= 1
+
+@pytest.mark.asyncio
+async def test_retry_policy_skips_non_transient_errors():
+    flaky = Flaky(failures=1, error=ValueError)
+    call = retry(max_attempts=3, delay=0, retry_on=(ConnectionError,), budget=RetryBudget())(flaky)
+    with pytest.raises(ValueError):
+        await call()
+    assert flaky.calls == 1
+
+    flaky = Flaky(failures=1, error=ValueError)
+    call = retry(max_attempts=3, delay=0, retry_on=lambda e: "down" in str(e), budget=RetryBudget())(flaky)
+    assert await call() == "ok"
+
+@pytest.mark.asyncio
+async def test_retry_budget_caps_retries_during_an_outage():
+    budget = RetryBudget(ratio=0.1, min_per_second=0, capacity=2)
+    always_down = Flaky(failures=10**6)
+    call = retry(max_attempts=5, delay=0, budget=budget, name="outage")(always_down)
+
+    for _ in range(10):
+        with pytest.raises(ConnectionError):
+            await call()
+
+    # The full bucket pays for two retries; later calls only add 0.1 token each,
+    # so without the budget this outage would have cost 50 upstream calls
+    assert retry_counters[("outage", "retries")] == 2
+    assert retry_counters[("outage", "budget_exhausted")] == 10
+    assert always_down.calls == 12
+
+@pytest.mark.asyncio
+async def test_retry_counters_are_exported_for_prometheus():
+    from prometheus_client import CollectorRegistry, generate_latest
+    from utils.instrumentation import collectors
+    call = retry(max_attempts=2, delay=0, budget=RetryBudget(), name="exported")(Flaky(failures=1))
+    await call()
+
+    registry = CollectorRegistry()
+    for collector in collectors:
+        registry.register(collector)
+    text = generate_latest(registry).decode()
+    assert 'agent_retry_events_total{call="exported",event="retries"} 1.0' in text
+    assert 'agent_retry_events_total{call="exported",event="recovered"} 1.0' in text
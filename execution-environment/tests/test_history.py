@@ -0,0 +1,46 @@
+import pytest
+from fakeredis import FakeAsyncRedis
+from core.history import ConversationHistory
+from core.memory import InMemoryStorage, RedisMemory
+
+def turn(i):
+    return ({"role": "user", "content": f"question {i} " + "x" * 36},
+            {"role": "assistant", "content": f"answer {i} " + "y" * 36})
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("memory_factory", [
+    InMemoryStorage,
+    lambda: RedisMemory(client=FakeAsyncRedis()),
+])
+async def test_window_is_token_budgeted_and_sessions_are_isolated(memory_factory):
+    memory = memory_factory()
+    history = ConversationHistory(memory, "alice", token_budget=60)
+    for i in range(5):
+        await history.append(*turn(i))
+    await ConversationHistory(memory, "bob").append(*turn(99))
+
+    window = await history.window()
+    assert len(window) == 4
+    assert window[-1]["content"].startswith("answer 4")
+    assert await memory.length("conversation:alice") == 10
+
+@pytest.mark.asyncio
+async def test_evicted_turns_are_summarized_once():
+    calls = []
+
+    async def summarizer(previous, messages):
+        calls.append(len(messages))
+        return f"{previous or ''}+{len(messages)}"
+
+    history = ConversationHistory(InMemoryStorage(), "s", token_budget=60, summarizer=summarizer)
+    for i in range(3):
+        await history.append(*turn(i))
+    window = await history.window()
+    assert window[0] == {"role": "system", "content": "Summary of the earlier conversation: +2"}
+    assert len(window) == 5
+
+    await history.window()
+    await history.append(*turn(3))
+    window = await history.window()
+    assert calls == [2, 2]
+    assert window[0]["content"].endswith("+2+2")
@@ -0,0 +1,64 @@
+import asyncio
+import json
+import time
+import pytest
+from fakeredis import FakeAsyncRedis
+from core.queue import ListQueue
+from core.worker import AgentWorker
+from utils.decorators import timing
+from utils.instrumentation import LatencyHistogram, StageMetrics, stage_metrics
+from tests.test_worker import EchoAgent
+
+def test_histogram_buckets_and_percentiles():
+    histogram = LatencyHistogram(buckets=(0.001, 0.01, 0.1))
+    for duration_ms in [0.5, 1, 2, 5, 50, 500]:
+        histogram.observe_ns(int(duration_ms * 1e6))
+
+    assert histogram.counts == [2, 2, 1, 1]
+    assert histogram.cumulative() == [("0.001", 2), ("0.01", 4), ("0.1", 5), ("+Inf", 6)]
+    assert histogram.percentile(0.5) == 0.01
+    assert histogram.percentile(0.99) == float("inf")
+    assert abs(histogram.sum_ns / 1e9 - 0.5585) < 1e-9
+
+def test_stage_metrics_export_for_prometheus():
+    from prometheus_client import CollectorRegistry, generate_latest
+    metrics = StageMetrics("test_stage_seconds", "Test stages", buckets=(0.1,))
+    with metrics.span("tool.example"):
+        pass
+    registry = CollectorRegistry()
+    registry.register(metrics)
+    text = generate_latest(registry).decode()
+    assert 'test_stage_seconds_bucket{le="0.1",stage="tool.example"} 1.0' in text
+    assert 'test_stage_seconds_count{stage="tool.example"} 1.0' in text
+
+@pytest.mark.asyncio
+async def test_timing_decorator_records_a_stage():
+    @timing(stage="test.sleep")
+    async def nap():
+        await asyncio.sleep(0.01)
+
+    await nap()
+    histogram = stage_metrics.histogram("test.sleep")
+    assert histogram.count == 1
+    assert histogram.sum_ns >= 10_000_000
+
+@pytest.mark.asyncio
+async def test_worker_continues_trace_and_reports_spans():
+    redis_client = FakeAsyncRedis()
+    worker = AgentWorker(EchoAgent(delay=0.02), ListQueue(redis_client), redis_client,
+                         poll_timeout=0.05)
+    queue_waits = stage_metrics.histogram("queue_wait").count
+    await redis_client.rpush("agent_requests", json.dumps({
+        "id": 1, "query": "hi", "context": None,
+        "trace": {"id": "req-abc", "enqueued_at": time.time() - 0.5}
+    }))
+    runner = asyncio.create_task(worker.run())
+    _, raw = await redis_client.blpop("agent_responses:1", timeout=5)
+    worker.stop()
+    await runner
+
+    reply = json.loads(raw)
+    assert reply["trace"]["id"] == "req-abc"
+    assert reply["trace"]["spans"]["process"] >= 0.02
+    assert stage_metrics.histogram("queue_wait").count == queue_waits + 1
+    assert stage_metrics.histogram("queue_wait").sum_ns >= 500_000_000
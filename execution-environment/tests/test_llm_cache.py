@@ -0,0 +1,108 @@
+import pytest
+from types import SimpleNamespace
+from config.settings import Settings
+from core.openai_agent import OpenAIAgent, llm_cache
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        content = f"answer {self.calls}"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+def make_agent(**overrides) -> OpenAIAgent:
+    llm_cache.clear()
+    agent = OpenAIAgent(Settings(OPENAI_API_KEY="test", **overrides))
+    agent.client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+    return agent
+
+@pytest.mark.asyncio
+async def test_deterministic_prompts_are_answered_from_cache():
+    agent = make_agent(LLM_TEMPERATURE=0.0)
+    completions = agent.client.chat.completions
+
+    first = await agent._chat([{"role": "user", "content": "triage this"}], temperature=0.0)
+    # Only surrounding whitespace differs, which normalisation removes
+    second = await agent._chat([{"role": "user", "content": "  triage this\n"}], temperature=0.0)
+    assert first == second == "answer 1"
+    assert completions.calls == 1
+
+    await agent._chat([{"role": "user", "content": "other"}], temperature=0.0)
+    await agent._chat([{"role": "user", "content": "other"}], temperature=0.0, max_tokens=5)
+    assert completions.calls == 3
+
+@pytest.mark.asyncio
+async def test_sampled_calls_bypass_the_cache():
+    agent = make_agent(LLM_TEMPERATURE=0.7)
+    completions = agent.client.chat.completions
+    assert await agent.think("ideas") == ["answer 1"]
+    assert await agent.think("ideas") == ["answer 2"]
+    assert completions.calls == 2
+
+@pytest.mark.asyncio
+async def test_shared_tier_serves_other_processes():
+    agent = make_agent(LLM_CACHE_SHARED=True)
+    await agent._chat([{"role": "user", "content": "summarize"}], temperature=0)
+
+    # A fresh process-local tier (another worker) sharing the same memory backend
+    llm_cache.clear()
+    other = OpenAIAgent(Settings(OPENAI_API_KEY="test", LLM_CACHE_SHARED=True))
+    other.memory = agent.memory
+    llm_cache.configure(memory=agent.memory, ttl=60)
+    other.client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+    assert await other._chat([{"role": "user", "content": "summarize"}], temperature=0) == "answer 1"
+    assert other.client.chat.completions.calls == 0
+    assert llm_cache.stats["shared_hits"] == 1
+
+@pytest.mark.asyncio
+async def test_cached_completions_expire():
+    import asyncio
+    agent = make_agent(LLM_CACHE_TTL=1)
+    llm_cache.configure(ttl=0.05)
+    messages = [{"role": "user", "content": "status"}]
+    await agent._chat(messages, temperature=0)
+    await agent._chat(messages, temperature=0)
+    await asyncio.sleep(0.06)
+    await agent._chat(messages, temperature=0)
+    assert agent.client.chat.completions.calls == 2
+
+@pytest.mark.asyncio
+async def test_requests_without_a_session_do_not_share_history():
+    agent = make_agent(LLM_TEMPERATURE=0.7)
+    sent = []
+
+    async def create(**kwargs):
+        sent.append(kwargs["messages"])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))])
+    agent.client.chat.completions.create = create
+
+    await agent.process("my password is hunter2")
+    await agent.process({"query": "what did I say?"})
+    assert [m["content"] for m in sent[1]] == ["what did I say?"]
+
+    await agent.process({"query": "remember me", "session_id": "alice"})
+    await agent.process({"query": "who am I?", "session_id": "alice"})
+    assert "remember me" in [m["content"] for m in sent[3]]
+
+@pytest.mark.asyncio
+async def test_calls_sharing_a_prompt_prefix_send_one_prompt_cache_key():
+    agent = make_agent(LLM_TEMPERATURE=0.7)
+    sent = []
+
+    async def create(**kwargs):
+        sent.append(kwargs.get("extra_body", {}).get("prompt_cache_key"))
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))])
+    agent.client.chat.completions.create = create
+
+    await agent.process({"query": "hi", "session_id": "alice"})
+    await agent.process({"query": "and then?", "session_id": "alice"})
+    await agent.process({"query": "hi", "session_id": "bob"})
+    await agent.think("ideas")
+    assert sent[0] == sent[1] and len(set(sent)) == 3
+    assert "alice" not in sent[0]
+
+    agent.settings.LLM_PROMPT_CACHE = False
+    await agent.think("ideas")
+    assert sent[-1] is None
@@ -0,0 +1,108 @@
+import asyncio
+import pytest
+from core.memory import InMemoryStorage
+
+@pytest.mark.asyncio
+async def test_ttl_expires_lazily_and_in_background():
+    memory = InMemoryStorage(sweep_interval=0.01)
+    await memory.store("short", 1, ttl=0.05)
+    await memory.store("long", 2, ttl=60)
+    await memory.store("forever", 3)
+    assert await memory.retrieve("short") == 1
+
+    await asyncio.sleep(0.1)
+    assert memory.stats["entries"] == 2
+    assert await memory.retrieve("short") is None
+    assert await memory.retrieve("long") == 2
+    assert memory.stats["expirations"] == 1
+    await memory.close()
+
+@pytest.mark.asyncio
+async def test_lru_eviction_by_entries_and_bytes():
+    memory = InMemoryStorage(max_entries=2)
+    await memory.store("a", 1)
+    await memory.store("b", 2)
+    await memory.retrieve("a")
+    await memory.store("c", 3)
+    assert await memory.retrieve("b") is None
+    assert await memory.retrieve("a") == 1
+    assert memory.stats["evictions"] == 1
+
+    memory = InMemoryStorage(max_bytes=20)
+    await memory.store("a", "x" * 12)
+    await memory.store("b", "y" * 12)
+    assert await memory.retrieve("a") is None
+    assert memory.stats["bytes"] <= 20
+    assert await memory.store("huge", "z" * 100) is False
+    # A rejected value also drops the one it was meant to replace
+    await memory.store("b", "small")
+    assert await memory.store("b", "z" * 100) is False
+    assert await memory.retrieve("b") is None
+
+@pytest.mark.asyncio
+async def test_hit_and_miss_counters():
+    memory = InMemoryStorage()
+    await memory.store("k", "v")
+    await memory.retrieve("k")
+    await memory.retrieve("missing")
+    assert memory.stats["hits"] == 1
+    assert memory.stats["misses"] == 1
+
+@pytest.mark.asyncio
+async def test_redis_memory_bulk_operations_and_ttl():
+    from fakeredis import FakeAsyncRedis
+    from core.memory import RedisMemory
+
+    client = FakeAsyncRedis()
+    memory = RedisMemory(client=client, default_ttl=60)
+    assert await memory.store_many({"a": {"n": 1}, "b": [1, 2]})
+    assert await memory.retrieve_many(["a", "b", "missing"]) == {"a": {"n": 1}, "b": [1, 2]}
+    assert 0 < await client.ttl("agent_memory:a") <= 60
+
+    await memory.store("c", "no expiry", ttl=0)
+    assert await client.ttl("agent_memory:c") == -1
+    assert await memory.forget("c")
+    assert await memory.retrieve("c") is None
+
+@pytest.mark.asyncio
+async def test_postgres_memory_round_trip():
+    import os
+    dsn = os.environ.get("TEST_POSTGRES_DSN")
+    if not dsn:
+        pytest.skip("TEST_POSTGRES_DSN not set")
+    from core.memory import PostgresMemory
+
+    memory = PostgresMemory(dsn, table="agent_memory_test")
+    try:
+        await memory.store_many({"a": 1, "b": {"x": 2}}, ttl=60)
+        await memory.store("gone", 3, ttl=0.001)
+        await asyncio.sleep(0.01)
+        assert await memory.retrieve_many(["a", "b", "gone"]) == {"a": 1, "b": {"x": 2}}
+        assert await memory.forget("a")
+
+        # An expired list does not come back when it is appended to again
+        await memory.forget("history")
+        await memory.append("history", ["old"], ttl=0.001)
+        await asyncio.sleep(0.01)
+        assert await memory.append("history", ["new"], ttl=60) == 1
+        assert await memory.retrieve_range("history") == ["new"]
+        assert await memory.length("history") == 1
+        assert await memory.append("history", []) == 1
+    finally:
+        await memory.close()
+
+def redis_memory():
+    from fakeredis import FakeAsyncRedis
+    from core.memory import RedisMemory
+    return RedisMemory(client=FakeAsyncRedis(), default_ttl=60)
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("make_memory", [InMemoryStorage, redis_memory], ids=["in_memory", "redis"])
+async def test_appending_nothing_leaves_the_list_alone(make_memory):
+    memory = make_memory()
+    assert await memory.append("history", []) == 0
+    assert await memory.length("history") == 0
+    assert await memory.append("history", ["a", "b"]) == 2
+    assert await memory.append("history", []) == 2
+    assert await memory.retrieve_range("history") == ["a", "b"]
+    await memory.close()
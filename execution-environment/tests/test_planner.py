@@ -0,0 +1,83 @@
+import asyncio
+import time
+import pytest
+from core.planner import PlanExecutor, Ref, ToolPlan
+from core.tools import Tool
+
+def sleeper(name: str, delay: float, log: list):
+    async def run(*inputs):
+        log.append(("start", name))
+        await asyncio.sleep(delay)
+        log.append(("end", name))
+        return [name, *inputs]
+    return Tool(run, name, "")
+
+@pytest.mark.asyncio
+async def test_independent_nodes_run_concurrently_and_results_flow_along_edges():
+    log = []
+    plan = ToolPlan()
+    a = plan.add("a", sleeper("a", 0.1, log))
+    b = plan.add("b", sleeper("b", 0.1, log))
+    plan.add("c", sleeper("c", 0.05, log), a, Ref("b", lambda result: result[0]))
+
+    start = time.perf_counter()
+    results = await PlanExecutor().run(plan)
+    elapsed = time.perf_counter() - start
+
+    assert results["c"] == ["c", ["a"], "b"]
+    # Critical path (0.1 + 0.05s), not the sum of all three nodes
+    assert elapsed < 0.22
+    assert log.index(("start", "c")) > max(log.index(("end", "a")), log.index(("end", "b")))
+
+@pytest.mark.asyncio
+async def test_per_tool_concurrency_limits_and_timeouts():
+    active = peak = 0
+
+    async def parse(_):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+
+    tool = Tool(parse, "parse", "")
+    plan = ToolPlan()
+    for i in range(6):
+        plan.add(f"parse{i}", tool, i)
+    await PlanExecutor(limits={"parse": 2}).run(plan)
+    assert peak == 2
+
+    plan = ToolPlan()
+    plan.add("slow", sleeper("slow", 1, []), timeout=0.05)
+    with pytest.raises(TimeoutError, match="slow"):
+        await PlanExecutor().run(plan)
+
+@pytest.mark.asyncio
+async def test_failure_cancels_the_rest_of_the_plan():
+    log = []
+
+    async def fail():
+        raise ValueError("boom")
+
+    plan = ToolPlan()
+    plan.add("long", sleeper("long", 1, log))
+    failed = plan.add("fail", Tool(fail, "fail", ""))
+    plan.add("dependent", sleeper("dependent", 0, log), failed)
+    with pytest.raises(ValueError, match="boom"):
+        await PlanExecutor().run(plan)
+    await asyncio.sleep(0)
+    assert log == [("start", "long")]
+
+def test_invalid_plans_are_rejected():
+    plan = ToolPlan()
+    plan.add("a", sleeper("a", 0, []), Ref("b"))
+    plan.add("b", sleeper("b", 0, []), Ref("a"))
+    with pytest.raises(ValueError, match="cycle"):
+        plan.order()
+
+    plan = ToolPlan()
+    plan.add("a", sleeper("a", 0, []), after=["missing"])
+    with pytest.raises(ValueError, match="unknown node 'missing'"):
+        plan.order()
+    with pytest.raises(ValueError, match="Duplicate"):
+        plan.add("a", sleeper("a", 0, []))
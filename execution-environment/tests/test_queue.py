@@ -0,0 +1,65 @@
+import pytest
+from fakeredis import FakeAsyncRedis
+from core.queue import ListQueue, StreamQueue, WeightedQueue
+
+@pytest.mark.asyncio
+async def test_list_queue_fetches_batches():
+    redis_client = FakeAsyncRedis()
+    await redis_client.rpush("agent_requests", "a", "b", "c")
+    queue = ListQueue(redis_client)
+    messages = await queue.fetch(count=2, timeout=0.1)
+    assert [m.payload for m in messages] == [b"a", b"b"]
+    assert [m.payload for m in await queue.fetch(count=5, timeout=0.1)] == [b"c"]
+    assert await queue.fetch(timeout=0.1) == []
+
+@pytest.mark.asyncio
+async def test_stream_queue_acknowledges_and_reclaims():
+    redis_client = FakeAsyncRedis()
+    first = StreamQueue(redis_client, consumer="first", claim_idle_ms=0, reclaim_interval=3600)
+    second = StreamQueue(redis_client, consumer="second", claim_idle_ms=0, reclaim_interval=0)
+    await first.fetch(timeout=0.01)
+    for payload in ("a", "b"):
+        await redis_client.xadd("agent_requests:stream", {"payload": payload})
+
+    # Both entries go to the first consumer, which acknowledges only one and "crashes".
+    taken = await first.fetch(count=2, timeout=0.1)
+    assert [m.payload for m in taken] == [b"a", b"b"]
+    await first.ack(taken[0])
+
+    reclaimed = await second.fetch(count=10, timeout=0.1)
+    assert [m.payload for m in reclaimed] == [b"b"]
+    await second.ack(reclaimed[0])
+    assert await redis_client.xlen("agent_requests:stream") == 0
+    assert (await redis_client.xpending("agent_requests:stream", "agent_workers"))["pending"] == 0
+
+@pytest.mark.asyncio
+async def test_weighted_queue_shares_fetches_between_lanes():
+    redis_client = FakeAsyncRedis()
+    await redis_client.rpush("agent_requests", *[f"i{n}" for n in range(20)])
+    await redis_client.rpush("agent_requests:batch", *[f"b{n}" for n in range(20)])
+    queue = WeightedQueue([
+        (ListQueue(redis_client), 4),
+        (ListQueue(redis_client, "agent_requests:batch"), 1)
+    ])
+
+    # Both lanes saturated: batch work gets its share and is never starved
+    lanes = [m.payload[:1] for _ in range(5) for m in await queue.fetch(count=2, timeout=0.1)]
+    assert lanes.count(b"i") == 8 and lanes.count(b"b") == 2
+
+    # Slots the interactive lane cannot fill go to the batch lane
+    await redis_client.delete("agent_requests")
+    messages = await queue.fetch(count=3, timeout=0.1)
+    assert [m.payload for m in messages] == [b"b2", b"b3", b"b4"]
+    await queue.ack(messages[0])
+    assert messages[0].source is queue.lanes[1][0]
+
+@pytest.mark.asyncio
+async def test_weighted_queue_blocks_on_the_first_lane_when_idle():
+    redis_client = FakeAsyncRedis()
+    queue = WeightedQueue([
+        (ListQueue(redis_client), 4),
+        (ListQueue(redis_client, "agent_requests:batch"), 1)
+    ])
+    assert await queue.fetch(timeout=0.05) == []
+    await redis_client.rpush("agent_requests", "a")
+    assert [m.payload for m in await queue.fetch(timeout=0.1)] == [b"a"]
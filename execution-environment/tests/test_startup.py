@@ -0,0 +1,24 @@
+import os
+import subprocess
+import sys
+from config.settings import get_settings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_settings_are_built_once_per_process():
+    assert get_settings() is get_settings()
+    get_settings.cache_clear()
+    assert get_settings() is get_settings()
+
+def test_worker_startup_does_not_import_heavy_sdks():
+    code = (
+        "import sys, main\n"
+        "agent = main.create_agent(main.get_settings())\n"
+        "print(sorted(m for m in ('openai', 'asyncpg', 'prometheus_client') if m in sys.modules))\n"
+        "agent.client\n"
+        "print('openai' in sys.modules)\n"
+    )
+    env = {**os.environ, "OPENAI_API_KEY": "test", "LOG_LEVEL": "WARNING"}
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ["[]", "True"]
@@ -0,0 +1,73 @@
+import pytest
+from core.memory import InMemoryStorage
+from core.tools import register_tool
+from core.tools.cache import ToolResultCache
+
+def counting_tool(cache, version="1"):
+    calls = []
+
+    @register_tool(name="count", cache=cache, version=version)
+    async def tool(code: str):
+        calls.append(code)
+        return {"length": len(code), "items": []}
+    return tool, calls
+
+@pytest.mark.asyncio
+async def test_cached_tool_skips_work_and_returns_copies():
+    cache = ToolResultCache(max_entries=2)
+    tool, calls = counting_tool(cache)
+    first = await tool("abc")
+    first["items"].append("mutated")
+    assert await tool("abc") == {"length": 3, "items": []}
+    assert calls == ["abc"]
+
+    await tool("d")
+    await tool("e")
+    await tool("abc")
+    assert calls == ["abc", "d", "e", "abc"]
+    assert cache.stats["hits"] == 1
+    assert cache.stats["entries"] == 2
+
+@pytest.mark.asyncio
+async def test_shared_tier_and_version_invalidation():
+    memory = InMemoryStorage()
+    tool, _ = counting_tool(ToolResultCache(memory=memory))
+    await tool("shared")
+
+    other_cache = ToolResultCache(memory=memory)
+    other, calls = counting_tool(other_cache)
+    assert await other("shared") == {"length": 6, "items": []}
+    assert calls == []
+    assert other_cache.stats["shared_hits"] == 1
+
+    bumped, calls = counting_tool(ToolResultCache(memory=memory), version="2")
+    await bumped("shared")
+    assert calls == ["shared"]
+
+@pytest.mark.asyncio
+async def test_cpu_bound_tool_runs_in_process_pool():
+    from core.tools import configure_process_pool, shutdown_process_pool, warm_up_process_pool
+    from core.tools.code_analysis import analysis_cache, analyze_code_structure
+
+    code = "async def handler(request):\n    return request\n"
+    analysis_cache.clear()
+    inline = await analyze_code_structure(code)
+
+    configure_process_pool(1, preload=["core.tools.code_analysis"])
+    try:
+        await warm_up_process_pool()
+        analysis_cache.clear()
+        assert await analyze_code_structure(code) == inline
+    finally:
+        shutdown_process_pool()
+
+def test_process_pools_share_the_cpus_between_worker_processes(monkeypatch):
+    import main
+    from config.settings import Settings
+    monkeypatch.setattr(main.os, "cpu_count", lambda: 8)
+    assert main.process_pool_size(Settings(WORKER_PROCESSES=1)) == 8
+    assert main.process_pool_size(Settings(WORKER_PROCESSES=2)) == 4
+    # One worker process per CPU: one tool process each, not eight
+    assert main.process_pool_size(Settings(WORKER_PROCESSES=0)) == 1
+    assert main.process_pool_size(Settings(WORKER_PROCESSES=16)) == 1
+    assert main.process_pool_size(Settings(WORKER_PROCESSES=0, TOOL_PROCESS_POOL_SIZE=3)) == 3
@@ -0,0 +1,295 @@
+import asyncio
+import json
+import time
+import pytest
+from fakeredis import FakeAsyncRedis
+from core.agent import BaseAgent
+from core.memory import InMemoryStorage
+from core.queue import ListQueue, StreamQueue
+from core.result_store import ResultStore
+from core.worker import AgentWorker
+from config.settings import Settings
+
+class EchoAgent(BaseAgent):
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        super().__init__(Settings())
+
+    def _setup_memory(self):
+        self.memory = InMemoryStorage()
+
+    def _load_tools(self):
+        pass
+
+    async def process(self, input_data):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        if input_data == "boom":
+            raise ValueError("boom")
+        return input_data
+
+async def push_requests(redis_client, queries, reply_to=None):
+    for i, query in enumerate(queries):
+        request = {"id": i, "query": query, "context": None}
+        if reply_to:
+            request["reply_to"] = reply_to
+        await redis_client.rpush("agent_requests", json.dumps(request))
+
+@pytest.mark.asyncio
+async def test_worker_replies_with_bounded_concurrency():
+    redis_client = FakeAsyncRedis()
+    agent = EchoAgent(delay=0.05)
+    worker = AgentWorker(agent, ListQueue(redis_client), redis_client,
+                         concurrency=3, batch_size=2, poll_timeout=0.05)
+    await push_requests(redis_client, ["a", "b", "c", "d", "e", "boom"], reply_to="replies")
+    runner = asyncio.create_task(worker.run())
+
+    replies = []
+    while len(replies) < 6:
+        _, raw = await redis_client.blpop("replies", timeout=5)
+        replies.append(json.loads(raw))
+    worker.stop()
+    await runner
+
+    assert agent.peak == 3
+    by_id = {r["id"]: r for r in replies}
+    assert by_id[0]["response"] == "a"
+    assert by_id[5]["error"] == "boom"
+
+@pytest.mark.asyncio
+async def test_payloads_that_are_not_objects_are_acked_and_dropped():
+    redis_client = FakeAsyncRedis()
+    queue = StreamQueue(redis_client, claim_idle_ms=0, reclaim_interval=3600)
+    worker = AgentWorker(EchoAgent(), queue, redis_client, poll_timeout=0.05)
+    await queue.fetch(timeout=0.01)
+    for payload in ('[1, 2]', '"text"', json.dumps({"id": 7, "query": "ok", "reply_to": "replies"})):
+        await redis_client.xadd("agent_requests:stream", {"payload": payload})
+    runner = asyncio.create_task(worker.run())
+
+    _, raw = await redis_client.blpop("replies", timeout=5)
+    worker.stop()
+    await runner
+    assert json.loads(raw)["response"] == "ok"
+    assert await redis_client.xlen("agent_requests:stream") == 0
+    assert (await redis_client.xpending("agent_requests:stream", "agent_workers"))["pending"] == 0
+
+@pytest.mark.asyncio
+async def test_stop_drains_in_flight_requests():
+    redis_client = FakeAsyncRedis()
+    worker = AgentWorker(EchoAgent(delay=0.2), ListQueue(redis_client), redis_client,
+                         poll_timeout=0.05)
+    await push_requests(redis_client, ["slow"])
+    runner = asyncio.create_task(worker.run())
+    while worker.in_flight == 0:
+        await asyncio.sleep(0.01)
+    worker.stop()
+    await runner
+    reply = await redis_client.lpop("agent_responses:0")
+    assert json.loads(reply)["response"] == "slow"
+
+class StreamingAgent(EchoAgent):
+    async def process(self, input_data):
+        async def items():
+            for path in input_data["files"]:
+                yield {"path": path}
+            if input_data.get("fail"):
+                raise ValueError("bad archive")
+        return items()
+
+@pytest.mark.asyncio
+async def test_stream_requests_emit_items_then_end():
+    redis_client = FakeAsyncRedis()
+    worker = AgentWorker(StreamingAgent(), ListQueue(redis_client), redis_client,
+                         poll_timeout=0.05)
+    for i, fail in enumerate([False, True]):
+        await redis_client.rpush("agent_requests", json.dumps({
+            "id": i, "query": "", "stream": True,
+            "context": {"type": "code_analysis_batch", "files": ["a.py", "b.py"], "fail": fail}
+        }))
+    runner = asyncio.create_task(worker.run())
+    while await redis_client.xlen("agent_stream:1") < 3:
+        await asyncio.sleep(0.01)
+    worker.stop()
+    await runner
+
+    ok = [fields for _, fields in await redis_client.xrange("agent_stream:0")]
+    assert [json.loads(f[b"data"])["path"] for f in ok[:2]] == ["a.py", "b.py"]
+    assert ok[2] == {b"event": b"end"}
+    failed = [fields for _, fields in await redis_client.xrange("agent_stream:1")]
+    assert failed[-1] == {b"event": b"error", b"error": b"bad archive"}
+    assert await redis_client.ttl("agent_stream:0") > 0
+
+class TokenAgent(EchoAgent):
+    def __init__(self):
+        self.produced = 0
+        super().__init__()
+
+    async def process_stream(self, input_data):
+        for i in range(1000):
+            self.produced += 1
+            yield {"delta": str(i)}
+
+@pytest.mark.asyncio
+async def test_stream_waits_for_slow_reader_and_stops_on_cancel():
+    redis_client = FakeAsyncRedis()
+    agent = TokenAgent()
+    worker = AgentWorker(agent, ListQueue(redis_client), redis_client,
+                         poll_timeout=0.05, stream_high_water=5)
+    await redis_client.rpush("agent_requests", json.dumps({"id": 0, "query": "hi", "stream": True}))
+    runner = asyncio.create_task(worker.run())
+
+    while await redis_client.xlen("agent_stream:0") < 6:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.2)
+    # Nobody is reading, so the worker holds at the high-water mark
+    assert await redis_client.xlen("agent_stream:0") == 6
+    assert agent.produced == 6
+
+    await redis_client.set("agent_cancel:0", 1)
+    while worker.in_flight:
+        await asyncio.sleep(0.01)
+    worker.stop()
+    await runner
+    assert agent.produced == 6
+    entries = await redis_client.xrange("agent_stream:0")
+    assert all(b"event" not in fields for _, fields in entries)
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_requests_share_one_agent_call():
+    redis_client = FakeAsyncRedis()
+    agent = EchoAgent(delay=0.05)
+    calls = []
+    process = agent.process
+
+    async def counting_process(input_data):
+        calls.append(input_data)
+        return await process(input_data)
+
+    agent.process = counting_process
+    worker = AgentWorker(agent, ListQueue(redis_client), redis_client, poll_timeout=0.05)
+    await push_requests(redis_client, ["same", "same", "same", "different"], reply_to="replies")
+    runner = asyncio.create_task(worker.run())
+    replies = []
+    while len(replies) < 4:
+        _, raw = await redis_client.blpop("replies", timeout=5)
+        replies.append(json.loads(raw))
+    worker.stop()
+    await runner
+
+    assert sorted(calls) == ["different", "same"]
+    assert sorted(r["id"] for r in replies) == [0, 1, 2, 3]
+    assert worker.single_flight.coalesced == 2
+
+@pytest.mark.asyncio
+async def test_requests_past_their_deadline_are_dropped():
+    redis_client = FakeAsyncRedis()
+    agent = EchoAgent()
+    worker = AgentWorker(agent, ListQueue(redis_client), redis_client, poll_timeout=0.05)
+    now = time.time()
+    for request_id, deadline in ((0, now - 1), (1, now + 60)):
+        await redis_client.rpush("agent_requests", json.dumps(
+            {"id": request_id, "query": "q", "context": None, "reply_to": "replies", "deadline": deadline}
+        ))
+    runner = asyncio.create_task(worker.run())
+    _, raw = await redis_client.blpop("replies", timeout=5)
+    worker.stop()
+    await runner
+
+    assert json.loads(raw)["id"] == 1
+    assert await redis_client.llen("replies") == 0
+    assert worker.expired == 1
+
+class CountingAgent(EchoAgent):
+    def __init__(self, delay: float = 0.0):
+        self.calls = []
+        super().__init__(delay)
+
+    async def process(self, input_data):
+        self.calls.append(input_data)
+        return await super().process(input_data)
+
+@pytest.mark.asyncio
+async def test_idempotency_keys_run_once_and_replay_the_stored_reply():
+    redis_client = FakeAsyncRedis()
+    agent = CountingAgent(delay=0.1)
+    worker = AgentWorker(agent, ListQueue(redis_client), redis_client, poll_timeout=0.05,
+                         coalesce=False, results=ResultStore(redis_client), reply_ttl=60)
+
+    async def send(requests):
+        for request_id, query, key in requests:
+            await redis_client.rpush("agent_requests", json.dumps({
+                "id": request_id, "query": query, "context": None,
+                "reply_to": "replies", "idempotency_key": key
+            }))
+        replies = {}
+        while len(replies) < len(requests):
+            _, raw = await redis_client.blpop("replies", timeout=5)
+            reply = json.loads(raw)
+            replies[reply["id"]] = reply
+        return replies
+
+    runner = asyncio.create_task(worker.run())
+    # A duplicate arriving mid-run waits for the first attempt's reply
+    first = await send([(0, "a", "k1"), (1, "a", "k1"), (2, "boom", "k2")])
+    assert await redis_client.ttl("agent_result:k1") > 0
+    later = await send([(3, "a", "k1"), (4, "boom", "k2")])
+    # Replies nobody collects expire
+    await redis_client.rpush("agent_requests", json.dumps({"id": 5, "query": "c", "context": None}))
+    while not await redis_client.exists("agent_responses:5"):
+        await asyncio.sleep(0.01)
+    assert 0 < await redis_client.ttl("agent_responses:5") <= 60
+    # Keyless requests leave no stored result behind
+    assert await redis_client.keys("agent_result:*") == [b"agent_result:k1"]
+    worker.stop()
+    await runner
+
+    assert first[0]["response"] == first[1]["response"] == later[3]["response"] == "a"
+    # Failures are not stored, so the retry ran the agent again
+    assert first[2]["error"] == later[4]["error"] == "boom"
+    assert sorted(agent.calls) == ["a", "boom", "boom", "c"]
+    assert worker.results.replayed == 2
+
+@pytest.mark.asyncio
+async def test_worker_heartbeats_until_it_stops():
+    redis_client = FakeAsyncRedis()
+    worker = AgentWorker(EchoAgent(delay=0.2), ListQueue(redis_client), redis_client,
+                         concurrency=4, poll_timeout=0.05, name="w1", heartbeat_interval=0.02)
+    await push_requests(redis_client, ["a"])
+    runner = asyncio.create_task(worker.run())
+    await asyncio.sleep(0.1)
+    beat = json.loads(await redis_client.hget("agent_workers", "w1"))
+    assert beat["in_flight"] == 1 and beat["concurrency"] == 4 and not beat["stopping"]
+    assert time.time() - beat["at"] < 1
+
+    worker.stop()
+    await asyncio.sleep(0.05)
+    assert json.loads(await redis_client.hget("agent_workers", "w1"))["stopping"]
+    await runner
+    assert await redis_client.hget("agent_workers", "w1") is None
+
+@pytest.mark.asyncio
+async def test_coalesced_requests_store_a_result_under_each_idempotency_key():
+    redis_client = FakeAsyncRedis()
+    agent = CountingAgent(delay=0.1)
+    results = ResultStore(redis_client)
+    worker = AgentWorker(agent, ListQueue(redis_client), redis_client, poll_timeout=0.05,
+                         results=results)
+    for request_id, key in ((0, "leader"), (1, "follower")):
+        await redis_client.rpush("agent_requests", json.dumps({
+            "id": request_id, "query": "same", "context": None,
+            "reply_to": "replies", "idempotency_key": key
+        }))
+    runner = asyncio.create_task(worker.run())
+    for _ in range(2):
+        await redis_client.blpop("replies", timeout=5)
+    worker.stop()
+    await runner
+
+    assert agent.calls == ["same"]
+    assert worker.single_flight.coalesced == 1
+    # A retry of the follower is answered from the store, not by the agent
+    assert await results.get("leader") == await results.get("follower") == {"response": "same"}
@@ -1,36 +1,125 @@
+import asyncio
 import functools
+import random
 import time
-from typing import Callable, Any
+from collections import Counter
+from typing import Callable, Any, Optional, Tuple, Type, Union
+from .instrumentation import CounterMetrics, register_collector, span
 from .logger import setup_logger
 
 logger = setup_logger(__name__)
 
-def retry(max_attempts: int = 3, delay: float = 1.0):
-    """Retry decorator for failed operations."""
+RetryPolicy = Union[Tuple[Type[BaseException], ...], Callable[[BaseException], bool]]
+
+# Retry outcomes per decorated call site, keyed by (name, event):
+# "calls", "retries", "recovered", "exhausted", "budget_exhausted".
+retry_counters: Counter = Counter()
+register_collector(CounterMetrics(
+    "agent_retry_events", "Retry outcomes per call site", ["call", "event"], retry_counters
+))
+
+class RetryBudget:
+    """Token bucket that caps retries to a fraction of overall traffic.
+
+    Every call deposits `ratio` tokens and every retry spends one, so when a
+    dependency is failing the retries stop at roughly `ratio` extra load
+    instead of multiplying it. `min_per_second` keeps a trickle of retries
+    available for low-traffic callers. Share one budget between every caller
+    of the same dependency.
+    """
+
+    def __init__(self, ratio: float = 0.1, min_per_second: float = 1.0, capacity: float = 100.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def deposit(self):
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        self._refill()
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+# Used by `retry` unless a call site passes its own budget.
+default_retry_budget = RetryBudget()
+
+def _should_retry(policy: RetryPolicy, error: BaseException) -> bool:
+    if isinstance(policy, tuple):
+        return isinstance(error, policy)
+    return policy(error)
+
+def retry(max_attempts: int = 3, delay: float = 1.0, max_delay: float = 30.0,
+          retry_on: RetryPolicy = (Exception,), budget: Optional[RetryBudget] = None,
+          name: Optional[str] = None):
+    """Retry decorator for failed async operations.
+
+    Backs off with full jitter (a random wait between 0 and
+    `delay * 2 ** attempt`, capped at `max_delay`) on `asyncio.sleep`, so other
+    tasks keep running while a call waits. `retry_on` is a tuple of exception
+    types or a predicate deciding which failures are worth retrying; anything
+    else is raised immediately. Retries also need a token from `budget`
+    (default: `default_retry_budget`), and counts are kept in `retry_counters`,
+    which the metrics server exports as `agent_retry_events_total`.
+    """
     def decorator(func: Callable) -> Callable:
+        counter_name = name or getattr(func, "__qualname__", type(func).__name__)
+
         @functools.wraps(func)
         async def wrapper(*args: Any, **kwargs: Any) -> Any:
-            last_exception = None
+            retry_budget = budget or default_retry_budget
+            retry_budget.deposit()
+            retry_counters[(counter_name, "calls")] += 1
             for attempt in range(max_attempts):
                 try:
-                    return await func(*args, **kwargs)
+                    result = await func(*args, **kwargs)
                 except Exception as e:
-                    last_exception = e
-                    if attempt < max_attempts - 1:
-                        wait_time = delay * (2 ** attempt)  # Exponential backoff
-                        logger.warning(f"Attempt {attempt + 1} failed, retrying in {wait_time}s")
-                        time.sleep(wait_time)
-            raise last_exception
+                    if not _should_retry(retry_on, e):
+                        raise
+                    if attempt == max_attempts - 1:
+                        retry_counters[(counter_name, "exhausted")] += 1
+                        raise
+                    if not retry_budget.try_withdraw():
+                        retry_counters[(counter_name, "budget_exhausted")] += 1
+                        logger.warning(f"{counter_name} failed and the retry budget is spent, giving up")
+                        raise
+                    wait_time = random.uniform(0, min(max_delay, delay * (2 ** attempt)))
+                    retry_counters[(counter_name, "retries")] += 1
+                    logger.warning(
+                        f"{counter_name} attempt {attempt + 1} failed ({type(e).__name__}), "
+                        f"retrying in {wait_time:.2f}s"
+                    )
+                    await asyncio.sleep(wait_time)
+                    continue
+                if attempt:
+                    retry_counters[(counter_name, "recovered")] += 1
+                return result
         return wrapper
     return decorator
 
-def timing(func: Callable) -> Callable:
-    """Measure and log function execution time."""
-    @functools.wraps(func)
-    async def wrapper(*args: Any, **kwargs: Any) -> Any:
-        start_time = time.time()
-        result = await func(*args, **kwargs)
-        end_time = time.time()
-        logger.debug(f"{func.__name__} took {end_time - start_time:.2f}s to execute")
-        return result
-    return wrapper
+def timing(func: Optional[Callable] = None, *, stage: Optional[str] = None) -> Callable:
+    """Record execution time in the `stage` latency histogram (default: the function name)."""
+    def decorator(func: Callable) -> Callable:
+        stage_name = stage or func.__qualname__
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(stage_name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator(func) if func is not None else decorator
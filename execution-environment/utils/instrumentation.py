@@ -0,0 +1,168 @@
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+import time
+
+# Seconds; spans LLM calls as well as sub-millisecond cache and memory hits.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram fed with `perf_counter_ns` durations.
+
+    Bucket bounds are converted to integer nanoseconds once, so an
+    observation is one bisect and three integer additions.
+    """
+
+    __slots__ = ("buckets", "bounds_ns", "counts", "sum_ns", "count")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.bounds_ns = [int(bound * 1e9) for bound in self.buckets]
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum_ns = 0
+        self.count = 0
+
+    def observe_ns(self, duration_ns: int):
+        self.counts[bisect_left(self.bounds_ns, duration_ns)] += 1
+        self.sum_ns += duration_ns
+        self.count += 1
+
+    def percentile(self, q: float) -> float:
+        """Upper bound in seconds of the bucket holding quantile `q` (0-1)."""
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen and seen >= q * self.count:
+                return bound
+        return 0.0
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """Prometheus-style `(le, cumulative count)` pairs, ending with `+Inf`."""
+        pairs, seen = [], 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            pairs.append((repr(bound), seen))
+        pairs.append(("+Inf", self.count))
+        return pairs
+
+class Trace:
+    """Per-request span totals, identified by the request id that crosses the Redis hop."""
+
+    __slots__ = ("id", "spans")
+
+    def __init__(self, trace_id: Optional[str]):
+        self.id = trace_id
+        self.spans: Dict[str, float] = {}
+
+    def add(self, stage: str, duration_ns: int):
+        self.spans[stage] = self.spans.get(stage, 0.0) + duration_ns / 1e9
+
+# The trace of the request being handled by the current task, if any.
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+class Span:
+    """Context manager timing one stage into the histograms and the current trace."""
+
+    __slots__ = ("registry", "stage", "start")
+
+    def __init__(self, registry: "StageMetrics", stage: str):
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.observe_ns(self.stage, time.perf_counter_ns() - self.start)
+
+class StageMetrics:
+    """Latency histograms keyed by pipeline stage, exported as one labelled metric."""
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.histograms: Dict[str, LatencyHistogram] = {}
+
+    def histogram(self, stage: str) -> LatencyHistogram:
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = LatencyHistogram(self.buckets)
+        return histogram
+
+    def observe_ns(self, stage: str, duration_ns: int):
+        self.histogram(stage).observe_ns(duration_ns)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.add(stage, duration_ns)
+
+    def span(self, stage: str) -> Span:
+        return Span(self, stage)
+
+    def collect(self):
+        from prometheus_client.core import HistogramMetricFamily
+        family = HistogramMetricFamily(self.name, self.documentation, labels=["stage"])
+        for stage, histogram in list(self.histograms.items()):
+            family.add_metric([stage], histogram.cumulative(), histogram.sum_ns / 1e9)
+        yield family
+
+    def describe(self):
+        from prometheus_client.core import HistogramMetricFamily
+        yield HistogramMetricFamily(self.name, self.documentation, labels=["stage"])
+
+stage_metrics = StageMetrics(
+    "agent_stage_duration_seconds",
+    "Latency of agent worker stages (queue wait, tools, LLM, memory, end to end)"
+)
+
+class CounterMetrics:
+    """Exports a `Counter` keyed by label-value tuples as one labelled Prometheus counter."""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str], counts: Counter):
+        self.name = name
+        self.documentation = documentation
+        self.labels = list(labels)
+        self.counts = counts
+
+    def collect(self):
+        from prometheus_client.core import CounterMetricFamily
+        family = CounterMetricFamily(self.name, self.documentation, labels=self.labels)
+        for labels, value in list(self.counts.items()):
+            family.add_metric(list(labels), value)
+        yield family
+
+    def describe(self):
+        from prometheus_client.core import CounterMetricFamily
+        yield CounterMetricFamily(self.name, self.documentation, labels=self.labels)
+
+# Exported by `start_metrics_server`; modules add theirs with `register_collector`.
+collectors: List = [stage_metrics]
+
+def register_collector(collector):
+    collectors.append(collector)
+
+def span(stage: str) -> Span:
+    """Time a block as `stage`: ``with span("llm"): ...``."""
+    return stage_metrics.span(stage)
+
+def start_metrics_server(port: int) -> bool:
+    """Serve the stage histograms, registered counters and process metrics for Prometheus on `port`.
+
+    prometheus_client is only imported here, so workers without a metrics
+    port never load it. Without the package metrics are still recorded,
+    just not exported.
+    """
+    try:
+        from prometheus_client import REGISTRY, start_http_server
+    except ImportError:
+        return False
+    for collector in collectors:
+        try:
+            REGISTRY.register(collector)
+        except ValueError:  # Already registered
+            pass
+    start_http_server(port)
+    return True
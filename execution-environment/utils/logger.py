@@ -1,9 +1,9 @@
 import logging
-from ..config.settings import Settings
+from config.settings import get_settings
 
 def setup_logger(name: str) -> logging.Logger:
     """Setup and return a logger instance."""
-    settings = Settings()
+    settings = get_settings()
     
     logger = logging.getLogger(name)
     logger.setLevel(settings.LOG_LEVEL)
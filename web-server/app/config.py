@@ -17,6 +17,23 @@ class Settings(BaseSettings):
     # Agent Service Configuration
     AGENT_SERVICE_HOST: str = "agent-execution"
     AGENT_SERVICE_PORT: int = 5000
+    AGENT_QUEUE_TRANSPORT: str = "list"  # Options: list, stream
+    AGENT_QUEUE_NAME: str = "agent_requests"
+    AGENT_QUEUE_MAXLEN: int = 10000  # Approximate cap for the stream transport
+    AGENT_REPLY_MODE: str = "multiplex"  # Options: blpop, multiplex
+    AGENT_REPLY_TIMEOUT: int = 30  # Seconds to wait for an agent reply (or the next streamed event)
+    AGENT_QUEUE_MAX_DEPTH: int = 1000  # Interactive lane depth beyond which requests get 503
+    AGENT_BATCH_QUEUE_MAX_DEPTH: int = 10000  # Batch lane depth beyond which requests get 429
+    AGENT_MAX_PENDING: int = 1000  # Requests per API process waiting for replies before 503
+    AGENT_RETRY_AFTER: int = 2  # Retry-After seconds sent with 429/503
+    AGENT_WIRE_SERIALIZER: str = "json"  # Queue payload format: json, msgpack (workers read all of them)
+    AGENT_WIRE_COMPRESSION: str = "zlib"  # Options: zlib, zstd, none
+    AGENT_WIRE_COMPRESS_MIN_BYTES: int = 4096  # Compress larger payloads; 0 disables compression
+    AGENT_COALESCE_REQUESTS: bool = True  # Identical in-flight queries share one agent execution
+    AGENT_STREAM_CANCEL_TTL: int = 300  # Seconds a cancelled stream's stop signal is kept for the worker
+    AGENT_HEALTH_INTERVAL: float = 5.0  # Seconds between background dependency probes
+    AGENT_HEALTH_TIMEOUT: float = 1.0  # A probe slower than this marks Redis unavailable
+    AGENT_WORKER_HEARTBEAT_TTL: float = 15.0  # Workers silent this long count as gone
     
     class Config:
         case_sensitive = True
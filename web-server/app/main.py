@@ -1,19 +1,22 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .config import settings
+from .instrumentation import register_metrics
 from .routes import agent, health
-from .middleware import RequestIDMiddleware, LoggingMiddleware
+from .middleware import RequestIDMiddleware, LoggingMiddleware, configure_access_log
 from contextlib import asynccontextmanager
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     from .services.agent_service import get_agent_service
+    access_log = configure_access_log()
     agent_service = get_agent_service()
     await agent_service.connect()
     yield
     # Shutdown
     await agent_service.disconnect()
+    access_log.stop()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -48,5 +51,6 @@ app.include_router(
 try:
     from prometheus_fastapi_instrumentator import Instrumentator
     Instrumentator().instrument(app).expose(app)
+    register_metrics()
 except ImportError:
     print("Prometheus metrics disabled - package not available") 
\ No newline at end of file
@@ -1,4 +1,4 @@
-from .logging import LoggingMiddleware
+from .logging import LoggingMiddleware, configure_access_log
 from .request_id import RequestIDMiddleware
 
-__all__ = ["LoggingMiddleware", "RequestIDMiddleware"] 
\ No newline at end of file
+__all__ = ["LoggingMiddleware", "RequestIDMiddleware", "configure_access_log"] 
\ No newline at end of file
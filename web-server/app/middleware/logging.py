@@ -1,17 +1,84 @@
-import time
+import json
 import logging
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
+import time
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import Optional
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from ..instrumentation import stage_metrics
 
 logger = logging.getLogger(__name__)
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        response = await call_next(request)
-        process_time = time.time() - start_time
-        logger.info(
-            f"Method: {request.method} Path: {request.url.path} "
-            f"Status: {response.status_code} Duration: {process_time:.2f}s"
-        )
-        return response 
\ No newline at end of file
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line; fields passed as `extra={"fields": {...}}` are merged in."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, default=str)
+
+def configure_access_log(handler: Optional[logging.Handler] = None) -> QueueListener:
+    """Route access logs through a queue so request handlers never wait on log I/O.
+
+    Records are formatted and written by `handler` (default: JSON to stderr)
+    on the listener's thread. Call `stop()` on the returned listener at
+    shutdown to flush what is still queued.
+    """
+    if handler is None:
+        handler = logging.StreamHandler()
+        handler.setFormatter(JSONFormatter())
+    queue = SimpleQueue()
+    logger.handlers = [QueueHandler(queue)]
+    logger.propagate = False
+    if logger.level == logging.NOTSET:
+        logger.setLevel(logging.INFO)
+    listener = QueueListener(queue, handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+class LoggingMiddleware:
+    """Logs one structured line per request and records its latency.
+
+    The duration runs until the last body chunk is sent, so streamed
+    responses are measured in full. Pure ASGI: nothing is buffered.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter_ns()
+        status_code = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration_ns = time.perf_counter_ns() - start_time
+            stage_metrics.observe_ns("request", duration_ns)
+            if logger.isEnabledFor(logging.INFO):
+                request_id = scope.get("state", {}).get("request_id")
+                logger.info(
+                    f"{scope['method']} {scope['path']} {status_code}",
+                    extra={"fields": {
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status": status_code,
+                        "duration_ms": round(duration_ns / 1e6, 3),
+                        "request_id": request_id,
+                    }}
+                )
@@ -1,11 +1,45 @@
+import re
 import uuid
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-
-class RequestIDMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        request_id = str(uuid.uuid4())
-        request.state.request_id = request_id
-        response = await call_next(request)
-        response.headers["X-Request-ID"] = request_id
-        return response 
\ No newline at end of file
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from ..instrumentation import Trace, current_trace
+
+# Upstream ids are echoed into logs and headers, so only accept plain tokens.
+_VALID_REQUEST_ID = re.compile(rb"^[A-Za-z0-9._:-]{1,128}$")
+
+class RequestIDMiddleware:
+    """Tags each request with an id, exposed as `request.state.request_id`.
+
+    An incoming `X-Request-ID` is kept so one id spans proxy, API and worker
+    logs; otherwise a UUID is generated. The id is echoed in the response
+    headers and starts the request's trace. Pure ASGI: the response body
+    passes through untouched, so streaming responses are unaffected.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        raw_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                raw_id = value if _VALID_REQUEST_ID.match(value) else None
+                break
+        if raw_id is None:
+            raw_id = str(uuid.uuid4()).encode()
+        request_id = raw_id.decode("latin-1")
+        scope.setdefault("state", {})["request_id"] = request_id
+
+        async def send_with_request_id(message: Message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), (b"x-request-id", raw_id)]
+            await send(message)
+
+        token = current_trace.set(Trace(request_id))
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            current_trace.reset(token)
@@ -1,3 +1,3 @@
-from .requests import AgentRequest, AgentResponse
+from .requests import AgentRequest, AgentResponse, BatchAnalysisRequest, SourceFile
 
-__all__ = ["AgentRequest", "AgentResponse"] 
\ No newline at end of file
+__all__ = ["AgentRequest", "AgentResponse", "BatchAnalysisRequest", "SourceFile"] 
\ No newline at end of file
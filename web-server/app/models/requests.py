@@ -1,11 +1,29 @@
 from pydantic import BaseModel
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, List, Literal
 
 class AgentRequest(BaseModel):
     query: str
     context: Optional[Dict[str, Any]] = None
+    priority: Literal['interactive', 'batch'] = 'interactive'  # Queue lane
+    idempotency_key: Optional[str] = None  # Repeats of a key get the first reply instead of running again
+    session_id: Optional[str] = None  # Conversation to continue; without one the query has no history
+
+    def agent_context(self) -> Optional[Dict[str, Any]]:
+        """`context` with `session_id` merged in, as the agent receives it."""
+        if self.session_id is None:
+            return self.context
+        return {**(self.context or {}), 'session_id': self.session_id}
 
 class AgentResponse(BaseModel):
     response: Any
     status: str
-    error: Optional[str] = None 
\ No newline at end of file
+    error: Optional[str] = None 
+
+class SourceFile(BaseModel):
+    path: str
+    code: str
+
+class BatchAnalysisRequest(BaseModel):
+    files: List[SourceFile] = []
+    archive: Optional[str] = None  # base64-encoded zip or tar(.gz) archive
+    context: Optional[Dict[str, Any]] = None
\ No newline at end of file
@@ -1,14 +1,91 @@
-from fastapi import APIRouter, HTTPException
-from ..models.requests import AgentRequest, AgentResponse
+import json
+from contextlib import aclosing
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from ..models.requests import AgentRequest, AgentResponse, BatchAnalysisRequest
+from ..services.admission import AgentOverloaded
 from ..services.agent_service import get_agent_service
 
 router = APIRouter()
 
+def _overloaded(error: AgentOverloaded) -> HTTPException:
+    return HTTPException(
+        status_code=error.status_code,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
 @router.post("/query", response_model=AgentResponse)
-async def query_agent(request: AgentRequest):
+async def query_agent(request: AgentRequest,
+                      idempotency_key: Optional[str] = Header(None, alias='Idempotency-Key')):
+    if idempotency_key and not request.idempotency_key:
+        request = request.model_copy(update={'idempotency_key': idempotency_key})
     try:
         agent_service = get_agent_service()
         response = await agent_service.send_request(request)
         return response
+    except AgentOverloaded as e:
+        raise _overloaded(e)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e)) 
+
+@router.post("/query/stream")
+async def query_agent_stream(request: AgentRequest):
+    """Relay the agent's answer as Server-Sent Events while it is generated.
+    
+    Each `message` event carries `{"delta": text}`; the stream finishes with an
+    `end` event, or an `error` event with `{"error": message}`.
+    """
+    agent_service = get_agent_service()
+    try:
+        request_id = await agent_service.start_stream(request)
+    except AgentOverloaded as e:
+        raise _overloaded(e)
+
+    async def events():
+        # aclosing: a disconnect must reach read_stream's cleanup right away
+        async with aclosing(agent_service.read_stream(request_id)) as stream:
+            async for event in stream:
+                if event['event'] == 'data':
+                    yield f"data: {json.dumps(event['data'])}\n\n"
+                elif event['event'] == 'error':
+                    yield f"event: error\ndata: {json.dumps({'error': event.get('error')})}\n\n"
+                else:
+                    yield "event: end\ndata: {}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@router.post("/batch")
+async def analyze_batch(request: BatchAnalysisRequest):
+    """Analyze many files in one call, streaming one NDJSON line per file as it finishes."""
+    if not request.files and not request.archive:
+        raise HTTPException(status_code=400, detail="Provide files or an archive")
+
+    context = {
+        **(request.context or {}),
+        'type': 'code_analysis_batch',
+        'files': [f.model_dump() for f in request.files],
+        'archive': request.archive
+    }
+    agent_service = get_agent_service()
+    try:
+        request_id = await agent_service.start_stream(
+            AgentRequest(query='', context=context, priority='batch')
+        )
+    except AgentOverloaded as e:
+        raise _overloaded(e)
+
+    async def results():
+        async with aclosing(agent_service.read_stream(request_id)) as stream:
+            async for event in stream:
+                if event['event'] == 'data':
+                    yield json.dumps(event['data']) + '\n'
+                elif event['event'] == 'error':
+                    yield json.dumps({'error': event.get('error')}) + '\n'
+
+    return StreamingResponse(results(), media_type='application/x-ndjson')
\ No newline at end of file
@@ -1,13 +1,32 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 from ..services.agent_service import get_agent_service
 
 router = APIRouter()
 
+# All health routes serve the background prober's cached results, so probes
+# never wait on Redis.
+
 @router.get("/health")
 async def health_check():
-    agent_service = get_agent_service()
-    agent_health = await agent_service.check_health()
+    status = get_agent_service().health_status()
     return {
-        "status": "healthy" if agent_health else "degraded",
-        "agent_service": agent_health
-    } 
\ No newline at end of file
+        "status": "healthy" if status["redis"] else "degraded",
+        "agent_service": status["redis"],
+        "ready": status["ready"]
+    }
+
+@router.get("/health/live")
+async def liveness():
+    """The API process is up and its event loop is responsive."""
+    return {"status": "alive"}
+
+@router.get("/health/ready")
+async def readiness():
+    """503 unless Redis answers and at least one worker is taking requests.
+
+    The body reports per-lane queue depth and lag (seconds the oldest
+    request has waited) and worker availability from the last probe.
+    """
+    status = get_agent_service().health_status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
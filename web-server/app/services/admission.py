@@ -0,0 +1,53 @@
+import time
+from typing import Dict, Optional, Tuple
+from .transport import RequestTransport
+
+class AgentOverloaded(Exception):
+    """Raised instead of enqueueing work the agents cannot get to in time."""
+
+    def __init__(self, message: str, status_code: int = 503, retry_after: int = 1):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """Rejects requests up front when their lane's queue is already too deep.
+
+    Queue depth is read from Redis at most once per `refresh_interval` per
+    lane; in between, requests admitted by this process are added to the
+    last reading so a burst cannot overshoot the limit. A full interactive
+    lane answers 503 (the service is overloaded); a full batch lane answers
+    429 (the batch submitter should slow down). Both carry `retry_after`.
+    """
+
+    def __init__(self, max_depth: Dict[str, int], retry_after: int = 1,
+                 refresh_interval: float = 0.1, max_pending: Optional[int] = None):
+        self.max_depth = max_depth
+        self.retry_after = retry_after
+        self.refresh_interval = refresh_interval
+        self.max_pending = max_pending
+        # lane -> (depth at last reading, admitted since, monotonic time of reading)
+        self._depth: Dict[str, Tuple[int, int, float]] = {}
+        self.rejected = 0
+
+    async def admit(self, lane: str, transport: RequestTransport, pending: int = 0):
+        if self.max_pending is not None and pending >= self.max_pending:
+            self.rejected += 1
+            raise AgentOverloaded("Too many requests waiting for the agent", 503, self.retry_after)
+
+        limit = self.max_depth.get(lane)
+        if limit is None:
+            return
+        depth, admitted, checked_at = self._depth.get(lane, (0, 0, float("-inf")))
+        now = time.monotonic()
+        if now - checked_at >= self.refresh_interval:
+            depth, admitted, checked_at = await transport.depth(), 0, now
+        if depth + admitted >= limit:
+            self._depth[lane] = (depth, admitted, checked_at)
+            self.rejected += 1
+            raise AgentOverloaded(
+                f"The {lane} queue is full",
+                429 if lane == "batch" else 503,
+                self.retry_after
+            )
+        self._depth[lane] = (depth, admitted + 1, checked_at)
@@ -1,15 +1,35 @@
 import redis.asyncio as redis
-import json
+import logging
+import time
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, Optional
 from ..config import settings
+from ..instrumentation import span, trace_payload
 from ..models.requests import AgentRequest, AgentResponse
-from tenacity import retry, stop_after_attempt, wait_exponential
+from .admission import AdmissionController, AgentOverloaded
+from .codec import Codec, create_codec
+from .health import HealthProber, unprobed_status
+from .reply_router import ReplyRouter
+from .single_flight import SingleFlight, request_key
+from .transport import LANES, create_transport
+from tenacity import retry, retry_if_not_exception_type, stop_after_attempt, wait_exponential
+
+logger = logging.getLogger(__name__)
 
 class AgentService:
     _instance = None
 
-    def __init__(self):
+    def __init__(self, redis_client=None):
+        self._redis_client = redis_client
         self.redis = None
         self.connected = False
+        self.reply_router = None
+        self.transport = None
+        self.transports = {}
+        self.admission = None
+        self.health = None
+        self.single_flight = SingleFlight()
+        self.codec = create_codec(settings, prefix='AGENT_WIRE_')
 
     @classmethod
     def get_instance(cls):
@@ -19,42 +39,88 @@ class AgentService:
 
     async def connect(self):
         if not self.connected:
-            self.redis = await redis.from_url(
+            self.redis = self._redis_client or await redis.from_url(
                 f'redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_DB}'
             )
+            self.transports = {lane: create_transport(self.redis, lane) for lane in LANES}
+            self.transport = self.transports['interactive']
+            self.admission = AdmissionController(
+                {
+                    'interactive': settings.AGENT_QUEUE_MAX_DEPTH,
+                    'batch': settings.AGENT_BATCH_QUEUE_MAX_DEPTH
+                },
+                retry_after=settings.AGENT_RETRY_AFTER,
+                max_pending=settings.AGENT_MAX_PENDING
+            )
+            if settings.AGENT_REPLY_MODE == 'multiplex':
+                self.reply_router = ReplyRouter(self.redis, codec=self.codec)
+                await self.reply_router.start()
+            self.health = HealthProber(
+                self.redis,
+                self.transports,
+                interval=settings.AGENT_HEALTH_INTERVAL,
+                timeout=settings.AGENT_HEALTH_TIMEOUT,
+                heartbeat_ttl=settings.AGENT_WORKER_HEARTBEAT_TTL,
+                codec=self.codec
+            )
+            await self.health.start()
             self.connected = True
 
     async def disconnect(self):
+        if self.health:
+            await self.health.stop()
+            self.health = None
+        if self.reply_router:
+            await self.reply_router.stop()
+            self.reply_router = None
         if self.redis:
             await self.redis.close()
             self.connected = False
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
     async def send_request(self, request: AgentRequest) -> AgentResponse:
+        # Identical requests share an execution only within one lane, and only
+        # under the same client key: a request coalesced under another key
+        # would leave its own key without a stored result.
+        coalesce_key = request_key(
+            request.query, request.agent_context(), request.priority, request.idempotency_key
+        )
+        return await self._send_with_retry(request, coalesce_key)
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        retry=retry_if_not_exception_type(AgentOverloaded)
+    )
+    async def _send_with_retry(self, request: AgentRequest, coalesce_key: str) -> AgentResponse:
         if not self.connected:
             await self.connect()
 
+        # Identical requests already in flight share one agent execution
+        if settings.AGENT_COALESCE_REQUESTS:
+            return await self.single_flight.do(coalesce_key, lambda: self._send(request))
+        return await self._send(request)
+
+    async def _send(self, request: AgentRequest) -> AgentResponse:
+        stored = await self._stored_result(request.idempotency_key)
+        if stored is not None:
+            return AgentResponse(response=stored.get('response'), status='success')
+
+        await self._admit(request.priority)
         try:
             request_id = await self.redis.incr('request_counter')
             
-            request_data = {
-                'id': request_id,
-                'query': request.query,
-                'context': request.context
-            }
+            request_data = self._request_data(request_id, request)
             
-            await self.redis.rpush('agent_requests', json.dumps(request_data))
+            with span('agent_roundtrip'):
+                response = await self._dispatch(request_id, request_data, request.priority)
             
-            response_data = await self.redis.blpop(
-                f'agent_responses:{request_id}',
-                timeout=30
-            )
-            
-            if response_data:
-                response = json.loads(response_data[1])
+            if response:
+                if response.get('trace'):
+                    logger.debug(f"Request {request_id} trace: {response['trace']}")
                 return AgentResponse(
                     response=response.get('response'),
-                    status='success'
+                    status='error' if response.get('error') else 'success',
+                    error=response.get('error')
                 )
             else:
                 return AgentResponse(
@@ -70,14 +136,132 @@ class AgentService:
                 error=str(e)
             )
 
-    async def check_health(self) -> bool:
+    async def _stored_result(self, idempotency_key: Optional[str]) -> Optional[dict]:
+        """The reply workers stored for `idempotency_key`, if it already completed."""
+        if not idempotency_key:
+            return None
+        raw = await self.redis.get(f'agent_result:{idempotency_key}')
+        if raw is None:
+            return None
+        entry = self.codec.decode(raw)
+        return entry.get('reply') if entry.get('status') == 'done' else None
+
+    async def _admit(self, lane: str):
+        """Raise AgentOverloaded rather than queue work that would wait too long."""
+        pending = self.reply_router.pending if self.reply_router else 0
+        await self.admission.admit(lane, self.transports[lane], pending)
+
+    def _request_data(self, request_id: int, request: AgentRequest, **extra) -> dict:
+        return {
+            'id': request_id,
+            'query': request.query,
+            'context': request.agent_context(),
+            # Workers drop requests nobody is waiting for any more
+            'deadline': time.time() + settings.AGENT_REPLY_TIMEOUT,
+            'trace': trace_payload(),
+            # Only client keys are stored: workers keep no result for keyless requests
+            **({'idempotency_key': request.idempotency_key} if request.idempotency_key else {}),
+            **extra
+        }
+
+    async def _dispatch(self, request_id: int, request_data: dict, lane: str = 'interactive'):
+        """Enqueue a request and wait for its reply, or None on timeout."""
+        transport = self.transports[lane]
+        if self.reply_router is None:
+            await transport.publish(self.codec.encode(request_data))
+            response_data = await self.redis.blpop(
+                f'agent_responses:{request_id}',
+                timeout=settings.AGENT_REPLY_TIMEOUT
+            )
+            return self.codec.decode(response_data[1]) if response_data else None
+
+        # Multiplexed mode: register before enqueueing so a fast reply is never missed.
+        request_data['reply_to'] = self.reply_router.channel
+        self.reply_router.register(request_id)
         try:
-            if not self.connected:
-                await self.connect()
-            await self.redis.ping()
-            return True
+            await transport.publish(self.codec.encode(request_data))
         except Exception:
-            return False
+            self.reply_router.discard(request_id)
+            raise
+        return await self.reply_router.wait(request_id, settings.AGENT_REPLY_TIMEOUT)
+
+    async def stream_request(self, request: AgentRequest) -> AsyncIterator[Dict[str, Any]]:
+        """Enqueue a streaming request and yield its events as the agent emits them."""
+        request_id = await self.start_stream(request)
+        async with aclosing(self.read_stream(request_id)) as events:
+            async for event in events:
+                yield event
+
+    async def start_stream(self, request: AgentRequest) -> int:
+        """Admit and enqueue a streaming request; returns the id to pass to `read_stream`.
+
+        Kept separate so routes can turn AgentOverloaded into a 429/503
+        before any part of a streaming response has been sent.
+        """
+        if not self.connected:
+            await self.connect()
+
+        await self._admit(request.priority)
+        request_id = await self.redis.incr('request_counter')
+        await self.transports[request.priority].publish(
+            self.codec.encode(self._request_data(request_id, request, stream=True))
+        )
+        return request_id
+
+    async def read_stream(self, request_id: int) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the events of a streaming request as the agent emits them.
+
+        The worker appends events to the Redis stream ``agent_stream:{id}``:
+        ``{'event': 'data', 'data': ...}`` items followed by a final ``end`` or
+        ``error`` event. Events are read only as fast as the caller consumes
+        them and trimmed once read, which is what the worker's backpressure
+        watches. If the caller stops early (e.g. the client disconnected),
+        ``agent_cancel:{id}`` tells the worker to stop generating.
+        """
+        key = f'agent_stream:{request_id}'
+        last_id = '0-0'
+        # Only a terminal event from the worker means it has stopped; a timeout
+        # or a caller that stops early must still tell it to.
+        completed = False
+        try:
+            while True:
+                result = await self.redis.xread(
+                    {key: last_id},
+                    count=100,
+                    block=int(settings.AGENT_REPLY_TIMEOUT * 1000)
+                )
+                if not result:
+                    yield {'event': 'error', 'error': 'Request timeout'}
+                    return
+                for _, entries in result:
+                    for entry_id, fields in entries:
+                        last_id = entry_id
+                        event = _decode_event(fields, self.codec)
+                        if event['event'] != 'data':
+                            completed = True
+                            yield event
+                            return
+                        yield event
+                await self.redis.xtrim(key, minid=last_id, approximate=False)
+        finally:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.delete(key)
+                if not completed:
+                    pipe.set(f'agent_cancel:{request_id}', 1, ex=settings.AGENT_STREAM_CANCEL_TTL)
+                await pipe.execute()
+
+    def health_status(self) -> Dict[str, Any]:
+        """Cached pipeline health from the background prober; never touches Redis."""
+        if self.health is None:
+            return {**unprobed_status('not connected'), 'age': None, 'ready': False}
+        return self.health.status()
+
+def _decode_event(fields: Dict, codec: Codec) -> Dict[str, Any]:
+    fields = {(k.decode() if isinstance(k, bytes) else k): v for k, v in fields.items()}
+    if 'data' in fields:
+        # Large items may arrive compressed, so the raw bytes go to the codec
+        return {'event': 'data', 'data': codec.decode(fields['data'])}
+    return {k: (v.decode() if isinstance(v, bytes) else v) for k, v in fields.items()}
 
 def get_agent_service() -> AgentService:
     return AgentService.get_instance() 
\ No newline at end of file
@@ -0,0 +1,130 @@
+# The two services share this module: execution-environment/core/codec.py and
+# web-server/app/services/codec.py must stay identical, since both ends of the
+# queue read each other's payloads. web-server/tests/test_shared_modules.py checks it.
+import json
+import zlib
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # The stdlib encoder produces the same JSON, only slower
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # Required for serializer="msgpack"
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # Required for compression="zstd"
+    zstandard = None
+
+# Framed payloads start with MAGIC, which is never the first byte of UTF-8
+# text, so anything else is read as the plain JSON older peers write.
+MAGIC = 0xC1
+VERSION = 1
+
+SERIALIZERS = {"json": 1, "msgpack": 2}
+COMPRESSIONS = {"none": 0, "zlib": 0x01, "zstd": 0x02}
+
+class CodecError(ValueError):
+    """A payload could not be decoded."""
+
+class Codec:
+    """Serialises queue payloads and stored values.
+
+    A framed payload is a 4-byte header (MAGIC, format VERSION, serializer
+    id, compression flags) followed by the body. Bodies of at least
+    `compress_min_bytes` are compressed when that makes them smaller.
+    Uncompressed JSON is written without a header, so peers that predate
+    the codec can read it. `decode` accepts every serializer, compression
+    and format version up to VERSION whatever the codec's own settings,
+    so a fleet can be switched over one process at a time: first deploy
+    readers, then change what writers emit.
+    """
+
+    def __init__(self, serializer: str = "json", compression: str = "zlib",
+                 compress_min_bytes: int = 4096, level: int = 3):
+        if serializer not in SERIALIZERS:
+            raise ValueError(f"Unknown serializer: {serializer}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        if serializer == "msgpack" and msgpack is None:
+            raise ImportError("The msgpack serializer requires the 'msgpack' package")
+        if compression == "zstd" and zstandard is None:
+            raise ImportError("zstd compression requires the 'zstandard' package")
+        self.serializer = serializer
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+        self.level = level
+
+    def encode(self, value: Any) -> bytes:
+        body = _dumps(self.serializer, value)
+        flags = 0
+        if self.compression != "none" and self.compress_min_bytes and len(body) >= self.compress_min_bytes:
+            compressed = _compress(self.compression, body, self.level)
+            if len(compressed) < len(body):
+                body, flags = compressed, COMPRESSIONS[self.compression]
+        if self.serializer == "json" and not flags:
+            return body
+        return bytes((MAGIC, VERSION, SERIALIZERS[self.serializer], flags)) + body
+
+    def decode(self, raw: Union[bytes, str]) -> Any:
+        if isinstance(raw, str):
+            return json.loads(raw)
+        if not raw or raw[0] != MAGIC:
+            return _loads_json(raw)
+        if len(raw) < 4:
+            raise CodecError("Truncated payload header")
+        version, serializer_id, flags = raw[1], raw[2], raw[3]
+        if version > VERSION:
+            raise CodecError(f"Payload format version {version} is newer than this reader ({VERSION})")
+        try:
+            body = _decompress(flags, bytes(raw[4:]))
+            if serializer_id == SERIALIZERS["json"]:
+                return _loads_json(body)
+            if serializer_id == SERIALIZERS["msgpack"]:
+                if msgpack is None:
+                    raise CodecError("Payload is msgpack but the 'msgpack' package is not installed")
+                return msgpack.unpackb(body, raw=False, strict_map_key=False)
+        except CodecError:
+            raise
+        except Exception as e:
+            raise CodecError(f"Corrupt payload: {e}") from e
+        raise CodecError(f"Unknown serializer id {serializer_id}")
+
+def _dumps(serializer: str, value: Any) -> bytes:
+    if serializer == "msgpack":
+        return msgpack.packb(value, default=str, use_bin_type=True)
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:  # e.g. integers beyond 64 bits
+            pass
+    return json.dumps(value, default=str, separators=(",", ":")).encode()
+
+def _loads_json(raw: bytes) -> Any:
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+def _compress(compression: str, body: bytes, level: int) -> bytes:
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(body)
+    return zlib.compress(body, level)
+
+def _decompress(flags: int, body: bytes) -> bytes:
+    if flags & COMPRESSIONS["zstd"]:
+        if zstandard is None:
+            raise CodecError("Payload is zstd-compressed but the 'zstandard' package is not installed")
+        return zstandard.ZstdDecompressor().decompress(body)
+    if flags & COMPRESSIONS["zlib"]:
+        return zlib.decompress(body)
+    return body
+
+def create_codec(settings, prefix: str = "WIRE_") -> Codec:
+    """Build the codec configured by `{prefix}SERIALIZER`, `{prefix}COMPRESSION` and `{prefix}COMPRESS_MIN_BYTES`."""
+    return Codec(
+        getattr(settings, f"{prefix}SERIALIZER"),
+        getattr(settings, f"{prefix}COMPRESSION"),
+        getattr(settings, f"{prefix}COMPRESS_MIN_BYTES")
+    )
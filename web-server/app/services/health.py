@@ -0,0 +1,135 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, Optional
+from .codec import Codec
+from .transport import RequestTransport
+
+logger = logging.getLogger(__name__)
+
+# Hash of worker name -> JSON heartbeat, written by the execution environment.
+WORKERS_KEY = 'agent_workers'
+
+def unprobed_status(error: str) -> Dict[str, Any]:
+    """Health snapshot for when no probe has succeeded (or run) yet."""
+    return {
+        'redis': False,
+        'queues': {},
+        'workers': {'live': 0, 'in_flight': 0, 'capacity': 0},
+        'checked_at': None,
+        'error': error
+    }
+
+class HealthProber:
+    """Keeps a cached view of the agent pipeline's health, refreshed in the background.
+
+    Every `interval` seconds one probe pings Redis, reads each lane's depth
+    and lag (how long its oldest request has been queued) and the worker
+    heartbeats in ``agent_workers``. A probe slower than `timeout` counts as
+    Redis being unavailable. Health routes only read `status()`, so however
+    often they are polled they cost no Redis round trips and never wait on a
+    slow dependency.
+
+    The pipeline is ready when the last probe is recent, Redis answered and
+    at least one worker that is not draining sent a heartbeat within
+    `heartbeat_ttl` seconds.
+    """
+
+    def __init__(self, redis_client, transports: Dict[str, RequestTransport],
+                 interval: float = 5.0, timeout: float = 1.0, heartbeat_ttl: float = 15.0,
+                 codec: Optional[Codec] = None):
+        self.redis = redis_client
+        self.transports = transports
+        self.interval = interval
+        self.timeout = timeout
+        self.heartbeat_ttl = heartbeat_ttl
+        self.codec = codec or Codec()
+        self._status = unprobed_status('not probed yet')
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if not self.running:
+            await self.probe()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> Dict[str, Any]:
+        """The latest probe's results, with their `age` in seconds and the `ready` verdict."""
+        status = dict(self._status)
+        checked_at = status['checked_at']
+        status['age'] = time.time() - checked_at if checked_at is not None else None
+        # Three missed probes mean the prober itself is stuck
+        fresh = status['age'] is not None and status['age'] <= 3 * self.interval
+        status['ready'] = fresh and status['redis'] and status['workers']['live'] > 0
+        return status
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.probe()
+
+    async def probe(self):
+        try:
+            self._status = await asyncio.wait_for(self._check(), self.timeout)
+        except Exception as e:
+            logger.warning(f"Health probe failed: {str(e) or type(e).__name__}")
+            self._status = {**unprobed_status(str(e) or type(e).__name__), 'checked_at': time.time()}
+
+    async def _check(self) -> Dict[str, Any]:
+        await self.redis.ping()
+        now = time.time()
+        queues = {}
+        for lane, transport in self.transports.items():
+            depth = await transport.depth()
+            queues[lane] = {
+                'depth': depth,
+                'lag': self._lag(await transport.peek(), now) if depth else 0.0
+            }
+        return {
+            'redis': True,
+            'queues': queues,
+            'workers': await self._workers(now),
+            'checked_at': now,
+            'error': None
+        }
+
+    def _lag(self, payload: Optional[bytes], now: float) -> float:
+        if payload is None:
+            return 0.0
+        try:
+            enqueued_at = self.codec.decode(payload)['trace']['enqueued_at']
+            return max(0.0, now - enqueued_at)
+        except (TypeError, ValueError, KeyError):
+            return 0.0
+
+    async def _workers(self, now: float) -> Dict[str, int]:
+        live = in_flight = capacity = 0
+        gone = []
+        for name, raw in (await self.redis.hgetall(WORKERS_KEY)).items():
+            try:
+                beat = json.loads(raw)
+            except ValueError:
+                beat = {}
+            if now - beat.get('at', 0) > self.heartbeat_ttl:
+                gone.append(name)
+            elif not beat.get('stopping'):
+                live += 1
+                in_flight += beat.get('in_flight', 0)
+                capacity += beat.get('concurrency', 0)
+        if gone:
+            # Workers that crashed never removed their heartbeat
+            await self.redis.hdel(WORKERS_KEY, *gone)
+        return {'live': live, 'in_flight': in_flight, 'capacity': capacity}
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import uuid
+from typing import Any, Dict, Optional
+from .codec import Codec
+
+logger = logging.getLogger(__name__)
+
+class ReplyRouter:
+    """Routes agent replies from a single per-worker Redis list to waiting futures.
+
+    Instead of every request blocking a pooled connection on its own
+    ``agent_responses:{id}`` key, requests carry a ``reply_to`` channel and the
+    execution environment pushes ``{"id": ..., ...}`` replies onto it. One
+    background listener drains that list and resolves the matching future.
+    """
+
+    def __init__(self, redis_client, prefix: str = "agent_replies",
+                 poll_timeout: int = 1, drain_batch: int = 100, codec: Optional[Codec] = None):
+        self.redis = redis_client
+        self.codec = codec or Codec()
+        self.channel = f"{prefix}:{uuid.uuid4().hex}"
+        self.poll_timeout = poll_timeout
+        self.drain_batch = drain_batch
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for future in self._pending.values():
+            if not future.done():
+                future.cancel()
+        self._pending.clear()
+
+    def register(self, request_id: Any) -> asyncio.Future:
+        """Register interest in a reply. Must be called before the request is enqueued."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending[str(request_id)] = future
+        return future
+
+    def discard(self, request_id: Any):
+        future = self._pending.pop(str(request_id), None)
+        if future and not future.done():
+            future.cancel()
+
+    async def wait(self, request_id: Any, timeout: float) -> Optional[Dict]:
+        """Wait for a registered reply; returns None on timeout.
+
+        The future is always removed from the pending table, whether the wait
+        completes, times out or the caller is cancelled.
+        """
+        future = self._pending.get(str(request_id))
+        if future is None:
+            future = self.register(request_id)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self.discard(request_id)
+
+    def _dispatch(self, raw: Any):
+        try:
+            message = self.codec.decode(raw)
+        except (TypeError, ValueError):
+            logger.warning(f"Dropping malformed reply on {self.channel}")
+            return
+        future = self._pending.pop(str(message.get("id")), None)
+        if future is None:
+            # The caller timed out or was cancelled; nobody is waiting any more.
+            logger.debug(f"Dropping reply for abandoned request {message.get('id')}")
+            return
+        if not future.done():
+            future.set_result(message)
+
+    async def _listen(self):
+        while True:
+            try:
+                item = await self.redis.blpop(self.channel, timeout=self.poll_timeout)
+                if not item:
+                    continue
+                # Drain whatever else queued up behind it in one round trip.
+                rest = await self.redis.lpop(self.channel, self.drain_batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Reply listener error on {self.channel}: {str(e)}")
+                await asyncio.sleep(self.poll_timeout)
+                continue
+            self._dispatch(item[1])
+            for raw in rest or []:
+                self._dispatch(raw)
@@ -0,0 +1,91 @@
+from abc import ABC, abstractmethod
+from typing import Optional
+from ..config import settings
+
+class RequestTransport(ABC):
+    """Base class for the queue that carries requests to the execution environment."""
+
+    def __init__(self, redis_client, queue: str):
+        self.redis = redis_client
+        self.queue = queue
+
+    @abstractmethod
+    async def publish(self, payload: str) -> None:
+        """Enqueue a serialised request."""
+        pass
+
+    @abstractmethod
+    async def depth(self) -> int:
+        """Number of requests waiting in (or being processed from) the queue."""
+        pass
+
+    @abstractmethod
+    async def peek(self) -> Optional[bytes]:
+        """Payload of the oldest request still in the queue, or None when it is empty."""
+        pass
+
+class ListTransport(RequestTransport):
+    """Plain Redis list: RPUSH here, BLPOP on the worker side. No acknowledgement."""
+
+    async def publish(self, payload: str) -> None:
+        await self.redis.rpush(self.queue, payload)
+
+    async def depth(self) -> int:
+        return await self.redis.llen(self.queue)
+
+    async def peek(self) -> Optional[bytes]:
+        return await self.redis.lindex(self.queue, 0)
+
+class StreamTransport(RequestTransport):
+    """Redis stream consumed through a consumer group.
+
+    Workers read with XREADGROUP, acknowledge with XACK and reclaim entries left
+    pending by crashed workers with XAUTOCLAIM. The stream is capped with an
+    approximate MAXLEN so it cannot grow without bound.
+    """
+
+    def __init__(self, redis_client, queue: str, maxlen: int = 10000):
+        super().__init__(redis_client, f"{queue}:stream")
+        self.maxlen = maxlen
+
+    async def publish(self, payload: str) -> None:
+        await self.redis.xadd(
+            self.queue,
+            {'payload': payload},
+            maxlen=self.maxlen,
+            approximate=True
+        )
+
+    async def depth(self) -> int:
+        # Acknowledged entries are deleted, so this counts queued and in-flight requests
+        return await self.redis.xlen(self.queue)
+
+    async def peek(self) -> Optional[bytes]:
+        entries = await self.redis.xrange(self.queue, count=1)
+        if not entries:
+            return None
+        fields = entries[0][1]
+        return fields.get(b'payload', fields.get('payload'))
+
+# Priority lanes; workers drain them with weighted fairness.
+LANES = ('interactive', 'batch')
+
+def lane_queue(lane: str) -> str:
+    """Queue name for a priority lane; the interactive lane keeps the base name."""
+    if lane not in LANES:
+        raise ValueError(f"Unknown priority lane: {lane}")
+    if lane == 'interactive':
+        return settings.AGENT_QUEUE_NAME
+    return f"{settings.AGENT_QUEUE_NAME}:{lane}"
+
+def create_transport(redis_client, lane: str = 'interactive') -> RequestTransport:
+    """Build the request transport selected by AGENT_QUEUE_TRANSPORT for `lane`."""
+    if settings.AGENT_QUEUE_TRANSPORT == 'stream':
+        return StreamTransport(
+            redis_client,
+            lane_queue(lane),
+            maxlen=settings.AGENT_QUEUE_MAXLEN
+        )
+    if settings.AGENT_QUEUE_TRANSPORT == 'list':
+        return ListTransport(redis_client, lane_queue(lane))
+    raise ValueError(f"Unknown queue transport: {settings.AGENT_QUEUE_TRANSPORT}")
@@ -0,0 +1,97 @@
+"""Per-request overhead of the request-id and logging middleware.
+
+Compares the previous BaseHTTPMiddleware implementations with the pure-ASGI
+ones by calling a trivial endpoint in-process (no sockets), so the numbers
+are the middleware cost alone. Both variants log to /dev/null; the pure-ASGI
+logger goes through its queue listener as in production.
+
+    python -m benchmarks.middleware_overhead [--requests 20000]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+import uuid
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+from app.middleware import LoggingMiddleware, RequestIDMiddleware, configure_access_log
+from app.middleware.logging import JSONFormatter
+
+legacy_logger = logging.getLogger("benchmarks.legacy_access")
+
+class LegacyRequestIDMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        request_id = str(uuid.uuid4())
+        request.state.request_id = request_id
+        response = await call_next(request)
+        response.headers["X-Request-ID"] = request_id
+        return response
+
+class LegacyLoggingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.time()
+        response = await call_next(request)
+        process_time = time.time() - start_time
+        legacy_logger.info(
+            f"Method: {request.method} Path: {request.url.path} "
+            f"Status: {response.status_code} Duration: {process_time:.2f}s"
+        )
+        return response
+
+def build_app(*middleware) -> FastAPI:
+    app = FastAPI()
+    for cls in middleware:
+        app.add_middleware(cls)
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+SCOPE = {
+    "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+    "method": "GET", "scheme": "http", "path": "/ping", "raw_path": b"/ping",
+    "root_path": "", "query_string": b"", "headers": [(b"host", b"bench")],
+    "client": ("127.0.0.1", 1234), "server": ("bench", 80),
+}
+
+async def measure(app, requests: int) -> float:
+    """Mean microseconds per request."""
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for _ in range(500):  # Warm up routing and caches
+        await app(dict(SCOPE), receive, send)
+    start = time.perf_counter_ns()
+    for _ in range(requests):
+        await app(dict(SCOPE), receive, send)
+    return (time.perf_counter_ns() - start) / requests / 1000
+
+async def main(requests: int):
+    devnull = open(os.devnull, "w")
+    legacy_handler = logging.StreamHandler(devnull)
+    legacy_logger.addHandler(legacy_handler)
+    legacy_logger.setLevel(logging.INFO)
+    legacy_logger.propagate = False
+    handler = logging.StreamHandler(devnull)
+    handler.setFormatter(JSONFormatter())
+    listener = configure_access_log(handler)
+
+    baseline = await measure(build_app(), requests)
+    legacy = await measure(build_app(LegacyRequestIDMiddleware, LegacyLoggingMiddleware), requests)
+    asgi = await measure(build_app(RequestIDMiddleware, LoggingMiddleware), requests)
+    listener.stop()
+
+    print(f"{'no middleware':<28}{baseline:8.1f} us/request")
+    print(f"{'BaseHTTPMiddleware (before)':<28}{legacy:8.1f} us/request  (+{legacy - baseline:.1f})")
+    print(f"{'pure ASGI (after)':<28}{asgi:8.1f} us/request  (+{asgi - baseline:.1f})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    asyncio.run(main(parser.parse_args().requests))
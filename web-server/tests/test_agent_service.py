@@ -0,0 +1,343 @@
+import asyncio
+import json
+import time
+import pytest
+from fakeredis import FakeAsyncRedis
+from app.config import settings
+from app.models.requests import AgentRequest
+from app.services.codec import MAGIC, Codec
+from app.services.agent_service import AgentService
+
+async def fake_worker(redis_client, count, queue='agent_requests'):
+    """Answer `count` requests the way the execution environment does."""
+    for _ in range(count):
+        _, raw = await redis_client.blpop(queue, timeout=5)
+        request = json.loads(raw)
+        reply = json.dumps({'id': request['id'], 'response': request['query'].upper()})
+        if 'reply_to' in request:
+            await redis_client.rpush(request['reply_to'], reply)
+        else:
+            await redis_client.rpush(f"agent_responses:{request['id']}", reply)
+
+@pytest.mark.asyncio
+async def test_multiplexed_replies_are_routed_to_callers():
+    redis_client = FakeAsyncRedis()
+    service = AgentService(redis_client=redis_client)
+    await service.connect()
+    try:
+        worker = asyncio.create_task(fake_worker(redis_client, 20))
+        responses = await asyncio.gather(*(
+            service.send_request(AgentRequest(query=f"q{i}")) for i in range(20)
+        ))
+        await worker
+        assert [r.response for r in responses] == [f"Q{i}" for i in range(20)]
+        assert service.reply_router.pending == 0
+    finally:
+        await service.disconnect()
+
+@pytest.mark.asyncio
+async def test_multiplexed_timeout_releases_future(monkeypatch):
+    monkeypatch.setattr('app.services.agent_service.settings.AGENT_REPLY_TIMEOUT', 0.1)
+    service = AgentService(redis_client=FakeAsyncRedis())
+    await service.connect()
+    try:
+        response = await service.send_request(AgentRequest(query="nobody home"))
+        assert response.status == 'error'
+        assert response.error == 'Request timeout'
+        assert service.reply_router.pending == 0
+    finally:
+        await service.disconnect()
+
+@pytest.mark.asyncio
+async def test_stream_transport_publishes_to_capped_stream(monkeypatch):
+    monkeypatch.setattr('app.services.transport.settings.AGENT_QUEUE_TRANSPORT', 'stream')
+    redis_client = FakeAsyncRedis()
+    service = AgentService(redis_client=redis_client)
+    await service.connect()
+    try:
+        await service.transport.publish(json.dumps({'id': 1, 'query': 'hi'}))
+        entries = await redis_client.xrange('agent_requests:stream')
+        assert json.loads(entries[0][1][b'payload'])['query'] == 'hi'
+        assert await redis_client.llen('agent_requests') == 0
+    finally:
+        await service.disconnect()
+
+@pytest.mark.asyncio
+async def test_batch_endpoint_streams_ndjson(monkeypatch):
+    import httpx
+    from app.main import app
+    from app.config import settings
+
+    redis_client = FakeAsyncRedis()
+    service = AgentService(redis_client=redis_client)
+    monkeypatch.setattr(AgentService, '_instance', service)
+
+    async def stream_worker():
+        # Batch analysis goes to the batch lane
+        _, raw = await redis_client.blpop('agent_requests:batch', timeout=5)
+        request = json.loads(raw)
+        assert request['stream'] and request['context']['type'] == 'code_analysis_batch'
+        key = f"agent_stream:{request['id']}"
+        for f in request['context']['files']:
+            await redis_client.xadd(key, {'data': json.dumps({'path': f['path']})})
+        await redis_client.xadd(key, {'event': 'end'})
+
+    worker = asyncio.create_task(stream_worker())
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+        response = await client.post(f'{settings.API_V1_STR}/agent/batch', json={
+            'files': [{'path': 'a.py', 'code': 'x = 1'}, {'path': 'b.py', 'code': 'y = 2'}]
+        })
+    await worker
+
+    assert response.headers['content-type'].startswith('application/x-ndjson')
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines == [{'path': 'a.py'}, {'path': 'b.py'}]
+    assert not await redis_client.exists('agent_stream:1')
+    await service.disconnect()
+
+@pytest.mark.asyncio
+async def test_query_stream_relays_deltas_as_sse(monkeypatch):
+    import httpx
+    from app.main import app
+    from app.config import settings
+
+    redis_client = FakeAsyncRedis()
+    service = AgentService(redis_client=redis_client)
+    monkeypatch.setattr(AgentService, '_instance', service)
+
+    async def stream_worker():
+        _, raw = await redis_client.blpop('agent_requests', timeout=5)
+        request = json.loads(raw)
+        key = f"agent_stream:{request['id']}"
+        for token in ['Hel', 'lo']:
+            await redis_client.xadd(key, {'data': json.dumps({'delta': token})})
+        await redis_client.xadd(key, {'event': 'end'})
+
+    worker = asyncio.create_task(stream_worker())
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+        response = await client.post(f'{settings.API_V1_STR}/agent/query/stream', json={'query': 'hi'})
+    await worker
+
+    assert response.headers['content-type'].startswith('text/event-stream')
+    assert response.text == (
+        'data: {"delta": "Hel"}\n\n'
+        'data: {"delta": "lo"}\n\n'
+        'event: end\ndata: {}\n\n'
+    )
+    await service.disconnect()
+
+@pytest.mark.asyncio
+async def test_abandoned_stream_is_trimmed_and_cancelled():
+    redis_client = FakeAsyncRedis()
+    service = AgentService(redis_client=redis_client)
+    await service.connect()
+    for i in range(3):
+        await redis_client.xadd('agent_stream:1', {'data': json.dumps(i)})
+
+    events = service.stream_request(AgentRequest(query='hi'))
+    assert (await events.__anext__())['data'] == 0
+    await events.__anext__()
+    await events.__anext__()
+    await redis_client.xadd('agent_stream:1', {'data': json.dumps(3)})
+    assert (await events.__anext__())['data'] == 3
+    # Entries before the last one read were trimmed for the worker's backpressure
+    assert await redis_client.xlen('agent_stream:1') == 2
+
+    await events.aclose()
+    assert not await redis_client.exists('agent_stream:1')
+    assert await redis_client.get('agent_cancel:1') == b'1'
+    await service.disconnect()
+
+@pytest.mark.asyncio
+async def test_stalled_stream_times_out_and_cancels_the_worker(monkeypatch):
+    monkeypatch.setattr('app.services.agent_service.settings.AGENT_REPLY_TIMEOUT', 0.1)
+    redis_client = FakeAsyncRedis()
+    service = AgentService(redis_client=redis_client)
+    await service.connect()
+    await redis_client.xadd('agent_stream:1', {'data': json.dumps('partial')})
+
+    events = [event async for event in service.read_stream(1)]
+    assert events == [{'event': 'data', 'data': 'partial'},
+                      {'event': 'error', 'error': 'Request timeout'}]
+    assert await redis_client.get('agent_cancel:1') == b'1'
+
+    # A stream the worker finished needs no cancel signal
+    await redis_client.xadd('agent_stream:2', {'event': 'end'})
+    assert [event async for event in service.read_stream(2)] == [{'event': 'end'}]
+    assert not await redis_client.exists('agent_cancel:2')
+    await service.disconnect()
+
+@pytest.mark.asyncio
+async def test_request_id_travels_with_the_queued_request(monkeypatch):
+    import httpx
+    from app.main import app
+    from app.config import settings
+
+    redis_client = FakeAsyncRedis()
+    service = AgentService(redis_client=redis_client)
+    monkeypatch.setattr(AgentService, '_instance', service)
+    seen = {}
+
+    async def tracing_worker():
+        _, raw = await redis_client.blpop('agent_requests', timeout=5)
+        request = json.loads(raw)
+        seen.update(request['trace'])
+        await redis_client.rpush(request['reply_to'], json.dumps({
+            'id': request['id'], 'response': 'ok',
+            'trace': {'id': request['trace']['id'], 'spans': {'process': 0.01}}
+        }))
+
+    worker = asyncio.create_task(tracing_worker())
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+        response = await client.post(f'{settings.API_V1_STR}/agent/query', json={'query': 'hi'},
+                                     headers={'X-Request-ID': 'trace-123'})
+        metrics = await client.get('/metrics')
+    await worker
+
+    assert response.json()['response'] == 'ok'
+    assert response.headers['X-Request-ID'] == 'trace-123'
+    assert seen['id'] == 'trace-123' and seen['enqueued_at'] > 0
+    assert 'api_stage_duration_seconds_count{stage="agent_roundtrip"}' in metrics.text
+    await service.disconnect()
+
+@pytest.mark.asyncio
+async def test_identical_in_flight_requests_are_coalesced():
+    redis_client = FakeAsyncRedis()
+    service = AgentService(redis_client=redis_client)
+    await service.connect()
+    try:
+        requests = [AgentRequest(query="refresh", context={"a": 1, "b": 2})] * 10
+        requests += [AgentRequest(query="refresh", context={"b": 2, "a": 1})] * 10
+        requests += [AgentRequest(query="other")]
+        # Neither another lane nor another client key joins the shared execution
+        requests += [AgentRequest(query="refresh", context={"a": 1, "b": 2}, priority="batch")]
+        requests += [AgentRequest(query="refresh", context={"a": 1, "b": 2}, idempotency_key="k")]
+        worker = asyncio.create_task(fake_worker(redis_client, 3))
+        batch_worker = asyncio.create_task(fake_worker(redis_client, 1, queue='agent_requests:batch'))
+        responses = await asyncio.gather(*(service.send_request(r) for r in requests))
+        await worker
+        await batch_worker
+
+        assert [r.response for r in responses] == ["REFRESH"] * 20 + ["OTHER"] + ["REFRESH"] * 2
+        assert await redis_client.get('request_counter') == b'4'
+        assert service.single_flight.coalesced == 19
+        assert service.single_flight.in_flight == 0
+    finally:
+        await service.disconnect()
+
+@pytest.mark.asyncio
+async def test_full_queues_are_rejected_with_retry_after(monkeypatch):
+    import httpx
+    from app.main import app
+    from app.config import settings
+
+    monkeypatch.setattr('app.services.agent_service.settings.AGENT_QUEUE_MAX_DEPTH', 3)
+    monkeypatch.setattr('app.services.agent_service.settings.AGENT_BATCH_QUEUE_MAX_DEPTH', 1)
+    redis_client = FakeAsyncRedis()
+    for i in range(3):
+        await redis_client.rpush('agent_requests', json.dumps({'id': i}))
+    await redis_client.rpush('agent_requests:batch', json.dumps({'id': 9}))
+    service = AgentService(redis_client=redis_client)
+    monkeypatch.setattr(AgentService, '_instance', service)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+        interactive = await client.post(f'{settings.API_V1_STR}/agent/query', json={'query': 'hi'})
+        batch = await client.post(f'{settings.API_V1_STR}/agent/batch',
+                                  json={'files': [{'path': 'a.py', 'code': 'x = 1'}]})
+
+    assert interactive.status_code == 503
+    assert interactive.headers['Retry-After'] == str(settings.AGENT_RETRY_AFTER)
+    assert batch.status_code == 429
+    # Rejected work never reaches the queues
+    assert await redis_client.llen('agent_requests') == 3
+    assert await redis_client.llen('agent_requests:batch') == 1
+    await service.disconnect()
+
+@pytest.mark.asyncio
+async def test_requests_carry_a_deadline_and_lane():
+    redis_client = FakeAsyncRedis()
+    service = AgentService(redis_client=redis_client)
+    await service.connect()
+    try:
+        worker = asyncio.create_task(fake_worker(redis_client, 1))
+        await service.send_request(AgentRequest(query='q'))
+        await worker
+        request_id = await service.start_stream(AgentRequest(query='bulk', priority='batch'))
+        request = json.loads(await redis_client.lpop('agent_requests:batch'))
+        assert request['id'] == request_id and request['stream']
+        assert 0 < request['deadline'] - time.time() <= settings.AGENT_REPLY_TIMEOUT
+    finally:
+        await service.disconnect()
+
+@pytest.mark.asyncio
+async def test_large_payloads_are_compressed_on_the_wire():
+    redis_client = FakeAsyncRedis()
+    service = AgentService(redis_client=redis_client)
+    service.codec = Codec(compress_min_bytes=1024)
+    await service.connect()
+    worker_codec = Codec(compress_min_bytes=1024)
+
+    async def worker():
+        _, raw = await redis_client.blpop('agent_requests', timeout=5)
+        assert raw[0] == MAGIC
+        request = worker_codec.decode(raw)
+        reply = worker_codec.encode({'id': request['id'], 'response': request['query'] * 2})
+        await redis_client.rpush(request['reply_to'], reply)
+
+    try:
+        answering = asyncio.create_task(worker())
+        response = await service.send_request(AgentRequest(query='analysis ' * 500))
+        await answering
+        assert response.response == 'analysis ' * 1000
+    finally:
+        await service.disconnect()
+
+@pytest.mark.asyncio
+async def test_completed_idempotency_keys_are_replayed_without_enqueueing():
+    redis_client = FakeAsyncRedis()
+    service = AgentService(redis_client=redis_client)
+    await service.connect()
+
+    async def worker():
+        _, raw = await redis_client.blpop('agent_requests', timeout=5)
+        request = json.loads(raw)
+        reply = {'response': request['query'].upper()}
+        await redis_client.set(f"agent_result:{request['idempotency_key']}",
+                               json.dumps({'status': 'done', 'reply': reply}))
+        await redis_client.rpush(request['reply_to'], json.dumps({'id': request['id'], **reply}))
+        return request
+
+    try:
+        answering = asyncio.create_task(worker())
+        first = await service.send_request(AgentRequest(query='q', idempotency_key='order-1'))
+        assert (await answering)['idempotency_key'] == 'order-1'
+
+        # A retry is answered from the result store; nothing is queued
+        again = await service.send_request(AgentRequest(query='q', idempotency_key='order-1'))
+        assert first.response == again.response == 'Q'
+        assert await redis_client.llen('agent_requests') == 0
+        assert await redis_client.get('request_counter') == b'1'
+
+        # Without a client key nothing is looked up or sent for the result store
+        answering = asyncio.create_task(fake_worker(redis_client, 1))
+        await service.send_request(AgentRequest(query='other'))
+        await answering
+        assert await redis_client.keys('agent_result:*') == [b'agent_result:order-1']
+    finally:
+        await service.disconnect()
+
+@pytest.mark.asyncio
+async def test_session_id_is_sent_in_the_agent_context():
+    redis_client = FakeAsyncRedis()
+    service = AgentService(redis_client=redis_client)
+    await service.connect()
+    try:
+        await service.start_stream(AgentRequest(query='hi', session_id='alice', context={'lang': 'en'}))
+        request = json.loads(await redis_client.lpop('agent_requests'))
+        assert request['context'] == {'lang': 'en', 'session_id': 'alice'}
+    finally:
+        await service.disconnect()
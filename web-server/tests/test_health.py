@@ -1,6 +1,13 @@
+import asyncio
+import json
+import time
+import httpx
 import pytest
+from fakeredis import FakeAsyncRedis
 from fastapi.testclient import TestClient
+from app.config import settings
 from app.main import app
+from app.services.agent_service import AgentService
 
 client = TestClient(app)
 
@@ -10,4 +17,50 @@ def test_health_check():
     data = response.json()
     assert "status" in data
     assert data["status"] in ["healthy", "degraded"]
-    assert "agent_service" in data 
\ No newline at end of file
+    assert "agent_service" in data 
+
+@pytest.mark.asyncio
+async def test_readiness_serves_cached_probe_results(monkeypatch):
+    redis_client = FakeAsyncRedis()
+    service = AgentService(redis_client=redis_client)
+    monkeypatch.setattr(AgentService, '_instance', service)
+    await service.connect()
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            # Redis is up but no worker has sent a heartbeat yet
+            response = await client.get(f'{settings.API_V1_STR}/health/ready')
+            assert response.status_code == 503
+            assert response.json()['redis'] and response.json()['workers']['live'] == 0
+
+            now = time.time()
+            await redis_client.hset('agent_workers', mapping={
+                'w1': json.dumps({'at': now, 'in_flight': 2, 'concurrency': 8, 'stopping': False}),
+                'w2': json.dumps({'at': now, 'in_flight': 0, 'concurrency': 8, 'stopping': True}),
+                'crashed': json.dumps({'at': now - 60, 'in_flight': 1, 'concurrency': 8})
+            })
+            await redis_client.rpush('agent_requests', json.dumps(
+                {'id': 1, 'query': 'q', 'trace': {'id': None, 'enqueued_at': now - 3}}))
+            await service.health.probe()
+
+            response = await client.get(f'{settings.API_V1_STR}/health/ready')
+            status = response.json()
+            assert response.status_code == 200 and status['ready']
+            assert status['workers'] == {'live': 1, 'in_flight': 2, 'capacity': 8}
+            assert status['queues']['interactive']['depth'] == 1
+            assert status['queues']['interactive']['lag'] >= 3
+            assert status['queues']['batch'] == {'depth': 0, 'lag': 0.0}
+            assert await redis_client.hkeys('agent_workers') == [b'w1', b'w2']
+
+            # A hung Redis fails the probe, but never the probe request itself
+            async def hang():
+                await asyncio.sleep(10)
+            monkeypatch.setattr(redis_client, 'ping', hang)
+            service.health.timeout = 0.05
+            await service.health.probe()
+            response = await client.get(f'{settings.API_V1_STR}/health/ready')
+            assert response.status_code == 503 and not response.json()['redis']
+            assert (await client.get(f'{settings.API_V1_STR}/health')).json()['status'] == 'degraded'
+            assert (await client.get(f'{settings.API_V1_STR}/health/live')).status_code == 200
+    finally:
+        await service.disconnect()
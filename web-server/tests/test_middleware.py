@@ -0,0 +1,68 @@
+import logging
+import pytest
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from app.middleware import LoggingMiddleware, RequestIDMiddleware
+from app.middleware.logging import JSONFormatter, logger as access_logger
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(RequestIDMiddleware)
+    app.add_middleware(LoggingMiddleware)
+
+    @app.get("/echo-id")
+    async def echo_id(request: Request):
+        return {"request_id": request.state.request_id}
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for i in range(3):
+                yield f"{i}\n"
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    return app
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+@pytest.mark.asyncio
+async def test_request_id_is_honored_or_generated():
+    transport = httpx.ASGITransport(app=make_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        given = await client.get("/echo-id", headers={"X-Request-ID": "abc-123"})
+        generated = await client.get("/echo-id")
+        rejected = await client.get("/echo-id", headers={"X-Request-ID": "bad id\r\n"})
+
+    assert given.headers["X-Request-ID"] == "abc-123"
+    assert given.json()["request_id"] == "abc-123"
+    assert generated.json()["request_id"] == generated.headers["X-Request-ID"]
+    assert len(generated.headers["X-Request-ID"]) == 36
+    assert rejected.headers["X-Request-ID"] != "bad id"
+
+@pytest.mark.asyncio
+async def test_access_log_is_structured_and_covers_streams():
+    handler = ListHandler()
+    access_logger.addHandler(handler)
+    previous_level = access_logger.level
+    access_logger.setLevel(logging.INFO)
+    try:
+        transport = httpx.ASGITransport(app=make_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/stream", headers={"X-Request-ID": "s-1"})
+    finally:
+        access_logger.removeHandler(handler)
+        access_logger.setLevel(previous_level)
+
+    assert response.text == "0\n1\n2\n"
+    fields = handler.records[-1].fields
+    assert fields["path"] == "/stream"
+    assert fields["status"] == 200
+    assert fields["request_id"] == "s-1"
+    assert '"duration_ms"' in JSONFormatter().format(handler.records[-1])
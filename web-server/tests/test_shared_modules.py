@@ -0,0 +1,41 @@
+import ast
+from pathlib import Path
+import pytest
+
+WEB = Path(__file__).resolve().parents[1]
+EXECUTION = WEB.parent / 'execution-environment'
+
+# Modules both services carry a copy of: (web-server path, execution-environment path)
+IDENTICAL = [
+    ('app/services/codec.py', 'core/codec.py'),
+    ('app/services/single_flight.py', 'core/single_flight.py'),
+]
+# instrumentation.py differs in its exporters, but the recording core must match
+SHARED_DEFINITIONS = ('DEFAULT_BUCKETS', 'LatencyHistogram', 'Trace', 'Span', 'StageMetrics')
+
+pytestmark = pytest.mark.skipif(
+    not EXECUTION.is_dir(), reason='execution-environment is not checked out next to web-server'
+)
+
+def definitions(path: Path) -> dict:
+    tree = ast.parse(path.read_text())
+    found = {}
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            found[node.name] = ast.dump(node)
+        elif isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Name):
+            found[node.targets[0].id] = ast.dump(node.value)
+    return found
+
+@pytest.mark.parametrize('web_path, execution_path', IDENTICAL)
+def test_shared_modules_are_identical(web_path, execution_path):
+    assert (WEB / web_path).read_text() == (EXECUTION / execution_path).read_text(), (
+        f'{web_path} and execution-environment/{execution_path} have drifted apart; '
+        'apply the change to both copies'
+    )
+
+def test_instrumentation_core_matches():
+    web = definitions(WEB / 'app/instrumentation.py')
+    execution = definitions(EXECUTION / 'utils/instrumentation.py')
+    for name in SHARED_DEFINITIONS:
+        assert web[name] == execution[name], f'{name} differs between the two instrumentation modules'